@@ -1,14 +1,83 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import wraps
+from threading import Lock, get_ident
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import scoped_session, Session
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import IntegrityError
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
 
+from db.engine import create_db_engine, create_read_engine
 from settings import sets
 
 from logging import getLogger
 log = getLogger(__name__)
 
-DB_SESSIONS = scoped_session(sessionmaker(bind=create_engine(sets.DB_SCHEME + sets.DB_NAME)))
+ENGINE = create_db_engine()
+READ_ENGINE = create_read_engine(ENGINE)
+
+# scope of DB_SESSIONS: set for each request (BaseHandler) and executor task, thread is used for scripts and tests.
+# Requests are not scoped by thread: async requests are interleaved in one IOLoop thread.
+SESSION_SCOPE = ContextVar('session_scope', default=None)
+
+
+def _session_scope():
+    return SESSION_SCOPE.get() or get_ident()
+
+
+class RoutingSession(Session):
+    '''
+    Session on two engines: reads go to READ_ENGINE, flush and everything inside DBBridge.transaction
+    (modife_db) go to ENGINE. After first write session stays on ENGINE until transaction end,
+    so session always reads own writes (not committed also).
+    '''
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get('writer') or self._flushing or self.info.get('transaction_depth'):
+            self.info['writer'] = True
+            return ENGINE
+        return READ_ENGINE
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _release_writer(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('writer', None)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _run_on_commit(session):
+    for func in session.info.pop('on_commit', ()):
+        func()
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_on_commit(session):
+    session.info.pop('on_commit', None)
+
+
+DB_SESSIONS = scoped_session(sessionmaker(bind=ENGINE, class_=RoutingSession), scopefunc=_session_scope)
+# sessions for tasks in executor: objects must stay readable after session close
+TASK_SESSIONS = sessionmaker(bind=ENGINE, class_=RoutingSession, expire_on_commit=False)
+
+# memo of current request, set by BaseHandler (None - no memoization)
+REQUEST_MEMO = ContextVar('request_memo', default=None)
+
+
+class RequestMemo(dict):
+    '''
+    Results of lookup functions for one request. Key: (session, function, arguments).
+    Cleared on any commit, so it never returns data older than last write.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.hits = 0
+        self.misses = 0
 
 
 class DBBridge:
@@ -19,6 +88,11 @@ class DBBridge:
     __instance = None
     __db_sessions = DB_SESSIONS
 
+    __executor = None
+    __executor_lock = Lock()
+    __queued = 0
+    __active = 0
+
     def __init__(self):
         if DBBridge.__instance:
             raise BaseException('Use get_instance method!')
@@ -31,22 +105,215 @@ class DBBridge:
 
     @staticmethod
     def query_db(func):
+        @wraps(func)
         def wrapper(*args, **kwargs):
             return func(DBBridge.__db_sessions, *args, **kwargs)
+        wrapper.awaitable = lambda *args, **kwargs: DBBridge.run_in_executor(wrapper, *args, **kwargs)
         return wrapper
 
     @staticmethod
     def modife_db(func):
+        @wraps(func)
         def wrapper(*args, **kwargs):
+            with DBBridge.transaction():
+                return func(DBBridge.__db_sessions, *args, **kwargs)
+        wrapper.awaitable = lambda *args, **kwargs: DBBridge.run_in_executor(wrapper, *args, **kwargs)
+        return wrapper
+
+    @staticmethod
+    @contextmanager
+    def transaction():
+        '''
+        Unit of work: all modife_db calls inside join one transaction, that is committed once on exit
+        (or rolled back as unit on exception). Nested transaction only flush changes.
+        Use it as: with DBBridge.transaction(): ...
+        '''
+        session = DBBridge.__db_sessions()
+        depth = session.info.get('transaction_depth', 0)
+        session.info['transaction_depth'] = depth + 1
+        try:
+            yield session
+            if depth:
+                session.flush()
+            else:
+                session.commit()
+        except:
+            if not depth:
+                session.rollback()
+            raise
+        finally:
+            session.info['transaction_depth'] = depth
+            DBBridge.clear_memo()
+
+    @staticmethod
+    def open_session():
+        '''
+        Start new session scope for request, session itself is created on first use.
+        Must be closed by close_session, otherwise session with all loaded models stays in registry.
+        '''
+        SESSION_SCOPE.set(object())
+
+    @staticmethod
+    def close_session():
+        '''
+        Close session of current scope and forget it, all its models become detached.
+        :return: number of models in identity map before close
+        '''
+        size = 0
+        if DB_SESSIONS.registry.has():
+            size = len(DB_SESSIONS().identity_map)
+            DB_SESSIONS.remove()
+        SESSION_SCOPE.set(None)
+        return size
+
+    @staticmethod
+    def session_stats():
+        # gauge: sessions in registry and models in their identity maps (must not grow between requests)
+        sessions = list(DB_SESSIONS.registry.registry.values())
+        return {
+            'sessions': len(sessions),
+            'identity_map': sum(len(session.identity_map) for session in sessions),
+        }
+
+    @staticmethod
+    def detach(models, *paths):
+        '''
+        Load models with relationships by paths ('_course._owner') and expunge them all from session,
+        so they stay readable after session close: for templates, executor results and caches.
+        :param models: model or list of models
+        :return: models
+        '''
+        visited = []
+
+        def load(model, path):
+            if model is None:
+                return
+            if isinstance(model, (list, tuple)):
+                for item in model:
+                    load(item, path)
+                return
+            state = inspect(model)
+            if state.expired_attributes:
+                # one SELECT for all expired columns (session was committed)
+                getattr(model, next(iter(state.expired_attributes)))
+            visited.append(model)
+            if path:
+                load(getattr(model, path[0]), path[1:])
+
+        for path in paths or ('',):
+            load(models, [name for name in path.split('.') if name])
+        for model in visited:
+            state = inspect(model)
+            if state.session is not None:
+                state.session.expunge(model)
+        return models
+
+    @staticmethod
+    def on_commit(func):
+        '''
+        Call func after commit of current transaction (not called on rollback).
+        For in-process state derived from db, it must not see not committed changes.
+        '''
+        DBBridge.__db_sessions().info.setdefault('on_commit', []).append(func)
+
+    @staticmethod
+    def memoize(func):
+        '''
+        Memoize lookup function result in current request memo (see REQUEST_MEMO).
+        Use it over query_db: @DBBridge.memoize @DBBridge.query_db def get(session, ...)
+        '''
+        name = func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            memo = REQUEST_MEMO.get()
+            if memo is None:
+                return func(*args, **kwargs)
             try:
-                result = func(DBBridge.__db_sessions, *args, **kwargs)
-                DBBridge.__db_sessions.commit()
-                return result
-            except:
-                DB_SESSIONS.rollback()
-                raise
+                # models from other session must not be returned (other thread or closed session)
+                key = (DBBridge.__db_sessions().hash_key, name, args, tuple(sorted(kwargs.items())))
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+            if key in memo:
+                memo.hits += 1
+                return memo[key]
+            memo.misses += 1
+            memo[key] = result = func(*args, **kwargs)
+            return result
+        wrapper.awaitable = lambda *args, **kwargs: DBBridge.run_in_executor(wrapper, *args, **kwargs)
         return wrapper
 
+    @staticmethod
+    def clear_memo():
+        memo = REQUEST_MEMO.get()
+        if memo:
+            memo.clear()
+
+    @staticmethod
+    def get_executor():
+        with DBBridge.__executor_lock:
+            if not DBBridge.__executor:
+                DBBridge.__executor = ThreadPoolExecutor(max_workers=sets.DB_EXECUTOR_WORKERS)
+                log.info('DB executor started with {} workers'.format(sets.DB_EXECUTOR_WORKERS))
+            return DBBridge.__executor
+
+    @staticmethod
+    def executor_stats():
+        return {
+            'workers': sets.DB_EXECUTOR_WORKERS,
+            'queued': DBBridge.__queued,
+            'active': DBBridge.__active,
+        }
+
+    @staticmethod
+    def log_stats():
+        # periodic gauges of server (main.py): growing queue - executor is too small, sessions - leak
+        log.info('DB executor: {active}/{workers} active, {queued} queued; '
+                 'sessions: {sessions}, identity map: {identity_map}'.format(
+                     **DBBridge.executor_stats(), **DBBridge.session_stats()))
+
+    @staticmethod
+    def run_in_executor(func, *args, **kwargs):
+        '''
+        Run decorated db function in executor thread, with own session for task.
+        Use it as: lessons = await self.Lesson.get_rows_by_course.awaitable(course_id)
+        Returned models are detached, so all needed relationships must be loaded inside func.
+        :return: tornado Future with func result
+        '''
+        future = Future()
+
+        def copy(done):
+            if done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                future.set_result(done.result())
+
+        with DBBridge.__executor_lock:
+            DBBridge.__queued += 1
+        # task see the same request memo
+        executor_future = DBBridge.get_executor().submit(
+            copy_context().run, DBBridge.__run_task, func, *args, **kwargs)
+        IOLoop.current().add_future(executor_future, copy)
+        return future
+
+    @staticmethod
+    def __run_task(func, *args, **kwargs):
+        with DBBridge.__executor_lock:
+            DBBridge.__queued -= 1
+            DBBridge.__active += 1
+        session = TASK_SESSIONS()
+        # all nested decorated calls in this task use task session (context is a copy, request scope is not changed)
+        SESSION_SCOPE.set(object())
+        DB_SESSIONS.registry.set(session)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            session.close()
+            DB_SESSIONS.registry.clear()
+            with DBBridge.__executor_lock:
+                DBBridge.__active -= 1
+
     @staticmethod
     def add_to_db(func):
         # NOT USED NOW!! Use DBBridge.modife_db
@@ -0,0 +1,132 @@
+'''
+Access control lists of courses. All CourseAccess and LessonAccess rows of course are loaded by two queries
+into CourseAcl and cached in ACL_CACHE, so permission checks are dict lookups.
+Cached ACL is invalidated on flush and commit of changed accesses, lessons and courses (invalidate_changed),
+changes without flush (bulk INSERT) must call invalidate_acl.
+'''
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from db.cache import ACL_CACHE, cache_generation
+from db.models import Course, CourseAccess, Lesson, LessonAccess
+
+from logging import getLogger
+log = getLogger(__name__)
+
+
+class CourseRight:
+    # access of user to course, used as CourseAccess model (see OwnerAccess)
+    BROWSE = CourseAccess.BROWSE
+    MODERATE = CourseAccess.MODERATE
+
+    __slots__ = ('access',)
+
+    def __init__(self, access):
+        self.access = access
+
+
+class LessonRight:
+    # access of user to lesson, used as LessonAccess model
+    VIEW = LessonAccess.VIEW
+    TEACH = LessonAccess.TEACH
+    MODERATE = LessonAccess.MODERATE
+
+    __slots__ = ('access',)
+
+    def __init__(self, access):
+        self.access = access
+
+
+# rights are shared by all ACLs
+COURSE_RIGHTS = {level: CourseRight(level) for level in CourseAccess.COURSE_LEVEL}
+LESSON_RIGHTS = {level: LessonRight(level) for level in LessonAccess.LESSON_LEVEL}
+
+
+class CourseAcl:
+
+    __slots__ = ('course_id', 'owner', 'courses', 'lessons')
+
+    def __init__(self, course_id, owner, course_rows, lesson_rows):
+        '''
+        :param course_rows: (user id, course access)
+        :param lesson_rows: (user id, lesson id, lesson access)
+        '''
+        self.course_id = course_id
+        self.owner = owner
+        self.courses = {user_id: COURSE_RIGHTS[access] for user_id, access in course_rows}
+        self.lessons = {}  # user id: {lesson id: LessonRight}
+        for user_id, lesson_id, access in lesson_rows:
+            self.lessons.setdefault(user_id, {})[lesson_id] = LESSON_RIGHTS[access]
+
+    def course_right(self, user_id):
+        return self.courses.get(user_id)
+
+    def lesson_right(self, user_id, lesson_id):
+        return self.lessons.get(user_id, {}).get(lesson_id)
+
+    def can_moderate(self, user_id):
+        right = self.courses.get(user_id)
+        return user_id == self.owner or (right is not None and right.access == CourseAccess.MODERATE)
+
+
+def get_acl(session, course_id):
+    '''
+    :return: CourseAcl from cache or db, None for not existed course
+    '''
+    course_id = int(course_id)  # ids come both as int and str from request arguments
+    acl = ACL_CACHE.get(course_id)
+    if acl is None:
+        generation = cache_generation(session)
+        owner = session.query(Course.owner).filter(Course.id == course_id).scalar()
+        if owner is None:
+            return
+        acl = CourseAcl(
+            course_id,
+            owner,
+            session.query(CourseAccess.user, CourseAccess.access).filter(CourseAccess.course == course_id),
+            session.query(LessonAccess.user, LessonAccess.lesson, LessonAccess.access).join(Lesson).filter(
+                Lesson.course == course_id),
+        )
+        # ACL with not committed changes of this session is not shared
+        if (ACL_CACHE, course_id) not in session.info.get('invalidate_cache', ()):
+            ACL_CACHE.put(course_id, acl, generation)
+    return acl
+
+
+def invalidate_acl(session, course_ids=(), lesson_ids=()):
+    '''
+    Invalidate ACL of courses and courses of lessons, now and after commit
+    '''
+    course_ids = set(course_ids)
+    if lesson_ids:
+        course_ids.update(course_id for course_id, in session.query(Lesson.course).filter(
+            Lesson.id.in_(set(lesson_ids))).distinct())
+    changed = session.info.setdefault('invalidate_cache', set())
+    for course_id in course_ids:
+        ACL_CACHE.invalidate(int(course_id))
+        changed.add((ACL_CACHE, int(course_id)))
+
+
+def _changed_courses(session):
+    # course ids and lesson ids of changed objects, which can change ACL
+    course_ids, lesson_ids = set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, CourseAccess):
+            course_ids.add(obj.course)
+        elif isinstance(obj, LessonAccess):
+            lesson_ids.add(obj.lesson)
+        elif isinstance(obj, Lesson) and (obj in session.deleted or inspect(obj).attrs.course.history.has_changes()):
+            course_ids.add(obj.course)
+            course_ids.update(inspect(obj).attrs.course.history.deleted or ())
+        elif isinstance(obj, Course) and (obj in session.deleted or inspect(obj).attrs.owner.history.has_changes()):
+            course_ids.add(obj.id)
+    course_ids.discard(None)
+    lesson_ids.discard(None)
+    return course_ids, lesson_ids
+
+
+@event.listens_for(Session, 'before_flush')
+def invalidate_changed(session, flush_context, instances):
+    course_ids, lesson_ids = _changed_courses(session)
+    if course_ids or lesson_ids:
+        invalidate_acl(session, course_ids, lesson_ids)
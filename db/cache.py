@@ -0,0 +1,199 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.session import make_transient_to_detached
+
+from db.models import User, Course
+from settings import sets
+
+from logging import getLogger
+log = getLogger(__name__)
+
+
+_generation = 0  # increased by every invalidation of any cache
+_generation_lock = Lock()
+
+
+def _next_generation():
+    global _generation
+    with _generation_lock:
+        _generation += 1
+
+
+def cache_generation(session=None):
+    '''
+    Generation of data, which is loaded now: put of value loaded before later invalidation is refused
+    (concurrent commit can invalidate cache between load and put of old value).
+    Read transaction can see data older than invalidations after its begin, so generation of session
+    is taken at transaction begin (remember_generation).
+    '''
+    if session is not None and 'cache_generation' in session.info:
+        return session.info['cache_generation']
+    return _generation
+
+
+class LruCache:
+    '''
+    In-process LRU cache with TTL, values must not be changed by users.
+    '''
+
+    def __init__(self, name, size=None, ttl=None):
+        self.name = name
+        self.size = size or sets.ENTITY_CACHE_SIZE
+        self.ttl = ttl or sets.ENTITY_CACHE_TTL
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0  # refused puts of values loaded before invalidation
+        self.__items = OrderedDict()  # key: (expire time, value)
+        self.__lock = Lock()
+
+    def get(self, key):
+        with self.__lock:
+            item = self.__items.get(key)
+            if item is None or item[0] < monotonic():
+                self.misses += 1
+                return
+            self.__items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value, generation=None):
+        '''
+        :param generation: cache_generation before value was loaded
+        '''
+        with self.__lock:
+            if generation is not None and generation != _generation:
+                self.stale += 1
+                return
+            self.__items[key] = (monotonic() + self.ttl, value)
+            self.__items.move_to_end(key)
+            while len(self.__items) > self.size:
+                self.__items.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self.__lock:
+            self.__items.pop(key, None)
+            _next_generation()
+
+    def clear(self):
+        with self.__lock:
+            self.__items.clear()
+            _next_generation()
+
+    def stats(self):
+        return {
+            'size': len(self.__items),
+            'max_size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'stale': self.stale,
+        }
+
+
+class EntityCache(LruCache):
+    '''
+    Cache for rarely changed models.
+    Keeps column values only, model is rebuilt and merged into session without SQL on hit.
+    Invalidated on flush and commit of changed models (see invalidate_changed).
+    '''
+
+    def __init__(self, name, model, key_attr, size=None, ttl=None):
+        super().__init__(name, size, ttl)
+        self.model = model
+        self.key_attr = key_attr
+
+    def get_or_load(self, session, key, loader):
+        '''
+        :param loader: function without args, load model from db on cache miss
+        :return: model attached to session or None
+        '''
+        key = str(key)  # ids come both as int and str from request arguments
+        values = self.get(key)
+        if values is not None:
+            model = self.model(**values)
+            make_transient_to_detached(model)
+            return session.merge(model, load=False)
+        generation = cache_generation(session)
+        model = loader()
+        if model is not None:
+            self.put(key, {attr.key: getattr(model, attr.key) for attr in inspect(self.model).column_attrs},
+                     generation)
+        return model
+
+    def invalidate(self, key):
+        super().invalidate(str(key))
+
+
+USER_CACHE = EntityCache('users', User, 'name')
+COURSE_CACHE = EntityCache('courses', Course, 'id')
+ENTITY_CACHES = (USER_CACHE, COURSE_CACHE)
+ACL_CACHE = LruCache('acl')  # course id: CourseAcl, see db.acl
+CACHES = ENTITY_CACHES + (ACL_CACHE,)
+
+
+def cache_stats():
+    return {cache.name: cache.stats() for cache in CACHES}
+
+
+def clear_all():
+    for cache in CACHES:
+        cache.clear()
+
+
+def invalidate_model(session, model, key):
+    '''
+    Invalidate model changed without flush (Query.update), key is value of cache key_attr.
+    '''
+    changed = session.info.setdefault('invalidate_cache', set())
+    for cache in ENTITY_CACHES:
+        if cache.model is model:
+            cache.invalidate(key)
+            changed.add((cache, key))
+
+
+def _changed_keys(session):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        for cache in ENTITY_CACHES:
+            if isinstance(obj, cache.model):
+                yield cache, getattr(obj, cache.key_attr)
+                # old key, if key attribute was changed
+                for old in inspect(obj).attrs[cache.key_attr].history.deleted or ():
+                    yield cache, old
+
+
+@event.listens_for(Session, 'before_flush')
+def invalidate_changed(session, flush_context, instances):
+    changed = session.info.setdefault('invalidate_cache', set())
+    for cache, key in _changed_keys(session):
+        cache.invalidate(key)
+        changed.add((cache, key))
+
+
+@event.listens_for(Session, 'after_begin')
+def remember_generation(session, transaction, connection):
+    # the first connection of transaction (session can use two engines)
+    session.info.setdefault('cache_generation', _generation)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def forget_generation(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('cache_generation', None)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_committed(session):
+    # invalidate again: other thread can cache old values between flush and commit
+    for cache, key in session.info.pop('invalidate_cache', ()):
+        cache.invalidate(key)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_changed(session):
+    session.info.pop('invalidate_cache', None)
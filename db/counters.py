@@ -0,0 +1,62 @@
+'''
+Denormalized counters: number of children kept in parent row, so list pages show counts without child tables.
+Counters are changed by handlers in the same transaction as children (change_counter),
+check_counters/repair_counters compare them with real counts.
+'''
+from sqlalchemy import select, func
+
+from db.cache import invalidate_model
+from db.models import Course, CourseMembers, Lesson, HomeWork, HomeWorkAnswer
+
+from logging import getLogger
+log = getLogger(__name__)
+
+# counter column: foreign key of children to parent id
+COUNTERS = (
+    (Course.members_count, CourseMembers.course),
+    (Course.lessons_count, Lesson.course),
+    (HomeWork.answers_count, HomeWorkAnswer.home_work),
+)
+
+
+def change_counter(session, counter, model_id, delta=1):
+    '''
+    Atomic UPDATE counter = counter + delta, not read-modify-write (other requests can change it at the same time).
+    '''
+    model = counter.class_
+    session.query(model).filter(model.id == model_id).update(
+        {counter: counter + delta}, synchronize_session='evaluate')
+    # UPDATE is not flush, cached model must be invalidated by hand
+    invalidate_model(session, model, model_id)
+
+
+def _actual(counter, foreign_key):
+    model = counter.class_
+    return select([func.count()]).where(foreign_key == model.id).as_scalar()
+
+
+def check_counters(connection):
+    '''
+    :return: list of (table, id, counter name, stored value, actual value) for wrong counters
+    '''
+    wrong = []
+    for counter, foreign_key in COUNTERS:
+        model = counter.class_
+        actual = _actual(counter, foreign_key)
+        for row in connection.execute(select([model.id, counter, actual]).where(counter != actual)):
+            wrong.append((model.__tablename__, row[0], counter.key, row[1], row[2]))
+    return wrong
+
+
+def repair_counters(connection):
+    '''
+    Set all wrong counters to actual values
+    :return: number of repaired counters
+    '''
+    repaired = 0
+    for counter, foreign_key in COUNTERS:
+        model = counter.class_
+        actual = _actual(counter, foreign_key)
+        result = connection.execute(model.__table__.update().values({counter.key: actual}).where(counter != actual))
+        repaired += result.rowcount
+    return repaired
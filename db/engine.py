@@ -0,0 +1,111 @@
+from functools import partial
+from weakref import WeakSet
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from db.sql_stats import instrument_engine
+from settings import sets
+
+from logging import getLogger
+log = getLogger(__name__)
+
+_ENGINES = WeakSet()
+
+
+def is_sqlite(url):
+    return url.startswith('sqlite')
+
+
+def is_memory_sqlite(url):
+    return is_sqlite(url) and url.rstrip('/').endswith((':memory:', 'sqlite:'))
+
+
+def create_db_engine(url=None, read_only=False):
+    '''
+    Create engine with settings from sets (pool, sqlite pragmas, busy timeout) and SQL statistics (db.sql_stats).
+    All engines in project must be created here.
+    :param url: db url, by default sets.DB_SCHEME + sets.DB_NAME
+    :param read_only: connections refuse any write (sqlite query_only), own pool size
+    :return: sqlalchemy engine
+    '''
+    url = url or sets.DB_SCHEME + sets.DB_NAME
+    kwargs = {}
+    if is_memory_sqlite(url):
+        # one connection for all threads, otherwise every connection see own empty db
+        kwargs['poolclass'] = StaticPool
+        kwargs['connect_args'] = {'check_same_thread': False}
+    elif is_sqlite(url):
+        # connections are used by one thread at time (scoped session), so they can be shared by pool
+        kwargs['poolclass'] = QueuePool
+        kwargs['connect_args'] = {'check_same_thread': False, 'timeout': sets.DB_BUSY_TIMEOUT / 1000}
+    if not is_sqlite(url) or kwargs['poolclass'] is QueuePool:
+        kwargs['pool_size'] = sets.DB_READ_POOL_SIZE if read_only else sets.DB_POOL_SIZE
+        kwargs['max_overflow'] = sets.DB_POOL_OVERFLOW
+        kwargs['pool_timeout'] = sets.DB_POOL_TIMEOUT
+        kwargs['pool_recycle'] = sets.DB_POOL_RECYCLE
+
+    engine = create_engine(url, **kwargs)
+    if is_sqlite(url):
+        event.listen(engine, 'connect', partial(_set_sqlite_pragmas, read_only))
+    instrument_engine(engine)
+    _ENGINES.add(engine)
+    return engine
+
+
+def create_read_engine(engine):
+    '''
+    Read only engine for the same db as engine.
+    :return: new engine, or engine itself for in-memory sqlite (other connection see other db) or if disabled
+    '''
+    url = str(engine.url)
+    if not sets.DB_READ_ENGINE or is_memory_sqlite(url):
+        return engine
+    return create_db_engine(url, read_only=True)
+
+
+def _set_sqlite_pragmas(read_only, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA busy_timeout = {}'.format(int(sets.DB_BUSY_TIMEOUT)))
+    for pragma, value in sets.DB_PRAGMAS.items():
+        cursor.execute('PRAGMA {} = {}'.format(pragma, value))
+    if read_only:
+        cursor.execute('PRAGMA query_only = 1')
+    cursor.close()
+
+
+def describe_engine(engine):
+    '''
+    Collect effective engine settings (values read back from db, not from sets)
+    :return: dict {setting: value}
+    '''
+    info = {
+        'url': str(engine.url),
+        'pool': type(engine.pool).__name__,
+    }
+    if hasattr(engine.pool, 'size'):
+        info['pool_size'] = engine.pool.size()
+    if engine.dialect.name == 'sqlite':
+        conn = engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            for pragma in ('busy_timeout', 'query_only') + tuple(sets.DB_PRAGMAS):
+                cursor.execute('PRAGMA {}'.format(pragma))
+                row = cursor.fetchone()
+                info[pragma] = row[0] if row else None
+            cursor.close()
+        finally:
+            conn.close()
+    return info
+
+
+def log_engine_settings(engine, name='default'):
+    info = describe_engine(engine)
+    log.info('DB engine "{}": {}'.format(name, ', '.join('{}={}'.format(k, v) for k, v in info.items())))
+    return info
+
+
+def dispose_all():
+    # close pooled connections, needed before db file removing
+    for engine in list(_ENGINES):
+        engine.dispose()
@@ -0,0 +1,79 @@
+'''
+In-process registry of live and interrupted lessons for the busiest pages (main, study/live), read without SQL.
+Db is source of truth: registry is rebuilt from db on first use (or at startup) and changed by LessonHandler and
+CourseHandler after commit of state transitions (see DBBridge.on_commit). It is per process.
+'''
+from threading import Lock
+
+from db.models import Course, Lesson
+
+from logging import getLogger
+log = getLogger(__name__)
+
+LIVE_STATES = (Lesson.LIVE, Lesson.INTERRUPTED)
+
+
+class LiveRegistry:
+
+    def __init__(self):
+        self.loaded = False
+        self.__lessons = {}  # lesson id: LessonRow
+        self.__courses = {}  # course id: [mode, state]
+        self.__lock = Lock()
+
+    def rebuild(self, rows):
+        '''
+        :param rows: (LessonRow, course mode, course state) of all live and interrupted lessons
+        '''
+        lessons, courses = {}, {}
+        for row, mode, state in rows:
+            lessons[row.id] = row
+            courses[row.course_id] = [mode, state]
+        with self.__lock:
+            self.__lessons, self.__courses = lessons, courses
+            self.loaded = True
+        log.info('Live lessons registry loaded: {} lessons'.format(len(lessons)))
+
+    def put(self, row, mode, course_state):
+        # new or changed lesson, it is removed when it leaves live states
+        with self.__lock:
+            if row.state not in LIVE_STATES:
+                self.__remove(row.id)
+                return
+            self.__lessons[row.id] = row
+            self.__courses[row.course_id] = [mode, course_state]
+
+    def remove(self, *lesson_ids):
+        with self.__lock:
+            for lesson_id in lesson_ids:
+                self.__remove(lesson_id)
+
+    def set_course_state(self, course_id, state):
+        with self.__lock:
+            if course_id in self.__courses:
+                self.__courses[course_id][1] = state
+
+    def get_open(self):
+        '''
+        :return: LessonRow list of lessons in open live courses, ordered by course and lesson
+        '''
+        with self.__lock:
+            lessons = [row for row in self.__lessons.values()
+                       if self.__courses[row.course_id] == [Course.OPEN, Course.LIVE]]
+        return sorted(lessons, key=lambda row: (row.course_id, row.id))
+
+    def __len__(self):
+        return len(self.__lessons)
+
+    def clear(self):
+        with self.__lock:
+            self.__lessons, self.__courses = {}, {}
+            self.loaded = False
+
+    def __remove(self, lesson_id):
+        row = self.__lessons.pop(lesson_id, None)
+        if row and not any(other.course_id == row.course_id for other in self.__lessons.values()):
+            self.__courses.pop(row.course_id, None)
+
+
+LIVE_LESSONS = LiveRegistry()
@@ -0,0 +1,163 @@
+'''
+Versioned schema migrations for existing databases.
+New db gets all schema from Base.metadata.create_all and is marked by stamp(), old db is updated by upgrade().
+To change schema: change models and add function with @migration(<next version>) here.
+'''
+from datetime import datetime
+
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, select, inspect
+from sqlalchemy.exc import IntegrityError
+
+from db.counters import repair_counters
+from db.models import Base, Course, HomeWork, Lesson
+from db.search import create_search_tables, rebuild
+
+from logging import getLogger
+log = getLogger(__name__)
+
+MIGRATIONS = {}
+
+SCHEMA_VERSION = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(length=100)),
+    Column('applied', DateTime),
+)
+
+
+def migration(version):
+    def decorator(func):
+        if version in MIGRATIONS:
+            raise BaseException('Migration {} already exist!'.format(version))
+        MIGRATIONS[version] = func
+        return func
+    return decorator
+
+
+def get_applied(connection):
+    SCHEMA_VERSION.create(connection, checkfirst=True)
+    return {row[0] for row in connection.execute(select([SCHEMA_VERSION.c.version]))}
+
+
+def _mark(connection, version):
+    connection.execute(SCHEMA_VERSION.insert().values(
+        version=version, name=MIGRATIONS[version].__name__, applied=datetime.now()))
+
+
+def upgrade(engine):
+    '''
+    Apply all not applied migrations, each in own transaction
+    :return: list of applied migration names
+    '''
+    done = []
+    with engine.begin() as connection:
+        applied = get_applied(connection)
+    for version in sorted(MIGRATIONS):
+        if version in applied:
+            continue
+        func = MIGRATIONS[version]
+        log.info('Apply migration {} "{}"'.format(version, func.__name__))
+        with engine.begin() as connection:
+            func(connection)
+            _mark(connection, version)
+        done.append(func.__name__)
+    return done
+
+
+def stamp(engine):
+    # mark all migrations as applied (db created by create_all already has actual schema)
+    with engine.begin() as connection:
+        applied = get_applied(connection)
+        for version in sorted(MIGRATIONS):
+            if version not in applied:
+                _mark(connection, version)
+
+
+def create_indexes(connection, *names):
+    '''
+    Create indexes declared in models, if they not exist yet.
+    Unique index on duplicated data is created as not unique (with warning), duplicates must be fixed by hand.
+    '''
+    insp = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        existed = {i['name'] for i in insp.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in names or index.name in existed:
+                continue
+            try:
+                index.create(connection)
+            except IntegrityError:
+                if not index.unique:
+                    raise
+                log.warning('Duplicated values in {}, index "{}" created as not unique'.format(
+                    table.name, index.name))
+                connection.execute('CREATE INDEX {} ON "{}" ({})'.format(
+                    index.name, table.name, ', '.join('"{}"'.format(c.name) for c in index.columns)))
+
+
+def add_columns(connection, model, *names):
+    '''
+    Add columns declared in model, if they not exist yet (server_default is used for existing rows).
+    '''
+    table = model.__table__
+    existed = {c['name'] for c in inspect(connection).get_columns(table.name)}
+    for name in names:
+        if name in existed:
+            continue
+        column = table.c[name]
+        ddl = 'ALTER TABLE "{}" ADD COLUMN "{}" {}'.format(table.name, name, column.type.compile(connection.dialect))
+        if column.server_default is not None:
+            ddl += " DEFAULT '{}'".format(column.server_default.arg)
+        if not column.nullable:
+            ddl += ' NOT NULL'
+        connection.execute(ddl)
+
+
+@migration(1)
+def add_lookup_indexes(connection):
+    create_indexes(
+        connection,
+        'ix_user_name',
+        'ix_user_email',
+        'ix_course_name',
+        'ix_course_invite_url',
+        'ix_course_invite_lector_url',
+        'ix_lesson_stream_key',
+        'ix_lesson_material_real_name',
+        'ix_course_access_course_user',
+        'ix_lesson_access_user_lesson',
+        'ix_course_member_course_member',
+    )
+
+
+@migration(2)
+def add_search_index(connection):
+    create_search_tables(connection)
+    rebuild(connection)
+
+
+@migration(3)
+def add_counters(connection):
+    add_columns(connection, Course, 'members_count', 'lessons_count')
+    add_columns(connection, HomeWork, 'answers_count')
+    repair_counters(connection)
+
+
+@migration(4)
+def add_schedule_index(connection):
+    create_indexes(connection, 'ix_lesson_course_start_time')
+
+
+@migration(5)
+def add_answers_index(connection):
+    create_indexes(connection, 'ix_home_work_answer_home_work')
+
+
+@migration(6)
+def clamp_lesson_duration(connection):
+    # lessons created before limit of duration, schedule conflict check relies on it
+    table = Lesson.__table__
+    clamped = connection.execute(table.update().where(table.c.duration > Lesson.MAX_DURATION).values(
+        duration=Lesson.MAX_DURATION)).rowcount
+    if clamped:
+        log.warning('Duration of {} lessons is clamped to {} minutes'.format(clamped, Lesson.MAX_DURATION))
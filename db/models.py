@@ -1,8 +1,8 @@
 from datetime import datetime
 
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, UniqueConstraint, Index
+from sqlalchemy.orm import relationship, validates
 
 from db.custom_types import Choice
 
@@ -14,9 +14,9 @@ class User(Base):
     __tablename__ = 'user'
 
     id = Column(Integer, primary_key=True)
-    name = Column(String(length=30))
+    name = Column(String(length=30), index=True, unique=True)
     password = Column(String(length=60))
-    email = Column(String(length=60))
+    email = Column(String(length=60), index=True, unique=True)
 
     _lesson_access = relationship('LessonAccess', back_populates='_user')
     _course_access = relationship('CourseAccess', back_populates='_user')
@@ -42,6 +42,8 @@ class CourseAccess(Base):
     course = Column(Integer, ForeignKey('course.id'))
     access = Column(Choice(COURSE_LEVEL))
 
+    __table_args__ = Index('ix_course_access_course_user', 'course', 'user', unique=True),  # must be tupple!
+
     _user = relationship('User', back_populates='_course_access')
     _course = relationship('Course', back_populates='_course_access')
 
@@ -63,6 +65,8 @@ class LessonAccess(Base):
     lesson = Column(Integer, ForeignKey('lesson.id'))
     access = Column(Choice(LESSON_LEVEL))
 
+    __table_args__ = Index('ix_lesson_access_user_lesson', 'user', 'lesson', unique=True),  # must be tupple!
+
     _user = relationship('User', back_populates='_lesson_access')
     _lesson = relationship('Lesson', back_populates='_lesson_access')
 
@@ -92,13 +96,16 @@ class Course(Base):
     }
 
     id = Column(Integer, primary_key=True)
-    name = Column(String(length=30))
+    name = Column(String(length=30), index=True, unique=True)
     description = Column(Text)
     owner = Column(Integer, ForeignKey('user.id'))
     mode = Column(Choice(COURSE_MODES))
     state = Column(Choice(COURSE_STATES))
-    invite_url = Column(String(length=36))  # for invites learners in private course
-    invite_lector_url = Column(String(length=36))
+    invite_url = Column(String(length=36), index=True, unique=True)  # for invites learners in private course
+    invite_lector_url = Column(String(length=36), index=True, unique=True)
+    # denormalized counters (see db.counters)
+    members_count = Column(Integer, nullable=False, default=0, server_default='0')
+    lessons_count = Column(Integer, nullable=False, default=0, server_default='0')
 
     _owner = relationship("User", back_populates="_course")
     _course_access = relationship('CourseAccess', back_populates='_course', cascade="save-update, merge, delete")
@@ -121,6 +128,8 @@ class Lesson(Base):
         INTERRUPTED: 'I',
         ENDED: 'E',
     }
+    MIN_DURATION = 10  # minutes
+    MAX_DURATION = 300
 
     id = Column(Integer, primary_key=True)
     name = Column(String(length=30))
@@ -130,7 +139,10 @@ class Lesson(Base):
     state = Column(Choice(LESSON_STATE))
     course = Column(Integer, ForeignKey('course.id'))
 
-    stream_key = Column(String(length=36))
+    # schedule of course, see LessonHandler.get_overlapping
+    __table_args__ = Index('ix_lesson_course_start_time', 'course', 'start_time'),  # must be tupple!
+
+    stream_key = Column(String(length=36), index=True, unique=True)
     stream_pw  = Column(String(length=12))
 
     _lesson_access = relationship('LessonAccess', back_populates='_lesson', cascade="save-update, merge, delete")
@@ -138,6 +150,13 @@ class Lesson(Base):
     _lesson_material = relationship("LessonMaterial", back_populates="_lesson")
     _home_work = relationship("HomeWork", back_populates="_lesson")
 
+    @validates('duration')
+    def validate_duration(self, key, duration):
+        # schedule conflict check looks back only MAX_DURATION (see LessonHandler.get_overlapping)
+        if duration is not None and int(duration) > self.MAX_DURATION:
+            raise ValueError('Lesson duration {} is longer than {} minutes'.format(duration, self.MAX_DURATION))
+        return duration
+
     def start_time_in_format(self, format='%H:%M'):
         now = datetime.now()
         dt = self.start_time
@@ -164,6 +183,8 @@ class CourseMembers(Base):
     member = Column(Integer, ForeignKey('user.id'))
     assign_type = Column(Choice(Course.COURSE_MODES))
 
+    __table_args__ = Index('ix_course_member_course_member', 'course', 'member', unique=True),  # must be tupple!
+
     _course = relationship("Course", back_populates="_course_member")
     _member = relationship("User", back_populates="_course_member")
 
@@ -194,7 +215,7 @@ class LessonMaterial(Base):
 
     id = Column(Integer, primary_key=True)
     pretty_name = Column(String(length=255))
-    real_name = Column(String(length=255))
+    real_name = Column(String(length=255), index=True, unique=True)
     parent_dir = Column(String(length=10))
     lesson = Column(Integer, ForeignKey('lesson.id'))
 
@@ -208,6 +229,7 @@ class HomeWork(Base):
     title = Column(String(length=200))
     description = Column(Text)
     lesson = Column(Integer, ForeignKey('lesson.id'))
+    answers_count = Column(Integer, nullable=False, default=0, server_default='0')  # see db.counters
 
     _lesson = relationship("Lesson", back_populates="_home_work")
     _home_work_answer = relationship("HomeWorkAnswer", back_populates="_home_work", cascade="save-update, merge, delete")
@@ -222,5 +244,8 @@ class HomeWorkAnswer(Base):
     source = Column(Integer, ForeignKey('user.id'))
     grade = Column(Integer)  # in %
 
+    # answers of homework: answers_count (see db.counters), homework check and grading
+    __table_args__ = Index('ix_home_work_answer_home_work', 'home_work'),  # must be tupple!
+
     _home_work = relationship("HomeWork", back_populates="_home_work_answer")
     _source = relationship("User", back_populates="_home_work_answer")
\ No newline at end of file
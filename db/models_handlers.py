@@ -1,20 +1,145 @@
+from base64 import urlsafe_b64encode, urlsafe_b64decode
 from datetime import timedelta, datetime, date
 from pathlib import Path
 from uuid import uuid4
+import json
 
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.orm import load_only
-from sqlalchemy import or_
+from sqlalchemy.orm import load_only, joinedload, subqueryload
+from sqlalchemy.ext import baked
+from sqlalchemy import or_, and_, exists, case, DateTime, bindparam
 
 from db.models import (CourseMembers, Course, User, Lesson, LessonAccess, CourseAccess,
                        CourseInvites, LessonMaterial, HomeWork, HomeWorkAnswer)
 from db.DBBridge import DBBridge
+from db.acl import get_acl, invalidate_acl
+from db.cache import USER_CACHE, COURSE_CACHE
+from db.counters import change_counter
+from db.live import LIVE_LESSONS, LIVE_STATES
+from db.read_models import CourseRow, LessonRow
+from db.scheduler import LESSON_SCHEDULER, window_end
+from db.search import (CourseHit, LessonHit, COURSE_RANK, LESSON_RANK, to_match, index_course, index_lesson,
+                       unindex_lesson)
 from settings import sets
 
 from logging import getLogger
 log = getLogger(__name__)
 
 
+# Eager loading options for listing pages. Every relationship used by page template must be
+# loaded here, otherwise it is lazy loaded for each row (N+1 queries).
+LOAD_PROFILES = {
+    # MainHandler, StudyLiveHandler, StudyFindHandler, CoursesHandler use read models (db.read_models)
+    # StudyManageHandler
+    'study_lessons': (
+        joinedload(Lesson._course).joinedload(Course._owner),
+        subqueryload(Lesson._home_work),
+    ),
+    # StudyInviteHandler
+    'learn_invites': (
+        joinedload(CourseInvites._course).joinedload(Course._owner),
+    ),
+    # HomeWorkCheckHandler
+    'homework_answers': (
+        joinedload(HomeWorkAnswer._source),
+    ),
+    # ManageRightsHandler
+    'course_rights': (
+        joinedload(CourseAccess._user),
+    ),
+}
+
+
+def with_profile(query, profile):
+    return query.options(*LOAD_PROFILES[profile])
+
+
+# answers graded by one UPDATE: IN and CASE take 3 parameters per answer, old SQLite allows 999
+GRADE_BATCH = 300
+
+# compiled lookup queries, key is code of build steps
+BAKERY = baked.bakery()
+
+
+def bake(session, *steps, **params):
+    '''
+    Query for hot lookups: it is built from steps and compiled to SQL once, next calls only bind params.
+    Steps are lambdas (first gets session, others get query), values must be passed as bindparam + params:
+    bake(session, lambda s: s.query(User), lambda q: q.filter(User.name == bindparam('name')), name=name)
+    :return: baked result (one, one_or_none, all...)
+    '''
+    query = BAKERY(steps[0])
+    for step in steps[1:]:
+        query += step
+    if not sets.BAKED_QUERIES:
+        query.spoil(full=True)
+    # decorated functions get scoped_session, baked query needs session itself
+    return query(session()).params(**params)
+
+
+class Page(list):
+    '''
+    One page of models. Cursor is value for "after" argument of next page (None on last page).
+    '''
+
+    def __init__(self, items, cursor=None):
+        super().__init__(items)
+        self.cursor = cursor
+
+
+def encode_cursor(*values):
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, columns=None):
+    '''
+    :param columns: if passed, cursor values are checked and converted for them
+    :raise ValueError: on broken cursor
+    '''
+    values = json.loads(urlsafe_b64decode(cursor.encode()).decode())
+    if not isinstance(values, list) or (columns is not None and len(values) != len(columns)):
+        raise ValueError('Bad cursor "{}"'.format(cursor))
+    if columns is not None:
+        values = [_cursor_value(c, v) for c, v in zip(columns, values)]
+    return values
+
+
+def _cursor_value(column, value):
+    if isinstance(column.type, DateTime) and isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f' if '.' in value else '%Y-%m-%dT%H:%M:%S')
+    if isinstance(value, (list, dict)):
+        raise ValueError('Bad cursor value {!r}'.format(value))
+    return value
+
+
+def paginate(query, columns, after=None, limit=None, factory=None):
+    '''
+    Keyset pagination: seek by columns instead of OFFSET, so every page costs the same.
+    :param columns: column or tuple of columns (start_time, id); the last one must be unique
+    :param after: cursor from previous Page
+    :param factory: class for rows of column-only query (ReadModel)
+    :return: Page
+    '''
+    if not isinstance(columns, (tuple, list)):
+        columns = (columns,)
+    limit = limit or sets.PAGE_SIZE
+    if after:
+        values = decode_cursor(after, columns)
+        # (a, b) > (x, y)  ->  a > x OR (a = x AND b > y)
+        seek = columns[-1] > values[-1]
+        for column, value in zip(reversed(columns[:-1]), reversed(values[:-1])):
+            seek = or_(column > value, and_(column == value, seek))
+        query = query.filter(seek)
+    items = query.order_by(*columns).limit(limit + 1).all()
+    if factory:
+        items = factory.from_rows(items)
+    if len(items) > limit:
+        items = items[:limit]
+        return Page(items, encode_cursor(*(getattr(items[-1], column.key) for column in columns)))
+    return Page(items)
+
+
 class DbHandlerBase:
 
     def __init__(self, dbb: DBBridge):
@@ -24,12 +149,19 @@ class DbHandlerBase:
 class UserHandler(DbHandlerBase):
 
     @staticmethod
+    @DBBridge.memoize
     @DBBridge.query_db
     def get(session, username: str):
-        user = session.query(User).filter(User.name == username).one_or_none()
+        user = USER_CACHE.get_or_load(session, username, lambda: bake(
+            session,
+            lambda s: s.query(User),
+            lambda q: q.filter(User.name == bindparam('name')),
+            name=username,
+        ).one_or_none())
         return user
 
     @staticmethod
+    @DBBridge.memoize
     @DBBridge.query_db
     def get_by_email(session, email):
         return session.query(User).filter(User.email == email).one_or_none()
@@ -44,26 +176,29 @@ class UserHandler(DbHandlerBase):
 
 class CourseAccessHandler(DbHandlerBase):
     @staticmethod
-    @DBBridge.modife_db
-    def get_all_by_course(session, course_id):
-        return session.query(CourseAccess).filter(CourseAccess.course == course_id)
+    @DBBridge.query_db
+    def get_all_by_course(session, course_id, after=None):
+        return paginate(with_profile(session.query(CourseAccess), 'course_rights').filter(
+            CourseAccess.course == course_id), CourseAccess.id, after)
 
     @staticmethod
-    @DBBridge.modife_db
+    @DBBridge.memoize
+    @DBBridge.query_db
     def check_any_access(session, user, course):
-        return session.query(CourseAccess).filter(CourseAccess.course == course.id,
-                                                  CourseAccess.user == user.id,
-                                                  ).one_or_none()
+        '''
+        :return: CourseRight of user or None
+        '''
+        return get_acl(session, course.id).course_right(user.id)
 
     @staticmethod
-    @DBBridge.modife_db
+    @DBBridge.memoize
+    @DBBridge.query_db
     def check_write_access(session, username, course_id):
         user = UserHandler.get(username)
-        course = CourseHandler.get_by_id(course_id)
-        return session.query(CourseAccess).filter(CourseAccess.course == course.id,
-                                                  CourseAccess.user == user.id,
-                                                  CourseAccess.access == CourseAccess.MODERATE,
-                                                  ).one_or_none()
+        acl = get_acl(session, course_id)
+        right = acl and acl.course_right(user.id)
+        if right and right.access == CourseAccess.MODERATE:
+            return right
 
     @staticmethod
     @DBBridge.modife_db
@@ -96,22 +231,18 @@ class CourseAccessHandler(DbHandlerBase):
         return session.query(Course).join(CourseAccess).filter(CourseAccess.user == user.id)
 
     @staticmethod
-    def check_write_access_by_lesson(username, lesson: Lesson):
+    @DBBridge.query_db
+    def check_write_access_by_lesson(session, username, lesson: Lesson):
         user = UserHandler.get(username)
-        course = lesson._course
-        if course.owner == user.id:
-            return True
-        for c_access in course._course_access:
-            if c_access.user == user.id and c_access.access == CourseAccess.MODERATE:
-                return True
+        return get_acl(session, lesson.course).can_moderate(user.id)
 
     @staticmethod
     @DBBridge.modife_db
     def modify_access_many(session, course_id, new_right):
-        #  newRight: {'user1': 'Browse'}
+        #  newRight: {'user1': 'Browse'}, only users of posted page (rights list is paginated)
         course = CourseHandler.get_by_id(course_id)
         for access, user in session.query(CourseAccess, User).join(User).filter(
-                        CourseAccess.course == course_id):
+                        CourseAccess.course == course_id, User.name.in_(new_right)):
             if course.owner == user.id:
                 continue
             if new_right[user.name] == 'Remove':
@@ -135,19 +266,40 @@ class CourseAccessHandler(DbHandlerBase):
 class LessonAccessHandler(DbHandlerBase):
 
     @staticmethod
-    def add_access_to_all_partners(course_id, lesson_id):
-        for course_access in CourseAccessHandler.get_all_by_course(course_id):
-            if course_access.access == CourseAccess.MODERATE:
+    @DBBridge.modife_db
+    def add_access_to_all_partners(session, course_id, lesson_id):
+        rows = []
+        for user_id, course_access in session.query(CourseAccess.user, CourseAccess.access).filter(
+                CourseAccess.course == course_id):
+            if course_access == CourseAccess.MODERATE:
                 lesson_access = LessonAccess.MODERATE
             else:
                 lesson_access = LessonAccess.VIEW
-            LessonAccessHandler.add_access(course_access.user, lesson_id, lesson_access)
+            rows.append((user_id, lesson_id, lesson_access))
+        return LessonAccessHandler.add_access_many(rows)
 
     @staticmethod
-    def add_access_to_all_lesson(username, course, access):
+    @DBBridge.modife_db
+    def add_access_to_all_lesson(session, username, course, access):
         user = UserHandler.get(username)
-        for lesson in course._lesson:
-            LessonAccessHandler.add_access(user.id, lesson.id, access)
+        existed = session.query(LessonAccess.lesson).join(Lesson).filter(
+            LessonAccess.user == user.id, Lesson.course == course.id)
+        lessons = session.query(Lesson.id).filter(Lesson.course == course.id, ~Lesson.id.in_(existed))
+        return LessonAccessHandler.add_access_many((user.id, lesson_id, access) for lesson_id, in lessons)
+
+    @staticmethod
+    @DBBridge.modife_db
+    def add_access_many(session, rows):
+        '''
+        Add lesson accesses by one INSERT statement
+        :param rows: iterable of (user_id, lesson_id, access)
+        :return: count of added accesses
+        '''
+        rows = [{'user': user_id, 'lesson': lesson_id, 'access': access} for user_id, lesson_id, access in rows]
+        if rows:
+            session.execute(LessonAccess.__table__.insert(), rows)
+            invalidate_acl(session, lesson_ids=[row['lesson'] for row in rows])  # INSERT is not flush
+        return len(rows)
 
 
     @staticmethod
@@ -163,18 +315,18 @@ class LessonAccessHandler(DbHandlerBase):
 
     @staticmethod
     def check_write_access(username, lesson: Lesson):
-        user = UserHandler.get(username)
-        for l_access in lesson._lesson_access:
-            if l_access.user == user.id and l_access.access == LessonAccess.MODERATE:
-                return True
+        access = LessonAccessHandler.check_any_access(username, lesson)
+        return bool(access) and access.access == LessonAccess.MODERATE
 
     @staticmethod
+    @DBBridge.memoize
     @DBBridge.query_db
     def check_any_access(session, username, lesson: Lesson):
+        '''
+        :return: LessonRight of user or None
+        '''
         user = UserHandler.get(username)
-        access = session.query(LessonAccess).filter(
-            LessonAccess.user == user.id, LessonAccess.lesson == lesson.id).one_or_none()
-        return access
+        return get_acl(session, lesson.course).lesson_right(user.id, lesson.id)
 
     @staticmethod
     @DBBridge.query_db
@@ -192,7 +344,7 @@ class LessonAccessHandler(DbHandlerBase):
         #  newRight: {les111: "Teach", les2: "View", lesson_3: "View"}
         user = UserHandler.get(username)
         for access, l_name in session.query(LessonAccess, Lesson.name).join(Lesson).filter(
-                        Lesson.course == course_id, LessonAccess.user == user.id):
+                        Lesson.course == course_id, LessonAccess.user == user.id, Lesson.name.in_(new_right)):
             LessonAccessHandler.modify_access(access, new_right[l_name])
 
 
@@ -213,11 +365,11 @@ class LessonAccessHandler(DbHandlerBase):
 class CourseHandler(DbHandlerBase):
     @staticmethod
     @DBBridge.query_db
-    def get_all_by_partner(session, username):
-        return session.query(Course).join(CourseAccess).join(User).filter(
-            User.name == username,
-            CourseAccess.user == User.id,
-        )
+    def get_all_by_partner(session, username, after=None):
+        user = UserHandler.get(username)
+        return paginate(CourseRow.query(session).join(CourseAccess).filter(
+            CourseAccess.user == user.id,
+        ), Course.id, after, factory=CourseRow)
 
     @staticmethod
     @DBBridge.query_db
@@ -240,23 +392,37 @@ class CourseHandler(DbHandlerBase):
         return access._course, access, user
 
     @staticmethod
+    @DBBridge.memoize
     @DBBridge.query_db
     def get_by_id(session, course_id):
-        course = session.query(Course).filter(Course.id == course_id).one()
+        course = COURSE_CACHE.get_or_load(session, course_id, lambda: bake(
+            session,
+            lambda s: s.query(Course),
+            lambda q: q.filter(Course.id == bindparam('id')),
+            id=course_id,
+        ).one())
         return course
 
     @staticmethod
+    @DBBridge.memoize
     @DBBridge.query_db
     def get(session, course_name):
-        course = session.query(Course).filter(Course.name == course_name).one_or_none()
+        course = bake(
+            session,
+            lambda s: s.query(Course),
+            lambda q: q.filter(Course.name == bindparam('name')),
+            name=course_name,
+        ).one_or_none()
         return course
 
     @staticmethod
+    @DBBridge.memoize
     @DBBridge.query_db
     def get_by_invite_learn_url(session, invite_url):
         return session.query(Course).filter(Course.invite_url == invite_url).one_or_none()
 
     @staticmethod
+    @DBBridge.memoize
     @DBBridge.query_db
     def get_by_invite_teach_url(session, invite_url):
         return session.query(Course).filter(Course.invite_lector_url == invite_url).one_or_none()
@@ -267,49 +433,46 @@ class CourseHandler(DbHandlerBase):
         return session.query(Course).filter(Course.stream_key == key).one_or_none()
 
     @staticmethod
-    @DBBridge.query_db
-    def get_open_course_live_lesson(session):
-        lives = []
-        try:
-            courses = session.query(Course).filter(
-                Course.mode == Course.OPEN,
-                Course.state == Course.LIVE,
-            )
-            for c in courses:
-                for lesson in c._lesson:
-                    if lesson.state == Lesson.LIVE or lesson.state == Lesson.INTERRUPTED:
-                        lives.append(lesson)
-        except NoResultFound:
-            print('No LIVE course')
-            pass
-        return lives
+    def get_open_course_live_lesson():
+        # from registry, without SQL (only first call loads registry)
+        if not LIVE_LESSONS.loaded:
+            LessonHandler.load_live_lessons()
+        return LIVE_LESSONS.get_open()
 
     @staticmethod
     @DBBridge.query_db
-    def get_all_course(session, username):
+    def get_all_course(session, username, open_after=None, closed_after=None):
+        '''
+        Published/live courses, where user is not a member yet.
+        :return: open courses Page, closed courses Page
+        '''
         user = UserHandler.get(username)
-        open_courses = []
-        closed_courses = []
-        try:
-            courses = session.query(Course).filter(
-                or_(Course.state == Course.LIVE, Course.state == Course.PUBLISHED),
-                or_(Course.mode == Course.OPEN, Course.mode == Course.CLOSED),
-            )
-            for c in courses:
-                already_member = False
-                for member in c._course_member:
-                    if member.member == user.id:
-                        already_member = True
-                if already_member:
-                    continue
-                if c.mode == Course.OPEN:
-                    open_courses.append(c)
-                else:
-                    closed_courses.append(c)
-        except NoResultFound:
-            print('NO open or closed courses on server ;(')
+        courses = CourseRow.query(session).filter(
+            or_(Course.state == Course.LIVE, Course.state == Course.PUBLISHED),
+            ~exists().where(and_(CourseMembers.course == Course.id, CourseMembers.member == user.id)),
+        )
+        open_courses = paginate(courses.filter(Course.mode == Course.OPEN), Course.id, open_after,
+                                factory=CourseRow)
+        closed_courses = paginate(courses.filter(Course.mode == Course.CLOSED), Course.id, closed_after,
+                                  factory=CourseRow)
         return open_courses, closed_courses
 
+    @staticmethod
+    @DBBridge.query_db
+    def search(session, text, after=None):
+        '''
+        Published/live open and closed courses, matched by name and description, the most relevant first.
+        :return: Page of CourseHit
+        '''
+        match = to_match(text)
+        if not match:
+            return Page([])
+        courses = CourseHit.query(session, match).filter(
+            or_(Course.state == Course.LIVE, Course.state == Course.PUBLISHED),
+            or_(Course.mode == Course.OPEN, Course.mode == Course.CLOSED),
+        )
+        return paginate(courses, (COURSE_RANK, Course.id), after, factory=CourseHit)
+
     @staticmethod
     @DBBridge.query_db
     def get_all_by_owner(session, username):
@@ -321,6 +484,7 @@ class CourseHandler(DbHandlerBase):
         return courses
 
     @staticmethod
+    @DBBridge.memoize
     @DBBridge.query_db
     def get_course_by_id(session, course_id):
         course = session.query(Course).filter(Course.id == course_id).one_or_none()
@@ -344,7 +508,8 @@ class CourseHandler(DbHandlerBase):
             invite_lector_url=str(uuid4()),
         )
         session.add(c)
-        session.commit()
+        session.flush()
+        index_course(session, c)
         CourseAccessHandler.add_moderate_access(user, c)
         return c
 
@@ -362,6 +527,7 @@ class CourseHandler(DbHandlerBase):
             )
             log.info('Associate user "{}" with course "{}"'.format(username, course_name))
             session.add(cm)
+            change_counter(session, Course.members_count, course.id)
             return cm
 
     @staticmethod
@@ -378,6 +544,7 @@ class CourseHandler(DbHandlerBase):
             )
             log.info('Associate user "{}" with course "{}"'.format(username, course.name))
             session.add(cm)
+            change_counter(session, Course.members_count, course.id)
             return cm
 
     @staticmethod
@@ -393,6 +560,7 @@ class CourseHandler(DbHandlerBase):
             )
             log.info('Associate user "{}" with course "{}"'.format(username, course.name))
             session.add(cm)
+            change_counter(session, Course.members_count, course.id)
             return cm
 
 
@@ -404,29 +572,68 @@ class CourseHandler(DbHandlerBase):
         course = CourseHandler.get_by_id(course_id)
         if course.owner == user.id:
             course.state = state
+            # handlers pass id from request argument, registry is keyed by int id
+            DBBridge.on_commit(lambda course_id=course.id: LIVE_LESSONS.set_course_state(course_id, state))
             return course
 
 
 class LessonHandler(DbHandlerBase):
 
     @staticmethod
+    @DBBridge.memoize
     @DBBridge.query_db
     def get_by_id(session, lesson_id):
-        return session.query(Lesson).filter(Lesson.id == lesson_id).one()
+        return bake(
+            session,
+            lambda s: s.query(Lesson),
+            lambda q: q.filter(Lesson.id == bindparam('id')),
+            id=lesson_id,
+        ).one()
 
     @staticmethod
+    @DBBridge.memoize
     @DBBridge.query_db
     def get_by_keys(session, stream_key, stream_pw):
-        return session.query(Lesson).filter(
-            Lesson.stream_key == stream_key, Lesson.stream_pw == stream_pw
+        return bake(
+            session,
+            lambda s: s.query(Lesson),
+            lambda q: q.filter(Lesson.stream_key == bindparam('key'), Lesson.stream_pw == bindparam('pw')),
+            key=stream_key, pw=stream_pw,
         ).one_or_none()
 
     @staticmethod
     @DBBridge.query_db
     def check_in_course(session, lec_name, course_id):
-        return session.query(Lesson).join(Course).filter(
-            Lesson.name == lec_name, Course.id == course_id
-        ).one_or_none()
+        return session.query(Lesson).filter(
+            Lesson.course == course_id, Lesson.name == lec_name
+        ).first()
+
+    @staticmethod
+    @DBBridge.query_db
+    def get_overlapping(session, start_time, duration, course_id=None, username=None, exclude=None):
+        '''
+        Lessons of course and/or lecturer (teach or moderate access), which intersect [start_time, start_time + duration).
+        Lesson can't be longer than MAX_DURATION (checked by Lesson model, legacy rows are clamped by migration 6),
+        so only lessons started in MAX_DURATION before new one can overlap:
+        it is one range scan of ix_lesson_course_start_time (lesson_access index for lecturer),
+        exact end check is done for this few rows.
+        :param exclude: id of modified lesson
+        :return: list of Lesson ordered by start time
+        '''
+        end_time = start_time + timedelta(minutes=duration)
+        query = session.query(Lesson).filter(
+            Lesson.start_time > start_time - timedelta(minutes=Lesson.MAX_DURATION),
+            Lesson.start_time < end_time,
+        )
+        if course_id is not None:
+            query = query.filter(Lesson.course == course_id)
+        if username is not None:
+            query = query.join(LessonAccess).join(User).filter(
+                User.name == username, LessonAccess.access != LessonAccess.VIEW)
+        if exclude is not None:
+            query = query.filter(Lesson.id != exclude)
+        return [lesson for lesson in query.order_by(Lesson.start_time, Lesson.id)
+                if lesson.start_time + timedelta(minutes=lesson.duration) > start_time]
 
     @staticmethod
     def check_owner(username, lesson_id):
@@ -435,6 +642,12 @@ class LessonHandler(DbHandlerBase):
             return lesson
 
 
+    @staticmethod
+    @DBBridge.query_db
+    def get_rows_by_course(session, course_id):
+        return LessonRow.from_rows(LessonRow.query(session).filter(Lesson.course == course_id).order_by(
+            Lesson.start_time, Lesson.id))
+
     @staticmethod
     def get_all_by_course(course_id):
         lessons = []
@@ -448,14 +661,14 @@ class LessonHandler(DbHandlerBase):
         lesson = LessonHandler.get_by_keys(stream_key, stream_pw)
         if lesson and lesson.state != lesson.ENDED:
             accept_start = lesson.start_time - timedelta(minutes=sets.STREAM_WINDOW)
-            accept_end = lesson.start_time + timedelta(minutes=lesson.duration) + timedelta(minutes=sets.STREAM_WINDOW)
-            if accept_start < datetime.now() < accept_end:
+            if accept_start < datetime.now() < window_end(lesson.start_time, lesson.duration):
                 if lesson.state == Lesson.WAITING or lesson.state == Lesson.INTERRUPTED:
                     lesson.state = Lesson.LIVE
                     log.debug('change lesson "{}" state from "{}" to "Live"'.format(lesson.name, lesson.state))
                     if lesson._course.state != Course.LIVE:
                         lesson._course.state = Course.LIVE
                         log.debug('Change course "{}" state to live'.format(lesson._course.name))
+                    LessonHandler.update_live_lesson(lesson)
             else:
                 lesson = None
         return lesson
@@ -468,6 +681,65 @@ class LessonHandler(DbHandlerBase):
             # this can`t be possible on normal request
             return
         lesson.state = Lesson.INTERRUPTED
+        LessonHandler.update_live_lesson(lesson)
+
+    @staticmethod
+    def update_live_lesson(lesson):
+        '''
+        Put lesson to live registry after commit (or remove it, if it is not live now).
+        Values are copied now: after commit model is expired.
+        '''
+        row = LessonRow.from_model(lesson)
+        mode, state = lesson._course.mode, lesson._course.state
+        DBBridge.on_commit(lambda: LIVE_LESSONS.put(row, mode, state))
+
+    @staticmethod
+    @DBBridge.query_db
+    def load_live_lessons(session):
+        '''
+        Rebuild live registry from db, at startup
+        :return: number of live and interrupted lessons
+        '''
+        rows = LessonRow.query(session).add_columns(Course.mode, Course.state).filter(Lesson.state.in_(LIVE_STATES))
+        LIVE_LESSONS.rebuild((LessonRow(*row[:-2]), row[-2], row[-1]) for row in rows)
+        return len(LIVE_LESSONS)
+
+    @staticmethod
+    @DBBridge.query_db
+    def load_schedule(session):
+        '''
+        Fill lesson scheduler from db, at startup
+        :return: number of not ended lessons
+        '''
+        LESSON_SCHEDULER.rebuild(session.query(Lesson.id, Lesson.start_time, Lesson.duration).filter(
+            Lesson.state != Lesson.ENDED))
+        return len(LESSON_SCHEDULER)
+
+    @staticmethod
+    @DBBridge.modife_db
+    def end_lessons(session, lesson_ids):
+        '''
+        End lessons, which stream window is over (called by scheduler). Time is checked again:
+        lesson can be modified after scheduler took it.
+        :return: number of ended lessons
+        '''
+        now = datetime.now()
+        lessons = session.query(Lesson).filter(Lesson.id.in_(lesson_ids), Lesson.state != Lesson.ENDED).all()
+        ended = []
+        for lesson in lessons:
+            if window_end(lesson.start_time, lesson.duration) > now:
+                LessonHandler.schedule_lesson(lesson)
+                continue
+            log.debug('Lesson "{}" state from "{}" to "Ended" by scheduler'.format(lesson.name, lesson.state))
+            lesson.state = Lesson.ENDED
+            ended.append(lesson.id)
+        DBBridge.on_commit(lambda: LIVE_LESSONS.remove(*ended))
+        return len(ended)
+
+    @staticmethod
+    def schedule_lesson(lesson):
+        lesson_id, start_time, duration = lesson.id, lesson.start_time, lesson.duration
+        DBBridge.on_commit(lambda: LESSON_SCHEDULER.put(lesson_id, start_time, duration))
 
     @staticmethod
     @DBBridge.modife_db
@@ -483,11 +755,20 @@ class LessonHandler(DbHandlerBase):
             stream_pw=str(uuid4()).split('-')[-1]  # last string after '-' in ******-****-****-****-******
         )
         session.add(l)
+        session.flush()
+        index_lesson(session, l)
+        change_counter(session, Course.lessons_count, course_id)
+        LessonHandler.schedule_lesson(l)
         return l
 
     @staticmethod
     @DBBridge.modife_db
     def delete_lesson(session, lesson):
+        unindex_lesson(session, lesson.id)
+        change_counter(session, Course.lessons_count, lesson.course, -1)
+        lesson_id = lesson.id
+        DBBridge.on_commit(lambda: LIVE_LESSONS.remove(lesson_id))
+        DBBridge.on_commit(lambda: LESSON_SCHEDULER.remove(lesson_id))
         session.delete(lesson)
         return lesson
 
@@ -500,12 +781,34 @@ class LessonHandler(DbHandlerBase):
         lesson.description = les_descr
         lesson.start_time = start_time
         lesson.duration = dur
+        index_lesson(session, lesson)
+        if lesson.state in LIVE_STATES:
+            LessonHandler.update_live_lesson(lesson)
+        if lesson.state != Lesson.ENDED:
+            LessonHandler.schedule_lesson(lesson)
         return lesson
 
+    @staticmethod
+    @DBBridge.query_db
+    def search(session, text, after=None):
+        '''
+        Lessons of published/live open and closed courses, matched by name and description.
+        :return: Page of LessonHit
+        '''
+        match = to_match(text)
+        if not match:
+            return Page([])
+        lessons = LessonHit.query(session, match).filter(
+            or_(Course.state == Course.LIVE, Course.state == Course.PUBLISHED),
+            or_(Course.mode == Course.OPEN, Course.mode == Course.CLOSED),
+        )
+        return paginate(lessons, (LESSON_RANK, Lesson.id), after, factory=LessonHit)
+
 
 class CourseMembersHandler(DbHandlerBase):
 
     @staticmethod
+    @DBBridge.memoize
     @DBBridge.query_db
     def get_member_by_course(session, course_id, user_id):
         return session.query(CourseMembers).filter(
@@ -514,30 +817,34 @@ class CourseMembersHandler(DbHandlerBase):
 
     @staticmethod
     @DBBridge.query_db
-    def get_all_study_course(session, username):
+    def get_study_lessons(session, username, after=None):
+        # lessons of all courses where user is member, by start time
         user = UserHandler.get(username)
-        user_in = session.query(CourseMembers).filter(CourseMembers.member == user.id)
-        return user_in
+        lessons = with_profile(session.query(Lesson), 'study_lessons').join(
+            CourseMembers, CourseMembers.course == Lesson.course).filter(CourseMembers.member == user.id)
+        return paginate(lessons, (Lesson.start_time, Lesson.id), after)
 
 
 class CourseInvitesHandler(DbHandlerBase):
 
     @staticmethod
     @DBBridge.query_db
-    def get_learn_invites(session, username):
+    def get_learn_invites(session, username, after=None):
         user = UserHandler.get(username)
-        invites = session.query(CourseInvites).filter(CourseInvites.member == user.id,
-                                                      CourseInvites.action == CourseInvites.LEARN)
-        return invites
+        invites = with_profile(session.query(CourseInvites), 'learn_invites').filter(
+            CourseInvites.member == user.id, CourseInvites.action == CourseInvites.LEARN)
+        return paginate(invites, CourseInvites.id, after)
 
     @staticmethod
     @DBBridge.modife_db
     def learn_invite_on_decline(session, course_name, invited_user):
-        user_course = CourseInvitesHandler.get_learn_invites(invited_user)
-        for c in user_course:
-            if c._course.name == course_name:
-                session.delete(c)
-                return c
+        user = UserHandler.get(invited_user)
+        invite = session.query(CourseInvites).join(Course).filter(
+            CourseInvites.member == user.id, CourseInvites.action == CourseInvites.LEARN, Course.name == course_name
+        ).first()
+        if invite:
+            session.delete(invite)
+            return invite
         log.warning('No association for user "{}" and course "{}" in CourseInvites'.format(invited_user, course_name))
 
     @staticmethod
@@ -643,6 +950,7 @@ class HomeWorkHandler(DbHandlerBase):
                 return lesson
 
     @staticmethod
+    @DBBridge.memoize
     @DBBridge.query_db
     def get_by_id(session, hw_id):
         return session.query(HomeWork).filter(HomeWork.id == hw_id).one()
@@ -682,19 +990,43 @@ class HomeWorkAnswerHandler(DbHandlerBase):
             source=user.id,
         )
         session.add(hw_answer)
+        change_counter(session, HomeWork.answers_count, hw_id)
         return hw_answer
 
     @staticmethod
     @DBBridge.modife_db
     def grade_answer(session, answer_id, grade):
-        print(answer_id)
-        print(grade)
         answer = session.query(HomeWorkAnswer).filter(HomeWorkAnswer.id == answer_id).one()
         answer.grade = grade
         return answer
 
     @staticmethod
     @DBBridge.modife_db
+    def grade_answers(session, hw_id, grades):
+        '''
+        Grade many answers of one homework in one transaction: one query of answer ids of homework
+        (ix_home_work_answer_home_work, no parameter per answer) checks answers, one UPDATE with CASE
+        per GRADE_BATCH answers sets grades.
+        :param grades: {answer id: grade}
+        :return: ids of answers, which are not answers of this homework (nothing is graded then)
+        '''
+        grades = {int(answer_id): int(grade) for answer_id, grade in grades.items()}
+        found = {answer_id for answer_id, in session.query(HomeWorkAnswer.id).filter(
+            HomeWorkAnswer.home_work == hw_id)}
+        unknown = sorted(set(grades) - found)
+        if unknown:
+            return unknown
+        answer_ids = sorted(grades)
+        table = HomeWorkAnswer.__table__
+        for start in range(0, len(answer_ids), GRADE_BATCH):
+            batch = {answer_id: grades[answer_id] for answer_id in answer_ids[start:start + GRADE_BATCH]}
+            session.execute(table.update().where(table.c.id.in_(batch)).values(
+                grade=case(batch, value=table.c.id)))
+        log.info('Graded {} answers of homework {}'.format(len(grades), hw_id))
+        return []
+
+    @staticmethod
+    @DBBridge.query_db
     def get_user_anwers(session, username, homeworks):
         user = UserHandler.get(username)
         user_anwers = {}
@@ -706,9 +1038,10 @@ class HomeWorkAnswerHandler(DbHandlerBase):
         return user_anwers
 
     @staticmethod
-    @DBBridge.modife_db
-    def get_all_homework_answers(session, hw_id):
-        return session.query(HomeWorkAnswer).filter(HomeWorkAnswer.home_work == hw_id)
+    @DBBridge.query_db
+    def get_all_homework_answers(session, hw_id, after=None):
+        return paginate(with_profile(session.query(HomeWorkAnswer), 'homework_answers').filter(
+            HomeWorkAnswer.home_work == hw_id), HomeWorkAnswer.id, after)
 
 
 class OwnerAccess:
@@ -0,0 +1,85 @@
+'''
+Read models: compact read only projections for list pages.
+They are built from column-only queries (no identity map, no relationship state, no full description),
+so they can be rendered anywhere, also after session close.
+'''
+from abc import ABC, abstractmethod
+
+from sqlalchemy import func
+
+from db.models import Course, Lesson, User
+
+SUMMARY_LENGTH = 200  # characters of description shown in lists
+
+
+class ReadModel(ABC):
+    '''
+    Row of column-only query: subclass lists fields in __slots__ and implements query(session, ...)
+    with columns in the same order.
+    '''
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return '<{} {}>'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(name, getattr(self, name)) for name in self.__slots__))
+
+    @classmethod
+    @abstractmethod
+    def query(cls, session, *args):
+        # columns must be in the same order as __slots__
+        pass
+
+    @classmethod
+    def from_rows(cls, rows):
+        return [cls(*row) for row in rows]
+
+
+class CourseRow(ReadModel):
+
+    __slots__ = ('id', 'name', 'summary', 'mode', 'state', 'members_count', 'lessons_count', 'owner_name')
+
+    @classmethod
+    def query(cls, session):
+        return session.query(
+            Course.id,
+            Course.name,
+            func.substr(Course.description, 1, SUMMARY_LENGTH).label('summary'),
+            Course.mode,
+            Course.state,
+            Course.members_count,
+            Course.lessons_count,
+            User.name.label('owner_name'),
+        ).join(User, Course.owner == User.id)
+
+
+class LessonRow(ReadModel):
+
+    __slots__ = ('id', 'name', 'summary', 'start_time', 'duration', 'state', 'course_id', 'course_name',
+                 'owner_name')
+
+    start_time_in_format = Lesson.start_time_in_format
+
+    @classmethod
+    def query(cls, session):
+        return session.query(
+            Lesson.id,
+            Lesson.name,
+            func.substr(Lesson.description, 1, SUMMARY_LENGTH).label('summary'),
+            Lesson.start_time,
+            Lesson.duration,
+            Lesson.state,
+            Course.id.label('course_id'),
+            Course.name.label('course_name'),
+            User.name.label('owner_name'),
+        ).join(Course, Lesson.course == Course.id).join(User, Course.owner == User.id)
+
+    @classmethod
+    def from_model(cls, lesson):
+        course = lesson._course
+        return cls(lesson.id, lesson.name, (lesson.description or '')[:SUMMARY_LENGTH], lesson.start_time,
+                   lesson.duration, lesson.state, course.id, course.name, course._owner.name)
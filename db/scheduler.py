@@ -0,0 +1,147 @@
+'''
+Lesson state scheduler: lessons, which stream window is over, are ended without nginx callbacks.
+Heap keeps (window end, lesson id) of not ended lessons, IOLoop timer is set to the nearest end,
+all lessons due at this moment are ended in one transaction. Heap is loaded from db at startup
+(LessonHandler.load_schedule) and changed by LessonHandler after commit of lesson create/modify/delete.
+Entries of modified and deleted lessons are not removed from heap, they are skipped as stale.
+'''
+from datetime import datetime, timedelta
+from heapq import heappush, heappop
+from threading import Lock
+
+from settings import sets
+
+from logging import getLogger
+log = getLogger(__name__)
+
+
+def window_end(start_time, duration):
+    # stream is accepted till this time, see LessonHandler.activate_lesson
+    return start_time + timedelta(minutes=duration + sets.STREAM_WINDOW)
+
+
+class LessonScheduler:
+
+    def __init__(self):
+        self.__heap = []
+        self.__ends = {}  # lesson id: actual window end
+        self.__lock = Lock()
+        self.__io_loop = None
+        self.__end_lessons = None
+        self.__timer = None
+        self.__running = False
+
+    def rebuild(self, rows):
+        '''
+        :param rows: (lesson id, start time, duration) of all not ended lessons
+        '''
+        ends = {lesson_id: window_end(start_time, duration) for lesson_id, start_time, duration in rows}
+        with self.__lock:
+            self.__ends = ends
+            self.__heap = [(end, lesson_id) for lesson_id, end in ends.items()]
+            self.__heap.sort()
+        log.info('Lesson scheduler loaded: {} lessons'.format(len(ends)))
+        self.__wake()
+
+    def start(self, io_loop, end_lessons):
+        '''
+        :param end_lessons: coroutine function, that ends lessons by ids in one transaction
+        '''
+        self.__io_loop = io_loop
+        self.__end_lessons = end_lessons
+        self.__wake()
+
+    def stop(self):
+        if self.__timer:
+            self.__io_loop.remove_timeout(self.__timer)
+        self.__io_loop, self.__end_lessons, self.__timer = None, None, None
+
+    def put(self, lesson_id, start_time, duration):
+        # new or modified lesson, can be called from any thread
+        end = window_end(start_time, duration)
+        with self.__lock:
+            self.__ends[lesson_id] = end
+            heappush(self.__heap, (end, lesson_id))
+        self.__wake()
+
+    def remove(self, lesson_id):
+        with self.__lock:
+            self.__ends.pop(lesson_id, None)
+
+    def due(self, now=None):
+        '''
+        Take lessons, which window is over
+        :return: list of lesson ids, at most SCHEDULER_BATCH
+        '''
+        now = now or datetime.now()
+        lesson_ids = []
+        with self.__lock:
+            while self.__heap and len(lesson_ids) < sets.SCHEDULER_BATCH:
+                end, lesson_id = self.__heap[0]
+                if self.__ends.get(lesson_id) != end:
+                    heappop(self.__heap)  # stale
+                    continue
+                if end > now:
+                    break
+                heappop(self.__heap)
+                del self.__ends[lesson_id]
+                lesson_ids.append(lesson_id)
+        return lesson_ids
+
+    def nearest(self):
+        '''
+        :return: the nearest window end or None
+        '''
+        with self.__lock:
+            while self.__heap and self.__ends.get(self.__heap[0][1]) != self.__heap[0][0]:
+                heappop(self.__heap)
+            return self.__heap[0][0] if self.__heap else None
+
+    def __len__(self):
+        return len(self.__ends)
+
+    def clear(self):
+        with self.__lock:
+            self.__heap, self.__ends = [], {}
+
+    def __wake(self):
+        # timer is changed only on IOLoop thread
+        if self.__io_loop:
+            self.__io_loop.add_callback(self.__reschedule)
+
+    def __reschedule(self):
+        if not self.__io_loop or self.__running:
+            return  # stopped or will be rescheduled after run
+        if self.__timer:
+            self.__io_loop.remove_timeout(self.__timer)
+            self.__timer = None
+        nearest = self.nearest()
+        if nearest is not None:
+            delay = max((nearest - datetime.now()).total_seconds(), 0)
+            self.__timer = self.__io_loop.call_later(delay, self.__run)
+
+    async def __run(self):
+        self.__timer = None
+        self.__running = True
+        try:
+            lesson_ids = self.due()
+            while lesson_ids:
+                try:
+                    ended = await self.__end_lessons(lesson_ids)
+                    log.info('Lesson scheduler: {} lessons ended'.format(ended))
+                except Exception:
+                    log.exception('Lesson scheduler failed to end lessons {}'.format(lesson_ids))
+                    retry = datetime.now() + timedelta(seconds=sets.SCHEDULER_RETRY)
+                    with self.__lock:
+                        for lesson_id in lesson_ids:
+                            if lesson_id not in self.__ends:  # not modified meanwhile
+                                self.__ends[lesson_id] = retry
+                                heappush(self.__heap, (retry, lesson_id))
+                    break
+                lesson_ids = self.due()
+        finally:
+            self.__running = False
+        self.__reschedule()
+
+
+LESSON_SCHEDULER = LessonScheduler()
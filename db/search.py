@@ -0,0 +1,115 @@
+'''
+Full-text search over courses and lessons (SQLite FTS5).
+Search tables use model id as rowid, they are updated by CourseHandler/LessonHandler in the same transaction
+as the model (index_course, index_lesson, unindex_lesson). rebuild() refills them from scratch.
+'''
+import re
+
+from sqlalchemy import event, func, literal_column, select
+from sqlalchemy.sql import table, column
+
+from db.models import Base, Course, Lesson
+from db.read_models import ReadModel, CourseRow, LessonRow
+
+from logging import getLogger
+log = getLogger(__name__)
+
+NAME_WEIGHT = 10.0  # match in name is more relevant, than in description
+TOKENIZE = 'unicode61 remove_diacritics 2'
+
+COURSE_SEARCH = table('course_search', column('rowid'), column('name'), column('description'))
+LESSON_SEARCH = table('lesson_search', column('rowid'), column('name'), column('description'))
+SEARCH_TABLES = (COURSE_SEARCH, LESSON_SEARCH)
+
+# bm25 is negative, the best match is the lowest one
+COURSE_RANK = func.bm25(literal_column(COURSE_SEARCH.name), NAME_WEIGHT, 1.0).label('rank')
+LESSON_RANK = func.bm25(literal_column(LESSON_SEARCH.name), NAME_WEIGHT, 1.0).label('rank')
+
+
+def create_search_tables(connection):
+    for search_table in SEARCH_TABLES:
+        connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5(name, description, tokenize='{}')".format(
+            search_table.name, TOKENIZE))
+
+
+def drop_search_tables(connection):
+    for search_table in SEARCH_TABLES:
+        connection.execute('DROP TABLE IF EXISTS {}'.format(search_table.name))
+
+
+# new db gets search tables from Base.metadata.create_all
+@event.listens_for(Base.metadata, 'after_create')
+def on_create_all(target, connection, **kw):
+    create_search_tables(connection)
+
+
+@event.listens_for(Base.metadata, 'before_drop')
+def on_drop_all(target, connection, **kw):
+    drop_search_tables(connection)
+
+
+def rebuild(connection):
+    '''
+    Refill search tables from courses and lessons
+    :return: number of indexed courses, lessons
+    '''
+    counts = []
+    for search_table, model in ((COURSE_SEARCH, Course), (LESSON_SEARCH, Lesson)):
+        connection.execute(search_table.delete())
+        connection.execute(search_table.insert().from_select(
+            ['rowid', 'name', 'description'], select([model.id, model.name, model.description])))
+        counts.append(connection.execute(select([func.count()]).select_from(search_table)).scalar())
+    return tuple(counts)
+
+
+def _index(session, search_table, model):
+    session.execute(search_table.delete().where(search_table.c.rowid == model.id))
+    session.execute(search_table.insert().values(rowid=model.id, name=model.name, description=model.description))
+
+
+def index_course(session, course: Course):
+    _index(session, COURSE_SEARCH, course)
+
+
+def index_lesson(session, lesson: Lesson):
+    _index(session, LESSON_SEARCH, lesson)
+
+
+def unindex_lesson(session, lesson_id):
+    session.execute(LESSON_SEARCH.delete().where(LESSON_SEARCH.c.rowid == lesson_id))
+
+
+def to_match(text):
+    '''
+    User input to FTS5 query: every word as quoted prefix, so FTS syntax in input is not interpreted.
+    :return: query or None, if there is no words
+    '''
+    words = re.findall(r'\w+', text or '')
+    if not words:
+        return
+    return ' '.join('"{}"*'.format(word) for word in words)
+
+
+def _matched(query, search_table, model, match):
+    return query.join(search_table, search_table.c.rowid == model.id).filter(
+        literal_column(search_table.name).op('MATCH')(match))
+
+
+class CourseHit(ReadModel):
+
+    __slots__ = CourseRow.__slots__ + ('rank',)
+
+    @classmethod
+    def query(cls, session, match):
+        return _matched(CourseRow.query(session).add_columns(COURSE_RANK), COURSE_SEARCH, Course, match)
+
+
+class LessonHit(ReadModel):
+
+    __slots__ = LessonRow.__slots__ + ('rank',)
+
+    start_time_in_format = LessonRow.start_time_in_format
+
+    @classmethod
+    def query(cls, session, match):
+        return _matched(LessonRow.query(session).add_columns(LESSON_RANK), LESSON_SEARCH, Lesson, match)
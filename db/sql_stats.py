@@ -0,0 +1,83 @@
+'''
+Per-request SQL statistics and slow-query log.
+Engine events (installed by db.engine.create_db_engine) count statements and their time into SqlStats
+of current request (REQUEST_SQL_STATS, set by BaseHandler, executor tasks see it by copied context).
+Statements slower than sets.SLOW_QUERY_MS are logged to "db.slow_query" logger with request and parameters.
+'''
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+
+from sqlalchemy import event
+
+from settings import sets
+
+from logging import getLogger
+log = getLogger(__name__)
+slow_log = getLogger('db.slow_query')
+
+# statistics of current request (None - statements are not counted: scripts, scheduler)
+REQUEST_SQL_STATS = ContextVar('request_sql_stats', default=None)
+
+PARAMS_LIMIT = 1000  # chars of parameters in slow-query log
+
+
+class SqlStats:
+
+    __slots__ = ('source', 'statements', 'time', '_lock')
+
+    def __init__(self, source):
+        self.source = source  # handler and request, for slow-query log
+        self.statements = 0
+        self.time = 0.0  # seconds
+        self._lock = Lock()  # executor tasks of request add in other threads
+
+    def add(self, elapsed):
+        with self._lock:
+            self.statements += 1
+            self.time += elapsed
+
+    @property
+    def time_ms(self):
+        return self.time * 1000
+
+
+def _started(conn, context):
+    # start time is kept by execution context of statement (by connection for statements without context)
+    return conn.info if context is None else vars(context)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _started(conn, context)['sql_started'] = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = _started(conn, context).pop('sql_started', None)
+    if started is not None:
+        _done(started, statement, parameters)
+
+
+def _handle_error(exception_context):
+    # failed statement has no after_cursor_execute, it is counted (and logged as slow) here
+    if exception_context.connection is None:
+        return  # error of connect
+    started = _started(exception_context.connection, exception_context.execution_context).pop('sql_started', None)
+    if started is not None:  # not error after execute (fetch)
+        _done(started, exception_context.statement, exception_context.parameters)
+
+
+def _done(started, statement, parameters):
+    elapsed = perf_counter() - started
+    stats = REQUEST_SQL_STATS.get()
+    if stats is not None:
+        stats.add(elapsed)
+    if sets.SLOW_QUERY_MS is not None and elapsed * 1000 >= sets.SLOW_QUERY_MS:
+        slow_log.warning('{:.2f}ms [{}] {} {}'.format(
+            elapsed * 1000, stats.source if stats else '-', ' '.join(statement.split()),
+            repr(parameters)[:PARAMS_LIMIT]))
+
+
+def instrument_engine(engine):
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
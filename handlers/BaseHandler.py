@@ -1,9 +1,31 @@
-from tornado.web import RequestHandler
-from db.DBBridge import DBBridge
+from tornado.log import access_log
+from tornado.web import RequestHandler, HTTPError
+from db.DBBridge import DBBridge, RequestMemo, REQUEST_MEMO
+from db.sql_stats import SqlStats, REQUEST_SQL_STATS
 from settings import sets
 from db.models_handlers import (UserHandler, LessonHandler, CourseHandler, CourseMembersHandler, OwnerAccess,
                                 CourseInvitesHandler, LessonMaterialHandler, HomeWorkHandler,
-                                HomeWorkAnswerHandler, CourseAccessHandler, LessonAccessHandler)
+                                HomeWorkAnswerHandler, CourseAccessHandler, LessonAccessHandler, decode_cursor)
+
+from logging import getLogger
+log = getLogger(__name__)
+
+
+def log_request(handler):
+    '''
+    Access log of Application (log_function setting): tornado format with SQL statistics of request
+    '''
+    status = handler.get_status()
+    if status < 400:
+        log_method = access_log.info
+    elif status < 500:
+        log_method = access_log.warning
+    else:
+        log_method = access_log.error
+    stats = getattr(handler, 'sql_stats', None)
+    log_method('{} {} {:.2f}ms{}'.format(
+        status, handler._request_summary(), 1000 * handler.request.request_time(),
+        ' sql={} {:.2f}ms'.format(stats.statements, stats.time_ms) if stats else ''))
 
 
 class BaseHandler(RequestHandler):
@@ -23,6 +45,28 @@ class BaseHandler(RequestHandler):
     HomeWorkAnswer = HomeWorkAnswerHandler
     OwnerAccess = OwnerAccess
 
+    def prepare(self):
+        # own db session for request, models loaded by request are released in on_finish
+        DBBridge.open_session()
+        # lookups (user, course, lesson...) are done once per request
+        self.memo = RequestMemo()
+        REQUEST_MEMO.set(self.memo)
+        self.sql_stats = SqlStats('{} {} {}'.format(type(self).__name__, self.request.method, self.request.uri))
+        REQUEST_SQL_STATS.set(self.sql_stats)
+
+    def finish(self, chunk=None):
+        stats = getattr(self, 'sql_stats', None)
+        if stats and sets.SQL_STATS_HEADER and not self._headers_written:
+            self.set_header('Server-Timing', 'db;dur={:.2f};desc="{} statements"'.format(
+                stats.time_ms, stats.statements))
+        return super().finish(chunk)
+
+    def on_finish(self):
+        REQUEST_MEMO.set(None)
+        REQUEST_SQL_STATS.set(None)
+        size = DBBridge.close_session()
+        log.debug('{} {}: {} models in session'.format(self.request.method, self.request.uri, size))
+
     def get_current_user(self):
         '''
         get username from cookie called "user"
@@ -33,6 +77,29 @@ class BaseHandler(RequestHandler):
             return username.decode()
         return
 
+    def get_page_cursor(self, name='after', size=1):
+        '''
+        Cursor of list page from request argument (see models_handlers.paginate)
+        :param size: number of key columns of list
+        :raise HTTPError: 400 on broken cursor
+        '''
+        cursor = self.get_argument(name, default=None)
+        if cursor:
+            try:
+                values = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPError(400, 'Bad page cursor')
+            if len(values) != size or any(isinstance(v, (list, dict)) for v in values):
+                raise HTTPError(400, 'Bad page cursor')
+        return cursor
+
+    def transaction(self):
+        '''
+        Unit of work for handler with many writes: with self.transaction(): ...
+        All db changes inside are committed once or rolled back together.
+        '''
+        return self.dbb.transaction()
+
     @property
     def db(self):
         return self.dbb
@@ -74,9 +74,7 @@ hello!
 
 class StreamingHandler(web.RequestHandler):
 
-    @web.asynchronous
-    @gen.coroutine
-    def get(self):
+    async def get(self):
         client = httpclient.AsyncHTTPClient()
 
         #self.write('some opening')
@@ -89,8 +87,7 @@ class StreamingHandler(web.RequestHandler):
             )
         ]
 
-        # `map()` doesn't return a list in Python 3
-        yield list(map(client.fetch, requests))
+        await gen.multi([client.fetch(request) for request in requests])
 
         #self.write('some closing')
         self.finish()
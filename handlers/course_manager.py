@@ -4,7 +4,7 @@ from datetime import datetime, timedelta
 import json
 
 from handlers.BaseHandler import BaseHandler
-from db.models import Course, LessonAccess
+from db.models import Course, Lesson, LessonAccess
 from settings import sets
 
 from logging import getLogger
@@ -94,7 +94,7 @@ class CoursesHandler(BaseCourseHandler):
     @tornado.web.authenticated
     def get(self, *args, **kwargs):
         username = self.get_current_user()
-        courses = self.Course.get_all_by_partner(username)
+        courses = self.Course.get_all_by_partner(username, self.get_page_cursor())
         # return self.render('courses.html', owner_courses=owner_courses, other_course=other_course )
         return self.render('courses.html', courses=courses)
 
@@ -134,34 +134,32 @@ class LessonHandler(BaseCourseHandler):
             self.write(err)
             return
         else:
-            l = self.Lesson.create_lesson(
-                course_id,
-                les_name,
-                les_descr,
-                start_time,
-                dur,
-            )
-            self.LessonAccess.add_access_to_all_partners(course_id, l.id)
+            with self.transaction():
+                l = self.Lesson.create_lesson(
+                    course_id,
+                    les_name,
+                    les_descr,
+                    start_time,
+                    dur,
+                )
+                self.LessonAccess.add_access_to_all_partners(course_id, l.id)
         self.set_status(200)
 
-    def __check_lesson(self, les_name, les_descr, start_time, dur, course_id):
-        err_descr = None
-        if start_time < datetime.now():
-            err_descr = 'Lesson can`t start in past!'
-        if 300 < dur or dur < 10:
-            err_descr = 'Lessond duration must be in diaposon (10, 300)'
-        if self.Lesson.check_in_course(les_name, course_id):
-            err_descr = 'Lesson "{}" already exist in course.'.format(les_name)
+    def __check_lesson(self, les_name, les_descr, start_time, dur, course_id, lesson=None):
+        # cheap checks first, db is queried only for valid data. lesson is modified one
+        lesson_id = lesson.id if lesson else None
+        if start_time < datetime.now() and not (lesson and lesson.start_time == start_time):
+            return 'Lesson can`t start in past!'
+        if Lesson.MAX_DURATION < dur or dur < Lesson.MIN_DURATION:
+            return 'Lessond duration must be in diaposon ({}, {})'.format(Lesson.MIN_DURATION, Lesson.MAX_DURATION)
         if not les_descr:
-            err_descr = 'Description must contain some characters...'
-        les_end = start_time + timedelta(minutes=dur)
-        for lesson in self.Lesson.get_all_by_course(course_id):
-            if lesson.start_time <= start_time <= lesson.start_time + timedelta(minutes=lesson.duration):
-                err_descr = 'New lesson start time cross {} lesson'.format(lesson.name)
-                continue
-            if lesson.start_time <= les_end <= lesson.start_time + timedelta(minutes=lesson.duration):
-                err_descr = 'New lesson end time cross {} lesson'.format(lesson.name)
-        return err_descr
+            return 'Description must contain some characters...'
+        same_name = self.Lesson.check_in_course(les_name, course_id)
+        if same_name and same_name.id != lesson_id:
+            return 'Lesson "{}" already exist in course.'.format(les_name)
+        crossed = self.Lesson.get_overlapping(start_time, dur, course_id=course_id, exclude=lesson_id)
+        if crossed:
+            return 'New lesson time cross {} lesson'.format(crossed[0].name)
 
     def __remove_lesson(self):
         lesson = self.Lesson.get_by_id(self.get_argument('lessonid'))
@@ -172,12 +170,17 @@ class LessonHandler(BaseCourseHandler):
         self.redirect('/teach/manage?course={}'.format(lesson.course))
 
     def __modify_lesson(self):
-        # TODO: check if new values is valid
         lesson_data = self.__collect_lesson_data()
         lesson = self.Lesson.get_by_id(self.get_argument('lessonid'))
         if not self.LessonAccess.check_write_access(self.get_current_user(), lesson):
             self.set_status(400)
             return
+        les_name, les_descr, start_time, dur, _ = lesson_data
+        err = self.__check_lesson(les_name, les_descr, start_time, dur, lesson.course, lesson)
+        if err:
+            self.set_status(400)
+            self.write(err)
+            return
         lesson = self.Lesson.modify_lesson(lesson, *lesson_data)
         if not lesson:
             self.set_status(400)
@@ -224,8 +227,9 @@ class MaterialManageHandler(BaseCourseHandler):
             files = self.request.files['lessonMaterials']
         except KeyError:
             files = []
-        for fl in files:
-            self.LessonMaterial.add_file(fl['filename'], fl['body'], lesson)
+        with self.transaction():
+            for fl in files:
+                self.LessonMaterial.add_file(fl['filename'], fl['body'], lesson)
 
     def __delete_material(self, **kwargs):
         self.LessonMaterial.delete_by_material_id(kwargs['material_id'])
@@ -270,8 +274,9 @@ class HomeWorkCheckHandler(BaseCourseHandler):
         # TODO: check owner
         # TODO: fix error if no homework...
         hw_id = self.get_argument('homework')
-        answers = self.HomeWorkAnswer.get_all_homework_answers(hw_id)
-        self.render('homework_check.html', answers=answers)
+        homework = self.HomeWork.get_by_id(hw_id)
+        answers = self.HomeWorkAnswer.get_all_homework_answers(hw_id, self.get_page_cursor())
+        self.render('homework_check.html', homework=homework, answers=answers)
 
     @tornado.web.authenticated
     def post(self, *args, **kwargs):
@@ -279,13 +284,43 @@ class HomeWorkCheckHandler(BaseCourseHandler):
         # TODO: check if already graded
         answer_id = self.get_argument('answerid')
         grade = self.get_argument('gradeValue')
-        if 0 > int(grade) > 100:
+        if not 0 <= int(grade) <= 100:
             self.set_status(400)
             return
         answer = self.HomeWorkAnswer.grade_answer(answer_id, grade)
         self.redirect('/teach/lesson/homework/check?homework={}'.format(answer.home_work))
 
 
+class HomeWorkGradeHandler(BaseCourseHandler):
+
+    @tornado.web.authenticated
+    def post(self, *args, **kwargs):
+        # grades: {answer id: grade} of one homework, answer is JSON
+        homework = self.HomeWork.get_by_id(self.get_argument('homework'))
+        access = self.LessonAccess.check_any_access(self.get_current_user(), homework._lesson)
+        if not access or access.access == LessonAccess.VIEW:
+            self.set_status(403)
+            self.write(json.dumps({'error': 'Not enough rights'}))
+            return
+        try:
+            grades = {int(answer_id): int(grade) for answer_id, grade in json.loads(self.get_argument('grades')).items()}
+        except (ValueError, TypeError, AttributeError):
+            self.set_status(400)
+            self.write(json.dumps({'error': 'Grades must be {answer id: grade}'}))
+            return
+        wrong = sorted(answer_id for answer_id, grade in grades.items() if not 0 <= grade <= 100)
+        if wrong:
+            self.set_status(400)
+            self.write(json.dumps({'error': 'Grade must be in diaposon (0, 100)', 'answers': wrong}))
+            return
+        unknown = self.HomeWorkAnswer.grade_answers(homework.id, grades)
+        if unknown:
+            self.set_status(400)
+            self.write(json.dumps({'error': 'Not answers of this homework', 'answers': unknown}))
+            return
+        self.write(json.dumps({'graded': len(grades)}))
+
+
 class LectorRegisterHandler(BaseCourseHandler):
     @tornado.web.authenticated
     def get(self):
@@ -306,12 +341,13 @@ class LectorRegisterHandler(BaseCourseHandler):
                 #  user already have access
                 self.set_status(400)
                 return
-            assoc = self.CourseAccess.add_browse_access(user.name, course)
-            if not assoc:
-                log.debug('Access to course not added')
-                self.set_status(400)
-                return
-            self.LessonAccess.add_access_to_all_lesson(user.name, course, LessonAccess.VIEW)
+            with self.transaction():
+                assoc = self.CourseAccess.add_browse_access(user.name, course)
+                if not assoc:
+                    log.debug('Access to course not added')
+                    self.set_status(400)
+                    return
+                self.LessonAccess.add_access_to_all_lesson(user.name, course, LessonAccess.VIEW)
             self.write(json.dumps({'course_id': course.id}))
         else:
             self.set_status(400)
@@ -333,8 +369,9 @@ class ManageRightsHandler(BaseCourseHandler):
         if not self.CourseAccess.check_write_access(username, course_id):
             self.set_status(400)
             return
-        course_right = self.CourseAccess.get_all_by_course(course_id)
-        self.render('rights_manage.html', course_right=course_right)
+        course = self.Course.get_by_id(course_id)
+        course_right = self.CourseAccess.get_all_by_course(course_id, self.get_page_cursor())
+        self.render('rights_manage.html', course=course, course_right=course_right)
 
     @tornado.web.authenticated
     def post(self, *args, **kwargs):
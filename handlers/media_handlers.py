@@ -24,6 +24,7 @@ class MaterialHandler(BaseHandler):
                 else:
                     file.close()
                     self.finish()
+                    return
             except Exception as E:
                 log.error(E)
                 self.set_status(404)
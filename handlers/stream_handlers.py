@@ -84,7 +84,9 @@ class StreamUpdateHandler(BaseHandler):
             if 0 < pass_time < (lesson.duration + sets.STREAM_WINDOW):
                 self.set_status(200)
             else:
-                # TODO: change lesson status to close
+                if pass_time > 0:
+                    # window is over, scheduler can be a bit late
+                    self.Lesson.end_lessons([lesson.id])
                 self.set_status(404)  # any 4xx will break stream
             self.set_status(200)
             return
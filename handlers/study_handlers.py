@@ -32,9 +32,16 @@ class StudyLiveHandler(BaseStudyHandlerClear):
 
 class StudyFindHandler(BaseStudyHandlerClear):
     @authenticated
-    def get(self):
-        open_courses, closed_courses = self.Course.get_all_course(self.get_current_user())
-        return self.render('study/find.html', open_c=open_courses, closed_c=closed_courses)
+    async def get(self):
+        query = self.get_argument('q', default='').strip()
+        if query:
+            # cursors are (rank, id)
+            courses = await self.Course.search.awaitable(query, self.get_page_cursor('courses_after', size=2))
+            lessons = await self.Lesson.search.awaitable(query, self.get_page_cursor('lessons_after', size=2))
+            return self.render('study/search.html', query=query, courses=courses, lessons=lessons)
+        open_courses, closed_courses = await self.Course.get_all_course.awaitable(
+            self.get_current_user(), self.get_page_cursor('open_after'), self.get_page_cursor('closed_after'))
+        return self.render('study/find.html', query='', open_c=open_courses, closed_c=closed_courses)
 
     @authenticated
     def post(self):
@@ -49,8 +56,8 @@ class StudyFindHandler(BaseStudyHandlerClear):
 class StudyManageHandler(BaseStudyHandler):
     @authenticated
     def get(self):
-        user_in = self.CourseMembers.get_all_study_course(self.get_current_user())
-        return self.render('manage.html', user_in=user_in)
+        lessons = self.CourseMembers.get_study_lessons(self.get_current_user(), self.get_page_cursor(size=2))
+        return self.render('manage.html', lessons=lessons)
 
     @authenticated
     def post(self):
@@ -60,7 +67,7 @@ class StudyManageHandler(BaseStudyHandler):
 class StudyInviteHandler(BaseStudyHandler):
     @authenticated
     def get(self):
-        invites = self.CourseInvites.get_learn_invites(self.get_current_user())
+        invites = self.CourseInvites.get_learn_invites(self.get_current_user(), self.get_page_cursor())
         return self.render('invite.html', invites=invites)
 
     @authenticated
@@ -113,7 +120,8 @@ class StudyCourseHandler(BaseStudyHandlerClear):
         self.render_course(course)
 
     def render_course(self, course):
-        return self.render('study/course.html', course=course)
+        lessons = self.Lesson.get_rows_by_course(course.id)
+        return self.render('study/course.html', course=course, lessons=lessons)
 
 class StudyLessonHandler(BaseStudyHandlerClear):
 
@@ -1,4 +1,5 @@
 import logging.config
+from pathlib import Path
 
 
 handlers = []
@@ -30,16 +31,16 @@ config = {
             'delay': 0,
             'filename': 'logs/log.log'
         },
-        'query_to_file': {
+        'slow_query_to_file': {
             'class': 'logging.handlers.RotatingFileHandler',
-            'level': 'INFO',
+            'level': 'WARNING',
             'formatter': 'default_fmt',
             'mode': 'a',
             'maxBytes': 15*1024*1024,
             'backupCount': 3,
             'encoding': None,
             'delay': 0,
-            'filename': 'logs/query.log'
+            'filename': 'logs/slow_query.log'
         },
     },
     'loggers': {
@@ -63,16 +64,23 @@ config = {
             'level': 0,
             'propagate': False,
         },
-        'sqlalchemy.engine': {
-            'handlers': ['query_to_file'],
-            'level': logging.INFO,
+        'tornado.access': {
+            'handlers': handlers,
+            'level': 0,
+            'propagate': False,
+        },
+        # statements slower than sets.SLOW_QUERY_MS (see db.sql_stats)
+        'db.slow_query': {
+            'handlers': ['slow_query_to_file'],
+            'level': logging.WARNING,
             'propagate': False,
-        }
+        },
     },
 }
 
 
 def load_config(debug=False):
+    Path('logs').mkdir(exist_ok=True)  # for file handlers
     handlers.append('file')
     if debug:
         handlers.append('debugging')
@@ -84,8 +92,7 @@ def load_config(debug=False):
 
 def set_level(lvl):
     for loggers in config['loggers']:
-        if 'sqlalchemy.engine' == loggers:
-            # skip change level for logger sqlalchemy.engine
+        if 'db.slow_query' == loggers:
+            # slow queries are logged at any level
             continue
         config['loggers'][loggers]['level'] = lvl
-    #logging.getLogger('sqlalchemy.engine').setLevel(lvl)
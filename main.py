@@ -30,16 +30,22 @@ import tornado.web
 
 from handlers.MainHandler import MainHandler, WsUpdateMainHandler, RoomHandler, AboutHandler
 from handlers.auth import LogoutHandler, LoginHandler, RegisterHandler
+from handlers.BaseHandler import log_request
 from handlers.static_handlers import CssHandler, AssetsLibHandler
 from handlers.course_manager import (CreateCourseHandler, ManageCourseHandler, CoursesHandler, HomeWorkCheckHandler,
                                      LessonHandler, MaterialManageHandler, ManageRightsHandler,
-                                     HomeWorkManageHandler, LectorRegisterHandler)
+                                     HomeWorkManageHandler, HomeWorkGradeHandler, LectorRegisterHandler)
 from handlers.stream_handlers import StreamAuthHandler, StreamUpdateHandler, StreamTstHandler, StreamDoneHandler
 from handlers.study_handlers import (StudyFindHandler, StudyLiveHandler, StudyManageHandler, StudyCourseHandler,
                                      StudyLessonHandler,
                                      StudyInviteHandler, StudyRegisterHandler, StudyHomeWorkHandler)
 from handlers.media_handlers import MaterialHandler
 
+from db.DBBridge import DBBridge, ENGINE, READ_ENGINE
+from db.engine import log_engine_settings
+from db import models_handlers
+from db.scheduler import LESSON_SCHEDULER
+
 import uimodules
 
 
@@ -71,6 +77,7 @@ class Application(tornado.web.Application):
             (r"/teach/lesson", LessonHandler),
             (r"/teach/lesson/homework", HomeWorkManageHandler),
             (r"/teach/lesson/homework/check", HomeWorkCheckHandler),
+            (r"/teach/lesson/homework/grade", HomeWorkGradeHandler),
             (r"/teach/lesson/material", MaterialManageHandler),
 
             (r"/study/live", StudyLiveHandler),
@@ -96,6 +103,7 @@ class Application(tornado.web.Application):
             'template_path': sets.TEMPLATE_PATH,
             'debug': sets.DEBUG,
             'ui_modules': uimodules,
+            'log_function': log_request,
         }
 
         tornado.web.Application.__init__(self, handlers, **settings)
@@ -105,6 +113,15 @@ class Application(tornado.web.Application):
 if __name__ == "__main__":
 
     
+    log_engine_settings(ENGINE)
+    if READ_ENGINE is not ENGINE:
+        log_engine_settings(READ_ENGINE, 'read')
+    models_handlers.LessonHandler.load_live_lessons()
+    models_handlers.LessonHandler.load_schedule()
+    LESSON_SCHEDULER.start(tornado.ioloop.IOLoop.current(), models_handlers.LessonHandler.end_lessons.awaitable)
+    if sets.DB_STATS_INTERVAL:
+        tornado.ioloop.PeriodicCallback(DBBridge.log_stats, sets.DB_STATS_INTERVAL * 1000).start()
+
     print('server on 0.0.0.0:8888 started.')
     app = Application()
     app.listen(8888)
@@ -1,20 +1,34 @@
 from sys import argv, executable
 from subprocess import call
+from shlex import quote
 
 SCRIPTS = (
     'init_db',
     'init_content',
+    'rebuild_search',
+    'check_counters',
+    'bench_lookups',
+    'catalog',
+    'generate_data',
+    'bench_http',
 )
 
-def execute(script_name):
-    com = executable + " scripts/" + script_name + ".py"
+def execute(script_name, args=()):
+    com = " ".join([executable, "scripts/" + script_name + ".py"] + [quote(arg) for arg in args])
     ret = call(com, shell=True)
     return ret == 0
 
+def script_args(script_name):
+    # arguments after script name, till the next script name: manage.py catalog export catalog.tar
+    args = []
+    for arg in argv[argv.index(script_name) + 1:]:
+        if arg in SCRIPTS:
+            break
+        args.append(arg)
+    return args
+
 for script_name in SCRIPTS:
     if script_name not in argv:
         continue
-    if not execute(script_name):
+    if not execute(script_name, script_args(script_name)):
         break
-
-
@@ -0,0 +1,241 @@
+'''
+Benchmark of hot routes of main.Application over HTTP, in process.
+Runs on test db (tests/data) with dataset of scripts/generate_data (the same seed gives the same dataset),
+server and client share one IOLoop, client sends requests of every route by CONCURRENCY workers.
+Every route gets warm up requests first (caches, compiled queries), ids in urls rotate over samples of dataset.
+Report: p50/p95/p99/mean latency in ms, requests per second, SQL statements per request (both engines),
+written to JSON file to compare commits.
+Usage: python manage.py bench_http [--users N] [--seed N] [--requests N] [--concurrency N] [--out file.json]
+'''
+from sys import path
+from argparse import ArgumentParser
+from datetime import datetime
+from itertools import cycle
+from os import makedirs
+from shutil import rmtree
+from subprocess import check_output
+from time import perf_counter
+from urllib.parse import urlencode
+import json
+
+if __name__=='__main__':
+    path.append('')
+
+from settings import sets
+sets.TESTING = True
+sets.DEBUG = False  # as in production: templates are cached, no autoreload and debug log
+
+from sqlalchemy import event, select
+from tornado.gen import multi
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+from tornado.web import create_signed_value
+
+import main
+from scripts.generate_data import generate
+from scripts.init_db import reinit_db
+from db.DBBridge import ENGINE, READ_ENGINE, DB_SESSIONS
+from db.models import User, Course, CourseMembers, Lesson, LessonMaterial
+from db.models_handlers import LessonHandler, LessonMaterialHandler
+
+from logging import getLogger
+log = getLogger(__name__)
+
+REQUESTS = 200  # measured requests of every route
+WARM_UP = 10
+CONCURRENCY = 1
+SAMPLE = 50  # ids of every kind in rotation
+MATERIALS = 10
+
+
+class _Dataset:
+    # users and ids for urls, from generated db
+
+    def __init__(self, connection):
+        self.owner, self.mega_course = connection.execute(
+            select([Course.owner, Course.id]).order_by(Course.members_count.desc()).limit(1)).first()
+        self.owner = self.name(connection, self.owner)
+        self.learner = self.name(connection, connection.execute(select([CourseMembers.member]).where(
+            CourseMembers.course == self.mega_course).order_by(CourseMembers.id).limit(1)).scalar())
+        self.courses = [row.id for row in connection.execute(select([Course.id]).where(
+            Course.mode == Course.OPEN).where(Course.state.in_((Course.LIVE, Course.PUBLISHED))).order_by(
+            Course.id).limit(SAMPLE))]
+        self.streams = [(row.stream_key, row.stream_pw) for row in connection.execute(
+            select([Lesson.stream_key, Lesson.stream_pw]).where(Lesson.state == Lesson.LIVE).order_by(
+            Lesson.id).limit(SAMPLE))]
+        lessons = [row.id for row in connection.execute(select([Lesson.id]).where(
+            Lesson.course == self.mega_course).order_by(Lesson.id).limit(MATERIALS))]
+        for number, lesson_id in enumerate(lessons):
+            LessonMaterialHandler.add_file('slides{}.txt'.format(number), b'slides ' * 1000,
+                                           LessonHandler.get_by_id(lesson_id))
+        self.materials = [row.real_name for row in connection.execute(select([LessonMaterial.real_name]))]
+
+    @staticmethod
+    def name(connection, user_id):
+        return connection.execute(select([User.name]).where(User.id == user_id)).scalar()
+
+
+def _routes(data):
+    '''
+    Routes without sample in dataset (no live lessons in small dataset) are skipped.
+    :return: [(route name, username, method, cycle of (url, body))]
+    '''
+    def stream(url, call):
+        # nginx-rtmp callbacks of live lessons
+        return [(url, urlencode({'call': call, 'name': key, 'pphrs': pw})) for key, pw in data.streams]
+
+    routes = [
+        ('/', data.learner, 'GET', [('/', None)]),
+        ('/study/live', data.learner, 'GET', [('/study/live', None)]),
+        ('/study/find', data.learner, 'GET', [('/study/find', None)]),
+        ('/study/find?q=', data.learner, 'GET', [('/study/find?q=python', None), ('/study/find?q=music', None)]),
+        ('/study/course/<id>', data.learner, 'GET', [('/study/course/{}'.format(c), None) for c in data.courses]),
+        ('/teach/manage', data.owner, 'GET', [('/teach/manage?course={}'.format(data.mega_course), None)]),
+        ('/media/material/<f>', data.learner, 'GET', [('/media/material/' + m, None) for m in data.materials]),
+        ('/stream/auth', None, 'POST', stream('/stream/auth', 'publish')),
+        ('/stream/update', None, 'POST', stream('/stream/update', 'update_publish')),
+        ('/stream/done', None, 'POST', stream('/stream/done', 'publish_done')),  # interrupts lessons, the last
+    ]
+    for name, _, _, urls in routes:
+        if not urls:
+            log.warning('Route {} is skipped: no sample in dataset'.format(name))
+    return [(name, username, method, cycle(urls)) for name, username, method, urls in routes if urls]
+
+
+def percentile(values, share):
+    # nearest rank of sorted values
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(share * len(values))) - 1))]
+
+
+class _Counter:
+    # SQL statements of both engines
+
+    def __init__(self):
+        self.statements = 0
+        for engine in {ENGINE, READ_ENGINE}:
+            event.listen(engine, 'before_cursor_execute', self.count)
+
+    def count(self, *args):
+        self.statements += 1
+
+    def close(self):
+        for engine in {ENGINE, READ_ENGINE}:
+            event.remove(engine, 'before_cursor_execute', self.count)
+
+
+async def _run_route(client, base_url, username, method, requests, number, concurrency, counter):
+    headers = {}
+    if username:
+        headers['Cookie'] = '{}={}'.format(sets.SECURITY_COOKIE, create_signed_value(
+            sets.COOKIE_SECRET, sets.SECURITY_COOKIE, username).decode())
+    latencies, errors = [], 0
+
+    async def worker(left):
+        nonlocal errors
+        while left[0] > 0:
+            left[0] -= 1
+            url, body = next(requests)
+            started = perf_counter()
+            response = await client.fetch(base_url + url, method=method, body=body, headers=headers,
+                                          follow_redirects=False, raise_error=False)
+            latencies.append(perf_counter() - started)
+            if response.code >= 400:
+                errors += 1
+
+    await worker([WARM_UP])
+    latencies, errors = [], 0
+    statements = counter.statements
+    started = perf_counter()
+    left = [number]
+    await multi([worker(left) for _ in range(concurrency)])
+    elapsed = perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'rps': round(len(latencies) / elapsed, 1),
+        'sql_per_request': round((counter.statements - statements) / len(latencies), 2),
+    }
+
+
+def _git_commit():
+    try:
+        return check_output(['git', 'rev-parse', '--short', 'HEAD']).decode().strip()
+    except Exception:
+        return None
+
+
+def bench(users=10000, seed=1, requests=REQUESTS, concurrency=CONCURRENCY):
+    '''
+    :return: report dict, see module docstring
+    '''
+    reinit_db(answers={
+        "username": "admin",
+        "password": "admin",
+        "email": "admin@admin.ru",
+        "remove_existed": "y"
+    })
+    media_dir = sets.MEDIA_DIR
+    sets.MEDIA_DIR = 'tests/data/media/'
+    makedirs(sets.MEDIA_DIR, exist_ok=True)
+    rows = generate(ENGINE, users=users, seed=seed)
+    with ENGINE.connect() as connection:
+        data = _Dataset(connection)
+    DB_SESSIONS.remove()
+
+    sock, port = bind_unused_port()
+    server = HTTPServer(main.Application())
+    server.add_sockets([sock])
+    client = AsyncHTTPClient()
+    counter = _Counter()
+    results = {}
+
+    async def run():
+        for name, username, method, route_requests in _routes(data):
+            results[name] = await _run_route(client, 'http://127.0.0.1:{}'.format(port), username, method,
+                                             route_requests, requests, concurrency, counter)
+            log.info('{}: {}'.format(name, results[name]))
+
+    try:
+        IOLoop.current().run_sync(run)
+    finally:
+        counter.close()
+        server.stop()
+        client.close()
+        DB_SESSIONS.remove()
+        sets.MEDIA_DIR = media_dir
+        rmtree('tests/data')
+    return {
+        'commit': _git_commit(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'dataset': {'users': users, 'seed': seed, 'rows': sum(rows.values())},
+        'requests': requests,
+        'concurrency': concurrency,
+        'routes': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Benchmark of HTTP routes')
+    parser.add_argument('--users', type=int, default=10000, help='size of generated dataset')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=REQUESTS, help='measured requests of every route')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--out', default='bench_http.json')
+    args = parser.parse_args()
+    report = bench(args.users, args.seed, args.requests, args.concurrency)
+    with open(args.out, 'w') as out:
+        json.dump(report, out, indent=2)
+    print('\t{:<24}{:>8}{:>10}{:>10}{:>10}{:>10}{:>8}'.format('route', 'errors', 'p50 ms', 'p95 ms', 'p99 ms',
+                                                              'rps', 'sql'))
+    for name, result in report['routes'].items():
+        print('\t{:<24}{:>8}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.1f}{:>8.1f}'.format(
+            name, result['errors'], result['p50_ms'], result['p95_ms'], result['p99_ms'], result['rps'],
+            result['sql_per_request']))
+    print('\tReport: {}'.format(args.out))
@@ -0,0 +1,81 @@
+'''
+Benchmark of lookup functions with and without compiled query cache (sets.BAKED_QUERIES).
+Runs on test db (tests/data), every call is made as in request: with own session (it takes current cache
+generation, so cached ACL is used). Entity caches are cleared before calls of uncached lookups, so they go to db.
+Usage: python manage.py bench_lookups
+'''
+from datetime import datetime
+from shutil import rmtree
+from sys import path
+from timeit import timeit
+
+if __name__=='__main__':
+    path.append('')
+
+from settings import sets
+sets.TESTING = True
+
+from scripts.init_db import reinit_db
+from db.DBBridge import DB_SESSIONS
+from db.cache import clear_all
+from db.models import Course
+from db.models_handlers import UserHandler, CourseHandler, LessonHandler, LessonAccessHandler
+
+CALLS = 2000
+
+
+def prepare():
+    reinit_db(answers={
+        "username": "admin",
+        "password": "admin",
+        "email": "admin@admin.ru",
+        "remove_existed": "y"
+    })
+    course = CourseHandler.create('admin', 'Benchmark', 'Benchmark course', Course.OPEN)
+    lesson = LessonHandler.create_lesson(course.id, 'Lesson', 'Benchmark lesson', datetime.now(), 60)
+    LessonAccessHandler.add_access_to_all_partners(course.id, lesson.id)
+    return course.id, lesson.id, lesson.stream_key, lesson.stream_pw
+
+
+def in_request(func):
+    def call():
+        try:
+            return func()
+        finally:
+            DB_SESSIONS.remove()
+    return call
+
+
+def uncached(func):
+    def call():
+        clear_all()
+        return func()
+    return call
+
+
+def bench():
+    course_id, lesson_id, stream_key, stream_pw = prepare()
+    lesson = LessonHandler.get_by_id(lesson_id)
+    lookups = (
+        ('UserHandler.get', in_request(uncached(lambda: UserHandler.get('admin')))),
+        ('CourseHandler.get_by_id', in_request(uncached(lambda: CourseHandler.get_by_id(course_id)))),
+        ('LessonHandler.get_by_keys', in_request(lambda: LessonHandler.get_by_keys(stream_key, stream_pw))),
+        ('LessonAccessHandler.check_any_access',
+         in_request(lambda: LessonAccessHandler.check_any_access('admin', lesson))),
+        ('clear_all (overhead)', clear_all),
+    )
+    print('\t{:<40}{:>12}{:>12}{:>10}'.format('lookup, us per call', 'plain', 'baked', 'saved'))
+    for name, func in lookups:
+        func()  # warm up: compile and load
+        results = {}
+        for baked in (False, True):
+            sets.BAKED_QUERIES = baked
+            results[baked] = timeit(func, number=CALLS) / CALLS * 10 ** 6
+        print('\t{:<40}{:>12.1f}{:>12.1f}{:>9.0f}%'.format(
+            name, results[False], results[True], 100 * (1 - results[True] / results[False])))
+    DB_SESSIONS.remove()
+    rmtree('tests/data')
+
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,267 @@
+'''
+Export and import of catalog: users, courses, accesses, lessons, homeworks and materials with their files.
+Catalog is a tar stream: records are JSON lines in chunks of CATALOG_BATCH ("records/000001.jsonl"),
+material files follow the chunk of their records ("media/<parent dir>/<real name>").
+Memory does not depend on catalog size (but for id maps and names of users and courses of import):
+records are fetched and written by chunks, files are copied by tarfile in blocks. Import reads the stream
+in the same order, inserts records by batched INSERTs with new ids (old id: new id maps) and commits every
+CATALOG_COMMIT rows, so import of broken stream leaves committed part in db (files of rolled back part are removed).
+Users with existed name or email and courses with existed name are not imported, existed user is used instead,
+all content of existed course is skipped. Invite urls and stream keys are generated as for new rows.
+Learners, invites and answers are not part of catalog.
+Usage: python manage.py catalog export <file>|- ; python manage.py catalog import <file>|-
+'''
+from sys import path, argv, stdin, stdout, stderr, exit
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+from uuid import uuid4
+import json
+import tarfile
+
+if __name__=='__main__':
+    path.append('')
+
+from sqlalchemy import DateTime, func, select
+
+from db.counters import repair_counters
+from db.engine import create_db_engine
+from db.models import User, Course, CourseAccess, Lesson, LessonAccess, HomeWork, LessonMaterial
+from db.search import rebuild
+from settings import sets
+
+from logging import getLogger
+log = getLogger(__name__)
+
+CATALOG_BATCH = 1000  # records in one chunk and in one INSERT
+CATALOG_COMMIT = 10000  # rows inserted between commits of import
+
+# models in order of dependencies: foreign key column: model of referenced id
+CATALOG = (
+    (User, {}),
+    (Course, {'owner': User}),
+    (CourseAccess, {'user': User, 'course': Course}),
+    (Lesson, {'course': Course}),
+    (LessonAccess, {'user': User, 'lesson': Lesson}),
+    (HomeWork, {'lesson': Lesson}),
+    (LessonMaterial, {'lesson': Lesson}),
+)
+MODELS = {model.__tablename__: (model, references) for model, references in CATALOG}
+
+
+def _dump(table, row):
+    record = {'table': table.name}
+    for column in table.columns:
+        value = row[column.name]
+        record[column.name] = value.isoformat() if isinstance(value, datetime) else value
+    return json.dumps(record, ensure_ascii=False)
+
+
+def _parse_datetime(value):
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f' if '.' in value else '%Y-%m-%dT%H:%M:%S')
+
+
+def _add_bytes(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = datetime.now().timestamp()
+    tar.addfile(info, BytesIO(data))
+
+
+def _media_path(material):
+    return Path(sets.MEDIA_DIR) / material['parent_dir'] / material['real_name']
+
+
+def export_catalog(engine, fileobj):
+    '''
+    Write catalog to binary file object as tar stream
+    :return: {table name: number of records}
+    '''
+    counts = {}
+    chunk_number = 0
+    with tarfile.open(fileobj=fileobj, mode='w|') as tar, engine.connect() as connection:
+        for model, references in CATALOG:
+            table = model.__table__
+            counts[table.name] = 0
+            result = connection.execute(table.select().order_by(table.c.id))
+            while True:
+                rows = result.fetchmany(CATALOG_BATCH)
+                if not rows:
+                    break
+                chunk_number += 1
+                lines = '\n'.join(_dump(table, row) for row in rows) + '\n'
+                _add_bytes(tar, 'records/{:06d}.jsonl'.format(chunk_number), lines.encode())
+                counts[table.name] += len(rows)
+                if model is LessonMaterial:
+                    for row in rows:
+                        file_path = _media_path(row)
+                        if file_path.is_file():
+                            tar.add(str(file_path), 'media/{}/{}'.format(row['parent_dir'], row['real_name']))
+                        else:
+                            log.warning('Material file {} not found'.format(file_path))
+    return counts
+
+
+class _Importer:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.transaction = connection.begin()
+        self.ids = {model: {} for model, _ in CATALOG}  # model: {old id: new id}
+        self.next_id = {model: (connection.execute(select([func.max(model.id)])).scalar() or 0) + 1
+                        for model, _ in CATALOG}
+        # names and emails of existed users, names of existed courses: {value: id}
+        self.user_names = dict(connection.execute(select([User.name, User.id])).fetchall())
+        self.user_emails = dict(connection.execute(select([User.email, User.id])).fetchall())
+        self.course_names = dict(connection.execute(select([Course.name, Course.id])).fetchall())
+        self.files = {}  # old "parent dir/real name": (material id, new path of material file)
+        self.written = []  # [(material id, path)] of files written for not committed materials
+        self.committed_material = self.next_id[LessonMaterial]  # materials with lower id are committed
+        self.pending = []
+        self.pending_model = None
+        self.not_committed = 0
+        self.counts = {model.__tablename__: 0 for model, _ in CATALOG}
+        self.skipped = {model.__tablename__: 0 for model, _ in CATALOG}
+
+    def existed(self, model, record):
+        # id of existed user with the same name or email, existed course with the same name
+        if model is User:
+            return self.user_names.get(record['name']) or self.user_emails.get(record['email'])
+        if model is Course:
+            return self.course_names.get(record['name'])
+
+    def remember(self, model, record):
+        if model is User:
+            self.user_names[record['name']] = self.user_emails[record['email']] = record['id']
+        elif model is Course:
+            self.course_names[record['name']] = record['id']
+
+    def add(self, record):
+        model, references = MODELS[record.pop('table')]
+        if model is not self.pending_model:
+            self.flush()
+            self.pending_model = model
+        old_id = record['id']
+        for column, referenced in references.items():
+            if record[column] is not None:
+                record[column] = self.ids[referenced].get(record[column])
+                if record[column] is None:
+                    self.skipped[model.__tablename__] += 1  # parent was skipped
+                    return
+        existed = self.existed(model, record)
+        if existed:
+            if model is User:
+                self.ids[model][old_id] = existed
+            self.skipped[model.__tablename__] += 1
+            return
+        for column in model.__table__.columns:
+            if isinstance(column.type, DateTime) and record[column.name]:
+                record[column.name] = _parse_datetime(record[column.name])
+        if model is Lesson and record['duration']:
+            # catalog of db without migration 6
+            record['duration'] = min(record['duration'], Lesson.MAX_DURATION)
+        # unique keys are generated again as for new rows, source rows can be in db already
+        if model is Course:
+            record['invite_url'] = record['invite_url'] and str(uuid4())
+            record['invite_lector_url'] = record['invite_lector_url'] and str(uuid4())
+        if model is Lesson:
+            record['stream_key'], record['stream_pw'] = str(uuid4()), str(uuid4()).split('-')[-1]
+        record['id'] = self.ids[model][old_id] = self.next_id[model]
+        self.next_id[model] += 1
+        self.remember(model, record)
+        if model is LessonMaterial:
+            old_file = '{}/{}'.format(record['parent_dir'], record['real_name'])
+            record['parent_dir'], record['real_name'] = str(datetime.now().date()), str(uuid4())
+            self.files[old_file] = record['id'], _media_path(record)
+        self.pending.append(record)
+        if len(self.pending) >= CATALOG_BATCH:
+            self.flush()
+
+    def add_file(self, name, fileobj):
+        material_id, file_path = self.files.pop(name, (None, None))
+        if file_path is None:
+            return  # material was skipped
+        if material_id >= self.committed_material:
+            self.written.append((material_id, file_path))
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with file_path.open('wb') as out:
+            while True:
+                block = fileobj.read(64 * 1024)
+                if not block:
+                    break
+                out.write(block)
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.connection.execute(self.pending_model.__table__.insert(), self.pending)
+        self.counts[self.pending_model.__tablename__] += len(self.pending)
+        self.not_committed += len(self.pending)
+        self.pending = []
+        if self.not_committed >= CATALOG_COMMIT:
+            self.commit()
+            self.transaction = self.connection.begin()
+
+    def commit(self):
+        self.transaction.commit()
+        self.not_committed = 0
+        self.committed_material = self.next_id[LessonMaterial]
+        self.written = []
+
+    def rollback(self):
+        # files of rolled back materials are removed
+        self.transaction.rollback()
+        for _, file_path in self.written:
+            if file_path.exists():
+                file_path.unlink()
+
+
+def import_catalog(engine, fileobj):
+    '''
+    Read catalog from binary file object with tar stream
+    :return: {table name: number of imported records}, {table name: number of skipped records}
+    '''
+    with tarfile.open(fileobj=fileobj, mode='r|') as tar, engine.connect() as connection:
+        importer = _Importer(connection)
+        try:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                data = tar.extractfile(member)
+                if member.name.startswith('records/'):
+                    for line in data:
+                        if line.strip():
+                            importer.add(json.loads(line.decode()))
+                    # files of materials follow, their rows must be in db
+                    importer.flush()
+                elif member.name.startswith('media/'):
+                    importer.add_file(member.name[len('media/'):], data)
+            importer.flush()
+            rebuild(connection)
+            repair_counters(connection)
+            importer.commit()
+        except:
+            importer.rollback()
+            # committed part of import must be searchable and counted
+            with connection.begin():
+                rebuild(connection)
+                repair_counters(connection)
+            raise
+    return importer.counts, importer.skipped
+
+
+if __name__ == '__main__':
+    if len(argv) != 3 or argv[1] not in ('export', 'import'):
+        print(__doc__)
+        exit(1)
+    ENGINE = create_db_engine()
+    action, file_name = argv[1:]
+    if action == 'export':
+        with (stdout.buffer if file_name == '-' else open(file_name, 'wb')) as out:
+            counts = export_catalog(ENGINE, out)
+        print('\tExported: {}'.format(counts), file=stderr)  # stdout can be the catalog
+    else:
+        with (stdin.buffer if file_name == '-' else open(file_name, 'rb')) as source:
+            counts, skipped = import_catalog(ENGINE, source)
+        print('\tImported: {}'.format(counts))
+        print('\tSkipped as existed: {}'.format(skipped))
@@ -0,0 +1,27 @@
+from sys import path
+
+if __name__=='__main__':
+    path.append('')
+
+from db.engine import create_db_engine
+from db.counters import check_counters, repair_counters
+
+ENGINE = create_db_engine()
+
+
+def check(repair=True):
+    print('\tCheck counters')
+    with ENGINE.begin() as connection:
+        wrong = check_counters(connection)
+        for table, model_id, counter, stored, actual in wrong:
+            print('\t{} {}: {} is {}, must be {}'.format(table, model_id, counter, stored, actual))
+        if wrong and repair:
+            print('\tRepaired {} counters'.format(repair_counters(connection)))
+    if not wrong:
+        print('\tAll counters are correct')
+    return wrong
+
+
+if __name__ == '__main__':
+    import sys
+    check(repair='dont_repair' not in sys.argv)
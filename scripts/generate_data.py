@@ -0,0 +1,277 @@
+'''
+Seeded synthetic dataset for load testing and benchmarks: users, courses with accesses, members and invites,
+lessons with accesses, homeworks and answers. The same seed, sizes and "now" give the same rows
+(but for password hash, one for all users: GENERATED_PASSWORD).
+Course sizes have a long tail (Pareto) and MEGA_COURSES courses have MEGA_SHARE of all users as members.
+Lessons are scheduled around "now": ended in the past, live now, waiting in the future.
+Rows are inserted with own ids by batched INSERTs of GENERATE_BATCH rows, committed every GENERATE_COMMIT rows,
+counters are filled by generator, search tables are rebuilt at the end.
+About 8-9 rows per user with default sizes, so --users 120000 gives about 1M rows.
+Usage: python manage.py generate_data [--users N] [--courses N] [--seed N] [--now "YYYY-MM-DD HH:MM"]
+'''
+from sys import path
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from random import Random
+from time import time
+from uuid import UUID
+
+if __name__=='__main__':
+    path.append('')
+
+from sqlalchemy import func, select
+
+from db.engine import create_db_engine
+from db.models import (User, Course, CourseAccess, CourseMembers, CourseInvites, Lesson, LessonAccess,
+                       HomeWork, HomeWorkAnswer)
+from db.search import rebuild
+from handlers.auth import RegisterHandler
+
+from logging import getLogger
+log = getLogger(__name__)
+
+GENERATE_BATCH = 5000  # rows in one INSERT
+GENERATE_COMMIT = 100000  # rows inserted between commits
+GENERATED_PASSWORD = 'password'
+
+MEGA_COURSES = 3
+MEGA_SHARE = 0.3  # part of all users in every mega-course
+MEMBERS_ALPHA = 1.2  # Pareto shape of course sizes, less is longer tail
+MEMBERS_SCALE = 3
+LESSONS_ALPHA = 1.5
+LESSONS_SCALE = 4
+MAX_LESSONS = 200
+HOMEWORK_RATE = 0.4  # homeworks per lesson
+ANSWER_RATE = 0.2  # part of members, which answer homework of ended lesson
+LIVE_RATE = 0.5  # part of today lessons, which are live now
+
+MODES = ((Course.OPEN, 6), (Course.CLOSED, 3), (Course.PRIVATE, 1))  # mode, weight
+PARTNERS = ((0, 5), (1, 3), (2, 1), (3, 1))  # number of partners of course, weight
+WORDS = ('python', 'golang', 'rust', 'java', 'linux', 'network', 'database', 'security', 'design', 'music',
+         'guitar', 'history', 'math', 'algebra', 'physics', 'chemistry', 'biology', 'drawing', 'english',
+         'spanish', 'marketing', 'finance', 'statistics', 'machine', 'learning', 'web', 'mobile', 'games',
+         'cooking', 'photo', 'video', 'writing', 'basics', 'advanced', 'practice', 'theory', 'intro', 'deep')
+
+# models in order of dependencies, rows are inserted in this order
+MODELS = (User, Course, CourseAccess, CourseMembers, CourseInvites, Lesson, LessonAccess, HomeWork, HomeWorkAnswer)
+
+
+class _Writer:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.transaction = connection.begin()
+        self.next_id = {model: (connection.execute(select([func.max(model.id)])).scalar() or 0) + 1
+                        for model in MODELS}
+        self.pending = {model: [] for model in MODELS}
+        self.pending_count = 0
+        self.not_committed = 0
+        self.counts = {model.__tablename__: 0 for model in MODELS}
+
+    def add(self, model, row):
+        row['id'] = self.next_id[model]
+        self.next_id[model] += 1
+        self.pending[model].append(row)
+        self.pending_count += 1
+        if self.pending_count >= GENERATE_BATCH:
+            self.flush()
+        return row
+
+    def flush(self):
+        for model in MODELS:
+            rows = self.pending[model]
+            if rows:
+                self.connection.execute(model.__table__.insert(), rows)
+                self.counts[model.__tablename__] += len(rows)
+                self.pending[model] = []
+        self.not_committed += self.pending_count
+        self.pending_count = 0
+        if self.not_committed >= GENERATE_COMMIT:
+            self.commit()
+            self.transaction = self.connection.begin()
+
+    def commit(self):
+        self.transaction.commit()
+        self.not_committed = 0
+
+
+def _weighted(rnd, choices):
+    values, weights = zip(*choices)
+    return rnd.choices(values, weights)[0]
+
+
+def _uuid(rnd):
+    return str(UUID(int=rnd.getrandbits(128), version=4))
+
+
+def _text(rnd, words):
+    return ' '.join(rnd.sample(WORDS, words))
+
+
+class _Generator:
+
+    def __init__(self, writer, rnd, users, now, prefix):
+        self.writer = writer
+        self.rnd = rnd
+        self.users = users  # ids of generated users
+        self.now = now
+        self.prefix = prefix
+
+    def sample(self, size):
+        # sizes are not limited by number of users, tiny datasets have less
+        return self.rnd.sample(self.users, min(size, len(self.users)))
+
+    def course_size(self, number):
+        mega = int(len(self.users) * MEGA_SHARE)
+        if number < MEGA_COURSES:
+            return mega
+        return min(mega // 2, int(self.rnd.paretovariate(MEMBERS_ALPHA) * MEMBERS_SCALE) - 1)
+
+    def schedule(self):
+        # [(start time, duration, state)] of course lessons
+        rnd = self.rnd
+        lessons = []
+        start_time = self.now.replace(hour=rnd.randint(8, 20), minute=rnd.choice((0, 30)), second=0, microsecond=0) \
+            + timedelta(days=rnd.randint(-90, 60))
+        spacing = timedelta(days=rnd.choice((1, 2, 7)))
+        for _ in range(min(MAX_LESSONS, int(rnd.paretovariate(LESSONS_ALPHA) * LESSONS_SCALE))):
+            duration = rnd.choice((45, 60, 90, 120))
+            lesson_start = start_time
+            if start_time.date() == self.now.date() and rnd.random() < LIVE_RATE:
+                lesson_start = self.now - timedelta(minutes=rnd.randint(0, duration - 1))  # live now
+            if lesson_start + timedelta(minutes=duration) <= self.now:
+                state = Lesson.ENDED
+            elif lesson_start <= self.now:
+                state = Lesson.LIVE
+            else:
+                state = Lesson.WAITING
+            lessons.append((lesson_start, duration, state))
+            start_time += spacing
+        return lessons
+
+    def course(self, number):
+        # parent row is added before children with its final counters and state
+        rnd = self.rnd
+        mode = _weighted(rnd, MODES)
+        owner = rnd.choice(self.users)
+        partners = {owner: CourseAccess.MODERATE}  # user: course access
+        for user in self.sample(_weighted(rnd, PARTNERS)):
+            partners.setdefault(user, rnd.choice((CourseAccess.BROWSE, CourseAccess.MODERATE)))
+        members = [u for u in self.sample(self.course_size(number)) if u not in partners]
+        lessons = self.schedule()
+        states = {state for _, _, state in lessons}
+        if states == {Lesson.ENDED}:
+            state = Course.ENDED
+        elif Lesson.LIVE in states or Lesson.ENDED in states:
+            state = Course.LIVE
+        elif states and rnd.random() < 0.9:
+            state = Course.PUBLISHED
+        else:
+            state = Course.CREATED
+        course = self.writer.add(Course, {
+            'name': '{}course{}'.format(self.prefix, number),
+            'description': _text(rnd, 6),
+            'owner': owner,
+            'mode': mode,
+            'state': state,
+            'invite_url': _uuid(rnd) if mode == Course.PRIVATE else None,
+            'invite_lector_url': _uuid(rnd),
+            'members_count': len(members),
+            'lessons_count': len(lessons),
+        })
+        for user, access in partners.items():
+            self.writer.add(CourseAccess, {'user': user, 'course': course['id'], 'access': access})
+        for user in members:
+            self.writer.add(CourseMembers, {'course': course['id'], 'member': user, 'assign_type': mode})
+        self.invites(course, set(members) | set(partners))
+        for i, (start_time, duration, state) in enumerate(lessons):
+            self.lesson(course, 'Lesson {}'.format(i + 1), start_time, duration, state, partners, members)
+
+    def invites(self, course, taken):
+        rnd = self.rnd
+        invited = []
+        if course['mode'] == Course.PRIVATE:
+            invited += [(u, CourseInvites.LEARN) for u in self.sample(course['members_count'] // 10 + 1)]
+        if rnd.random() < 0.1:
+            invited.append((rnd.choice(self.users), CourseInvites.TEACH))
+        for user, action in invited:
+            if user not in taken:
+                taken.add(user)
+                self.writer.add(CourseInvites, {'course': course['id'], 'member': user, 'action': action})
+
+    def lesson(self, course, name, start_time, duration, state, partners, members):
+        rnd = self.rnd
+        lesson = self.writer.add(Lesson, {
+            'name': name,
+            'description': _text(rnd, 4),
+            'start_time': start_time,
+            'duration': duration,
+            'state': state,
+            'course': course['id'],
+            'stream_key': _uuid(rnd),
+            'stream_pw': _uuid(rnd).split('-')[-1],
+        })
+        for user, access in partners.items():
+            self.writer.add(LessonAccess, {
+                'user': user, 'lesson': lesson['id'],
+                'access': LessonAccess.MODERATE if access == CourseAccess.MODERATE else LessonAccess.VIEW,
+            })
+        if rnd.random() < HOMEWORK_RATE:
+            answers = rnd.sample(members, int(len(members) * ANSWER_RATE)) if state == Lesson.ENDED else []
+            homework = self.writer.add(HomeWork, {
+                'title': 'Homework: {}'.format(_text(rnd, 2)), 'description': _text(rnd, 8), 'lesson': lesson['id'],
+                'answers_count': len(answers),
+            })
+            for user in answers:
+                self.writer.add(HomeWorkAnswer, {
+                    'description': _text(rnd, 3), 'home_work': homework['id'], 'source': user,
+                    'grade': rnd.randint(0, 100) if rnd.random() < 0.5 else None,
+                })
+
+
+def generate(engine, users=10000, courses=None, seed=1, now=None):
+    '''
+    Insert generated dataset
+    :param courses: number of courses, users // 10 by default
+    :param now: time of live lessons, current time (to minutes) by default
+    :return: {table name: number of inserted rows}
+    '''
+    rnd = Random(seed)
+    now = now or datetime.now().replace(second=0, microsecond=0)
+    courses = users // 10 if courses is None else courses
+    if courses and not users:
+        raise ValueError('Courses need at least one user')
+    prefix = 'g{}_'.format(seed)  # datasets with other seeds can be added to the same db
+    password = RegisterHandler.generate_password(GENERATED_PASSWORD)
+    with engine.connect() as connection:
+        writer = _Writer(connection)
+        try:
+            user_ids = []
+            for number in range(users):
+                name = '{}user{}'.format(prefix, number)
+                user_ids.append(writer.add(User, {
+                    'name': name, 'password': password, 'email': '{}@example.com'.format(name)})['id'])
+            generator = _Generator(writer, rnd, user_ids, now, prefix)
+            for number in range(courses):
+                generator.course(number)
+            writer.flush()
+            rebuild(connection)
+            writer.commit()
+        except:
+            writer.transaction.rollback()
+            raise
+    return writer.counts
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Generate synthetic dataset')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--courses', type=int, default=None, help='users // 10 by default')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--now', type=lambda s: datetime.strptime(s, '%Y-%m-%d %H:%M'), default=None,
+                        help='time of live lessons, "YYYY-MM-DD HH:MM", current time by default')
+    args = parser.parse_args()
+    started = time()
+    counts = generate(create_db_engine(), args.users, args.courses, args.seed, args.now)
+    print('\tGenerated {} rows in {:.1f} s: {}'.format(sum(counts.values()), time() - started, counts))
+    print('\tPassword of all users: {}'.format(GENERATED_PASSWORD))
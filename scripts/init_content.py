@@ -7,6 +7,8 @@ if __name__=='__main__':
     path.append('')
 
 from db.DBBridge import DBBridge
+from db.counters import repair_counters
+from db.search import rebuild
 from db.models import *
 from handlers.auth import RegisterHandler
 from settings import sets
@@ -194,6 +196,8 @@ def fill(session):
                     )
                     session.add(material)
                     session.commit()
+    rebuild(session.connection())
+    repair_counters(session.connection())
 
 
 def check_db():
@@ -6,14 +6,18 @@ from sys import exit, path
 if __name__=='__main__':
     path.append('')
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from db.engine import create_db_engine, dispose_all
+from db.cache import clear_all
+from db.live import LIVE_LESSONS
+from db.scheduler import LESSON_SCHEDULER
+from db.migrations import upgrade, stamp
 from db.models import User, Base
 from handlers.auth import RegisterHandler
 from settings import sets
 
-ENGINE = create_engine(sets.DB_SCHEME + sets.DB_NAME)
+ENGINE = create_db_engine()
 
 def create_bd_dir():
     path = dirname(abspath(sets.DB_NAME))
@@ -28,6 +32,10 @@ def rm_bd_file():
     bd_fl = Path(sets.DB_NAME)
     try:
         bd_fl.unlink()  # remove file
+        for suffix in ('-wal', '-shm'):
+            wal_fl = Path(sets.DB_NAME + suffix)
+            if wal_fl.exists():
+                wal_fl.unlink()
     except Exception as e:
         print('\tError with removing file {}!'.format(sets.DB_NAME))
         print('\tError description: \n {}'.format(e))
@@ -60,15 +68,21 @@ def add_user(username, email, password):
     session = Session()
     session.add(u)
     session.commit()
+    session.close()
 
 
 def prepare_db_dir(answers):
+    dispose_all()  # pooled connections can refer to old (removed) db file
+    clear_all()
+    LIVE_LESSONS.clear()
+    LESSON_SCHEDULER.clear()
     #print('\tSearch for file {} in current directory'.format(sets.DB_NAME))
     if check_bd_file():
         user_ans = answers["remove_existed"] if "remove_existed" in answers else input('Find file "{}"! Remove it? y/n \n'.format(sets.DB_NAME))
 
         if 'y' not in user_ans.lower():
             #print('Exit program, can not initialize when file exist!')
+            migrate_db()
             exit()
 
         rm_bd_file()
@@ -78,11 +92,18 @@ def prepare_db_dir(answers):
     create_bd_dir()
 
 
+def migrate_db():
+    print('\tCheck DB migrations')
+    for name in upgrade(ENGINE):
+        print('\tMigration "{}" applied'.format(name))
+
+
 def reinit_db(answers={}):
     prepare_db_dir(answers)
 
     print('\tStart initialize DB')
     Base.metadata.create_all(ENGINE)
+    stamp(ENGINE)
 
     add_user(*fill_credits(answers))
 
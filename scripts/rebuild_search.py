@@ -0,0 +1,21 @@
+from sys import path
+
+if __name__=='__main__':
+    path.append('')
+
+from db.engine import create_db_engine
+from db.search import create_search_tables, rebuild
+
+ENGINE = create_db_engine()
+
+
+def rebuild_search():
+    print('\tRebuild search index')
+    with ENGINE.begin() as connection:
+        create_search_tables(connection)
+        courses, lessons = rebuild(connection)
+    print('\tIndexed {} courses and {} lessons'.format(courses, lessons))
+
+
+if __name__ == '__main__':
+    rebuild_search()
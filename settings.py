@@ -25,6 +25,34 @@ class _Sets:
 
     DB_SCHEME = 'sqlite:///'
 
+    DB_EXECUTOR_WORKERS = 4  # threads for awaitable db calls (see DBBridge.run_in_executor)
+    DB_STATS_INTERVAL = 60  # seconds between executor and session stats in log (see DBBridge.log_stats), None - off
+
+    # engine settings, used by db.engine.create_db_engine
+    DB_POOL_SIZE = 5  # must be bigger than DB_EXECUTOR_WORKERS
+    DB_POOL_OVERFLOW = 10
+    DB_POOL_TIMEOUT = 30  # seconds
+    DB_POOL_RECYCLE = 3600  # seconds
+    DB_READ_ENGINE = True  # query_db functions read by own read only engine (see DBBridge.RoutingSession)
+    DB_READ_POOL_SIZE = 10
+    DB_BUSY_TIMEOUT = 5000  # ms, how long connection wait for locked db
+    DB_PRAGMAS = {  # applied on every new sqlite connection
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,  # negative value is size in KiB
+        'mmap_size': 128 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    }
+
+    BAKED_QUERIES = True  # cache compiled lookup queries (see models_handlers.bake), off for debugging
+    ENTITY_CACHE_SIZE = 1024  # models in each cache of db.cache (users, courses)
+    ENTITY_CACHE_TTL = 300  # seconds
+
+    SLOW_QUERY_MS = 100  # statements slower are logged to logs/slow_query.log (see db.sql_stats), None - off
+    SQL_STATS_HEADER = True  # Server-Timing header with SQL statements and time of request
+
+    PAGE_SIZE = 20  # rows per page in lists
+
     MEDIA_DIR = join(dirname(__file__), "media", "")
 
     STATIC_PATH = join(dirname(__file__), "static")
@@ -37,6 +65,9 @@ class _Sets:
 
     STREAM_WINDOW = 15  # val in minutes, that define allowed interval before lesson start and after lesson duration
 
+    SCHEDULER_BATCH = 500  # lessons ended by scheduler in one transaction
+    SCHEDULER_RETRY = 60  # seconds, when scheduler retries failed transaction
+
     RTMP_SERVER = '192.168.100.104'  # nginx rtmp server address (MUST use in any js, templates files)
 
 
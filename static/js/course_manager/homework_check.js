@@ -0,0 +1,53 @@
+$(document).ready(function(){
+    'use strict';
+
+    function getCookie(name) {
+        var cookieValue = null;
+        if (document.cookie && document.cookie !== '') {
+            var cookies = document.cookie.split(';');
+            for (var i = 0; i < cookies.length; i++) {
+                var cookie = jQuery.trim(cookies[i]);
+                if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                    cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                    break;
+                }
+            }
+        }
+        return cookieValue;
+    }
+
+    // all filled grades of page are sent by one request
+    $("#gradeBtn").on("click", function() {
+        var grades = {};
+        $(".answerGrade").each(function() {
+            if (this.value !== "") {
+                grades[$(this).attr("answer")] = parseInt(this.value);
+            }
+        });
+        if ($.isEmptyObject(grades)) {
+            return;
+        }
+
+        $.ajaxSetup({
+            headers: { "X-CSRFToken": getCookie("_xsrf") }
+        });
+
+        $.ajax({
+            url: "/teach/lesson/homework/grade",
+            type: "post",
+            data: {homework: $(this).attr("homework"), grades: JSON.stringify(grades)},
+            datatype: 'json',
+            success: function(data){
+                $(".answerGrade").each(function() {
+                    if (this.value !== "") {
+                        $(this).parent().text(this.value);
+                    }
+                });
+            },
+            error: function(data){
+                alert(JSON.parse(data['responseText'])['error']);
+            },
+        });
+    });
+
+});
@@ -0,0 +1,75 @@
+from os.path import abspath, join, dirname, exists
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from sqlalchemy import event
+
+from scripts.init_db import reinit_db
+from db.DBBridge import DBBridge, ENGINE, DB_SESSIONS
+from db.models import Course, CourseInvites
+from db.models_handlers import UserHandler, CourseHandler, CourseAccessHandler, CourseInvitesHandler
+
+
+class Test_10_transaction(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        self.commits = 0
+        event.listen(ENGINE, 'commit', self.count)
+
+    def count(self, *args):
+        self.commits += 1
+
+    def test_1_nested_commit_once(self):
+        course = CourseHandler.create('admin', 'Course', 'Description', Course.OPEN)
+        self.assertEqual(self.commits, 1)
+        self.assertTrue(CourseAccessHandler.check_write_access('admin', course.id))
+
+        DB_SESSIONS.add(CourseInvites(course=course.id, member=UserHandler.get('admin').id,
+                                      action=CourseInvites.LEARN))
+        DB_SESSIONS.commit()
+        self.commits = 0
+        CourseInvitesHandler.learn_invite_on_accept('Course', 'admin')
+        self.assertEqual(self.commits, 1)
+
+    def test_2_rollback_as_unit(self):
+        with self.assertRaises(ZeroDivisionError):
+            with DBBridge.transaction():
+                UserHandler.create('user1', 'pw', 'user1@user.ru')
+                UserHandler.create('user2', 'pw', 'user2@user.ru')
+                1 / 0
+        self.assertEqual(self.commits, 0)
+        self.assertIsNone(UserHandler.get('user1'))
+        self.assertIsNone(UserHandler.get('user2'))
+
+        with DBBridge.transaction():
+            UserHandler.create('user1', 'pw', 'user1@user.ru')
+            self.assertEqual(UserHandler.get('user1').name, 'user1')
+        self.assertEqual(self.commits, 1)
+
+    def tearDown(self):
+        event.remove(ENGINE, 'commit', self.count)
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,101 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime, timedelta
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from scripts.init_db import reinit_db
+from db.DBBridge import DB_SESSIONS
+from db.models import User, Course, Lesson, CourseMembers, CourseAccess
+from db.models_handlers import CourseMembersHandler, CourseAccessHandler, paginate, encode_cursor, decode_cursor
+
+
+class Test_11_pagination(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        self.page_size, sets.PAGE_SIZE = sets.PAGE_SIZE, 3
+        session = DB_SESSIONS()
+        admin = session.query(User).filter(User.name == 'admin').one()
+        course = Course(name='Course', description='', owner=admin.id, mode=Course.OPEN, state=Course.LIVE)
+        session.add(course)
+        session.flush()
+        self.course_id = course.id
+        session.add(CourseMembers(course=course.id, member=admin.id, assign_type=Course.OPEN))
+        start = datetime(2018, 5, 1, 10, 30)
+        # lessons with the same start time must not be lost between pages
+        for i, hours in enumerate((5, 0, 2, 2, 2, 1, 2)):
+            session.add(Lesson(name='lesson{}'.format(i), description='', start_time=start + timedelta(hours=hours),
+                               duration=60, state=Lesson.WAITING, course=course.id))
+        for i in range(7):
+            user = User(name='user{}'.format(i), password='', email='user{}@user.ru'.format(i))
+            session.add(user)
+            session.flush()
+            session.add(CourseAccess(user=user.id, course=course.id, access=CourseAccess.BROWSE))
+        session.commit()
+        DB_SESSIONS.remove()
+
+    def collect(self, load):
+        items, after = [], None
+        while True:
+            page = load(after)
+            self.assertLessEqual(len(page), 3)
+            items += page
+            after = page.cursor
+            if not after:
+                return items
+
+    def test_1_seek_by_start_time(self):
+        lessons = self.collect(lambda after: CourseMembersHandler.get_study_lessons('admin', after))
+        self.assertEqual([l.name for l in lessons],
+                         ['lesson1', 'lesson5', 'lesson2', 'lesson3', 'lesson4', 'lesson6', 'lesson0'])
+
+    def test_2_seek_by_id(self):
+        rights = self.collect(lambda after: CourseAccessHandler.get_all_by_course(self.course_id, after))
+        self.assertEqual([r._user.name for r in rights], ['user{}'.format(i) for i in range(7)])
+
+    def test_4_modify_rights_of_page(self):
+        # rights page posts only its users
+        page = CourseAccessHandler.get_all_by_course(self.course_id)
+        new_right = {r._user.name: CourseAccess.MODERATE for r in page}
+        new_right['user1'] = 'Remove'
+        CourseAccessHandler.modify_access_many(self.course_id, new_right)
+        DB_SESSIONS.remove()
+        rights = self.collect(lambda after: CourseAccessHandler.get_all_by_course(self.course_id, after))
+        self.assertEqual([(r._user.name, r.access) for r in rights],
+                         [('user0', CourseAccess.MODERATE), ('user2', CourseAccess.MODERATE)] +
+                         [('user{}'.format(i), CourseAccess.BROWSE) for i in range(3, 7)])
+
+    def test_3_cursor(self):
+        values = decode_cursor(encode_cursor(datetime(2018, 5, 1, 10, 30), 4), (Lesson.start_time, Lesson.id))
+        self.assertEqual(values, [datetime(2018, 5, 1, 10, 30), 4])
+        with self.assertRaises(ValueError):
+            decode_cursor(encode_cursor(4), (Lesson.start_time, Lesson.id))
+        with self.assertRaises(ValueError):
+            paginate(DB_SESSIONS().query(Lesson), Lesson.id, 'broken')
+
+    def tearDown(self):
+        sets.PAGE_SIZE = self.page_size
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
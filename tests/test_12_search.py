@@ -0,0 +1,92 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from scripts.init_db import reinit_db, ENGINE
+from db.DBBridge import DB_SESSIONS
+from db.models import Course
+from db.models_handlers import CourseHandler, LessonHandler
+from db.search import rebuild, to_match, COURSE_SEARCH
+
+
+class Test_12_search(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        self.page_size, sets.PAGE_SIZE = sets.PAGE_SIZE, 2
+        for name, description, mode in (('Python basics', 'Variables and loops', Course.OPEN),
+                                        ('Golang', 'Concurrency, compared with python', Course.CLOSED),
+                                        ('Advanced Python', 'Decorators', Course.OPEN),
+                                        ('Python secrets', 'Private course', Course.PRIVATE),
+                                        ('Ruby', 'Blocks', Course.OPEN)):
+            course = CourseHandler.create('admin', name, description, mode)
+            CourseHandler.change_state('admin', course.id, Course.LIVE)
+        course = CourseHandler.get('Python basics')
+        self.lesson_id = LessonHandler.create_lesson(course.id, 'Loops', 'for and while', datetime.now(), 60).id
+        DB_SESSIONS.remove()
+
+    def search_courses(self, text):
+        names, after = [], None
+        while True:
+            page = CourseHandler.search(text, after)
+            names += [c.name for c in page]
+            after = page.cursor
+            if not after:
+                return names
+
+    def test_1_ranked_pages(self):
+        # name match first, private course is not found
+        names = self.search_courses('pyth')
+        self.assertEqual(set(names[:2]), {'Python basics', 'Advanced Python'})
+        self.assertEqual(names[2:], ['Golang'])
+        self.assertEqual(self.search_courses('python LOOPS'), ['Python basics'])
+        self.assertEqual(self.search_courses('"*)('), [])
+
+    def test_2_lessons_sync(self):
+        self.assertEqual([l.name for l in LessonHandler.search('while')], ['Loops'])
+        lesson = LessonHandler.get_by_id(self.lesson_id)
+        LessonHandler.modify_lesson(lesson, 'Cycles', 'do until', lesson.start_time, 60, None)
+        self.assertEqual(len(LessonHandler.search('while')), 0)
+        self.assertEqual(LessonHandler.search('until')[0].course_name, 'Python basics')
+        LessonHandler.delete_lesson(LessonHandler.get_by_id(self.lesson_id))
+        self.assertEqual(len(LessonHandler.search('until')), 0)
+
+    def test_3_rebuild(self):
+        with ENGINE.begin() as connection:
+            connection.execute(COURSE_SEARCH.delete())
+        self.assertEqual(self.search_courses('ruby'), [])
+        with ENGINE.begin() as connection:
+            self.assertEqual(rebuild(connection), (5, 1))
+        self.assertEqual(self.search_courses('ruby'), ['Ruby'])
+
+    def test_4_match(self):
+        self.assertEqual(to_match('c++ "AND" NOT'), '"c"* "AND"* "NOT"*')
+        self.assertIsNone(to_match(' -- '))
+
+    def tearDown(self):
+        sets.PAGE_SIZE = self.page_size
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
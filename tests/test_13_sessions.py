@@ -0,0 +1,84 @@
+from os.path import abspath, join, dirname, exists
+from contextvars import copy_context
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from sqlalchemy.orm.exc import DetachedInstanceError
+
+from scripts.init_db import reinit_db
+from db.DBBridge import DBBridge, DB_SESSIONS
+from db.models import Course
+from db.models_handlers import UserHandler, CourseHandler
+
+
+def request(func):
+    # the same session lifecycle, as BaseHandler.prepare/on_finish, in own context
+    def run():
+        DBBridge.open_session()
+        try:
+            return func(), DB_SESSIONS()
+        finally:
+            DBBridge.close_session()
+    return copy_context().run(run)
+
+
+class Test_13_sessions(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        DB_SESSIONS.remove()
+        course = CourseHandler.create('admin', 'Course', 'Description', Course.OPEN)
+        self.course_id = course.id
+        DB_SESSIONS.remove()
+
+    def test_1_released(self):
+        before = DBBridge.session_stats()
+        for i in range(3):
+            request(lambda: CourseHandler.get_by_id(self.course_id)._owner.name)
+        self.assertEqual(DBBridge.session_stats(), before)
+
+    def test_2_own_session(self):
+        user, session = request(lambda: UserHandler.get('admin'))
+        other_user, other_session = request(lambda: UserHandler.get('admin'))
+        self.assertIsNot(session, other_session)
+        self.assertIsNot(user, other_user)
+        # not leaked to thread session
+        self.assertNotIn(user, DB_SESSIONS())
+
+    def test_3_detach(self):
+        def load():
+            course = CourseHandler.get_by_id(self.course_id)
+            CourseHandler.change_state('admin', self.course_id, Course.LIVE)  # commit expires course
+            return DBBridge.detach(course, '_owner', '_course_access._user')
+        course, session = request(load)
+        self.assertEqual(course.state, Course.LIVE)
+        self.assertEqual(course._owner.name, 'admin')
+        self.assertEqual(course._course_access[0]._user.name, 'admin')
+        with self.assertRaises(DetachedInstanceError):
+            course._lesson
+
+    def tearDown(self):
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
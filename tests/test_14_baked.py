@@ -0,0 +1,84 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from sqlalchemy import event
+from sqlalchemy.orm import Query
+
+from scripts.init_db import reinit_db
+from db.DBBridge import DB_SESSIONS
+from db.cache import clear_all
+from db.models import Course
+from db.models_handlers import UserHandler, CourseHandler, LessonHandler, LessonAccessHandler
+
+
+class Test_14_baked_queries(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        course = CourseHandler.create('admin', 'Course', 'Description', Course.OPEN)
+        lesson = LessonHandler.create_lesson(course.id, 'Lesson', 'Description', datetime.now(), 60)
+        LessonAccessHandler.add_access_to_all_partners(course.id, lesson.id)
+        self.course_id, self.lesson_id = course.id, lesson.id
+        self.keys = lesson.stream_key, lesson.stream_pw
+        self.compiled = 0
+        event.listen(Query, 'before_compile', self.count)
+
+    def count(self, query):
+        self.compiled += 1
+
+    def lookups(self):
+        clear_all()
+        lesson = LessonHandler.get_by_keys(*self.keys)
+        return (
+            UserHandler.get('admin').email,
+            CourseHandler.get_by_id(self.course_id).name,
+            CourseHandler.get('Course').id,
+            LessonHandler.get_by_id(self.lesson_id).name,
+            lesson.id,
+        )
+
+    def test_1_compiled_once(self):
+        expected = self.lookups()
+        self.compiled = 0
+        for i in range(3):
+            self.assertEqual(self.lookups(), expected)
+        self.assertEqual(self.compiled, 0)
+
+    def test_2_switch_off(self):
+        expected = self.lookups()
+        sets.BAKED_QUERIES = False
+        try:
+            self.compiled = 0
+            self.assertEqual(self.lookups(), expected)
+            self.assertEqual(self.compiled, 5)
+        finally:
+            sets.BAKED_QUERIES = True
+
+    def tearDown(self):
+        event.remove(Query, 'before_compile', self.count)
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
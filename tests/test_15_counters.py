@@ -0,0 +1,99 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from scripts.init_db import reinit_db, ENGINE
+from db.DBBridge import DB_SESSIONS
+from db.migrations import upgrade, SCHEMA_VERSION
+from db.counters import check_counters, repair_counters
+from db.models import Course
+from db.models_handlers import UserHandler, CourseHandler, LessonHandler, HomeWorkHandler, HomeWorkAnswerHandler
+
+
+class Test_15_counters(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        course = CourseHandler.create('admin', 'Course', 'Description', Course.OPEN)
+        CourseHandler.change_state('admin', course.id, Course.LIVE)
+        self.course_id = course.id
+        for name in ('bob', 'alice'):
+            UserHandler.create(name, '', '{}@mail.ru'.format(name))
+        DB_SESSIONS.remove()
+
+    def test_1_maintained(self):
+        # cached course must be updated too
+        self.assertEqual(CourseHandler.get_by_id(self.course_id).members_count, 0)
+        CourseHandler.associate_with_course('bob', 'Course')
+        CourseHandler.associate_with_course('alice', 'Course')
+        CourseHandler.associate_with_course('alice', 'Course')  # already member
+        lessons = [LessonHandler.create_lesson(self.course_id, 'Lesson{}'.format(i), '', datetime.now(), 60)
+                   for i in range(3)]
+        LessonHandler.delete_lesson(lessons[0])
+        hw_id = HomeWorkHandler.add('Homework', '', lessons[1]).id
+        HomeWorkAnswerHandler.add_answer('bob', hw_id, 'answer')
+        HomeWorkAnswerHandler.add_answer('alice', hw_id, 'answer')
+        DB_SESSIONS.remove()
+
+        course = CourseHandler.get_by_id(self.course_id)
+        self.assertEqual((course.members_count, course.lessons_count), (2, 2))
+        self.assertEqual(HomeWorkHandler.get_by_id(hw_id).answers_count, 2)
+        row = CourseHandler.get_all_by_partner('admin')[0]
+        self.assertEqual((row.members_count, row.lessons_count), (2, 2))
+        with ENGINE.begin() as connection:
+            self.assertEqual(check_counters(connection), [])
+
+    def test_2_repair(self):
+        CourseHandler.associate_with_course('bob', 'Course')
+        with ENGINE.begin() as connection:
+            connection.execute('UPDATE course SET members_count = 5, lessons_count = 1')
+            self.assertEqual(sorted(check_counters(connection)), [
+                ('course', self.course_id, 'lessons_count', 1, 0),
+                ('course', self.course_id, 'members_count', 5, 1),
+            ])
+            self.assertEqual(repair_counters(connection), 2)
+            self.assertEqual(check_counters(connection), [])
+
+    def test_3_answers_indexed(self):
+        with ENGINE.begin() as connection:
+            plans = [str(row) for statement in (
+                'SELECT count(*) FROM home_work_answer WHERE home_work = 1',
+                'SELECT home_work.id FROM home_work WHERE answers_count != '
+                '(SELECT count(*) FROM home_work_answer WHERE home_work_answer.home_work = home_work.id)',
+            ) for row in connection.execute('EXPLAIN QUERY PLAN ' + statement)]
+            self.assertTrue(all('SCAN home_work_answer' not in plan for plan in plans), plans)
+            self.assertTrue(any('ix_home_work_answer_home_work' in plan for plan in plans), plans)
+            # db before index: added by migration
+            connection.execute('DROP INDEX ix_home_work_answer_home_work')
+            connection.execute(SCHEMA_VERSION.delete().where(SCHEMA_VERSION.c.version == 5))
+        self.assertEqual(upgrade(ENGINE), ['add_answers_index'])
+        with ENGINE.begin() as connection:
+            self.assertIn('ix_home_work_answer_home_work', [row[1] for row in connection.execute(
+                "PRAGMA index_list('home_work_answer')")])
+
+    def tearDown(self):
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
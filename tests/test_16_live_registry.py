@@ -0,0 +1,104 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from sqlalchemy import event
+
+from scripts.init_db import reinit_db
+from db.DBBridge import DBBridge, ENGINE, READ_ENGINE, DB_SESSIONS
+from db.live import LIVE_LESSONS
+from db.models import Course, Lesson
+from db.models_handlers import CourseHandler, LessonHandler
+
+
+class Test_16_live_registry(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        course = CourseHandler.create('admin', 'Course', 'Description', Course.OPEN)
+        CourseHandler.change_state('admin', course.id, Course.LIVE)
+        lesson = LessonHandler.create_lesson(course.id, 'Lesson', 'Description', datetime.now(), 60)
+        self.course_id, self.lesson_id = course.id, lesson.id
+        self.keys = lesson.stream_key, lesson.stream_pw
+        LessonHandler.load_live_lessons()
+        DB_SESSIONS.remove()
+
+    def live(self):
+        return [(l.name, l.state) for l in CourseHandler.get_open_course_live_lesson()]
+
+    def test_1_transitions(self):
+        self.assertEqual(self.live(), [])
+        LessonHandler.activate_lesson(*self.keys)
+        self.assertEqual(self.live(), [('Lesson', Lesson.LIVE)])
+        LessonHandler.stop_lesson(*self.keys)
+        self.assertEqual(self.live(), [('Lesson', Lesson.INTERRUPTED)])
+        lesson = LessonHandler.get_by_id(self.lesson_id)
+        LessonHandler.modify_lesson(lesson, 'Renamed', 'Description', lesson.start_time, 60, None)
+        self.assertEqual(self.live(), [('Renamed', Lesson.INTERRUPTED)])
+        CourseHandler.change_state('admin', self.course_id, Course.ENDED)
+        self.assertEqual(self.live(), [])
+        CourseHandler.change_state('admin', self.course_id, Course.LIVE)
+        self.assertEqual(self.live(), [('Renamed', Lesson.INTERRUPTED)])
+        LessonHandler.delete_lesson(LessonHandler.get_by_id(self.lesson_id))
+        self.assertEqual(self.live(), [])
+        self.assertEqual(len(LIVE_LESSONS), 0)
+
+    def test_2_rollback(self):
+        with self.assertRaises(ZeroDivisionError):
+            with DBBridge.transaction():
+                LessonHandler.activate_lesson(*self.keys)
+                1 / 0
+        self.assertEqual(self.live(), [])
+
+    def test_3_no_sql(self):
+        LessonHandler.activate_lesson(*self.keys)
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+        for engine in {ENGINE, READ_ENGINE}:
+            event.listen(engine, 'before_cursor_execute', count)
+        try:
+            self.assertEqual(self.live(), [('Lesson', Lesson.LIVE)])
+        finally:
+            for engine in {ENGINE, READ_ENGINE}:
+                event.remove(engine, 'before_cursor_execute', count)
+        self.assertEqual(statements, [])
+        # the same after restart
+        LessonHandler.load_live_lessons()
+        self.assertEqual(self.live(), [('Lesson', Lesson.LIVE)])
+
+    def test_4_change_state_by_argument(self):
+        # ManageCourseHandler passes course id as request argument string
+        LessonHandler.activate_lesson(*self.keys)
+        CourseHandler.change_state('admin', str(self.course_id), Course.ENDED)
+        self.assertEqual(self.live(), [])
+        CourseHandler.change_state('admin', str(self.course_id), Course.LIVE)
+        self.assertEqual(self.live(), [('Lesson', Lesson.LIVE)])
+
+    def tearDown(self):
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,113 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime, timedelta
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from sqlalchemy import event
+
+from scripts.init_db import reinit_db
+from db.DBBridge import ENGINE, READ_ENGINE, DB_SESSIONS
+from db.migrations import upgrade, SCHEMA_VERSION
+from db.models import Course, Lesson
+from db.models_handlers import UserHandler, CourseHandler, LessonHandler, LessonAccessHandler
+
+
+class Test_17_schedule(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        UserHandler.create('bob', '', 'bob@mail.ru')
+        self.start = datetime.now().replace(microsecond=0) + timedelta(days=1)
+        self.course_id = CourseHandler.create('admin', 'Course', 'Description', Course.OPEN).id
+        self.other_id = CourseHandler.create('bob', 'Other', 'Description', Course.OPEN).id
+        # 0-60 and 120-150 minutes after start
+        self.first = self.lesson(self.course_id, 'First', 0, 60)
+        self.second = self.lesson(self.course_id, 'Second', 120, 30)
+        DB_SESSIONS.remove()
+
+    def lesson(self, course_id, name, offset, duration):
+        lesson = LessonHandler.create_lesson(course_id, name, 'Description', self.at(offset), duration)
+        LessonAccessHandler.add_access_to_all_partners(course_id, lesson.id)
+        return lesson.id
+
+    def at(self, offset):
+        return self.start + timedelta(minutes=offset)
+
+    def overlapping(self, offset, duration, **kwargs):
+        return [l.id for l in LessonHandler.get_overlapping(self.at(offset), duration, **kwargs)]
+
+    def test_1_course(self):
+        course = {'course_id': self.course_id}
+        self.assertEqual(self.overlapping(-30, 60, **course), [self.first])  # end inside
+        self.assertEqual(self.overlapping(30, 60, **course), [self.first])  # start inside
+        self.assertEqual(self.overlapping(10, 20, **course), [self.first])  # inside of existed
+        self.assertEqual(self.overlapping(-10, 300, **course), [self.first, self.second])  # contains both
+        self.assertEqual(self.overlapping(60, 60, **course), [])  # between, lessons can follow each other
+        self.assertEqual(self.overlapping(-60, 60, **course), [])
+        self.assertEqual(self.overlapping(30, 60, course_id=self.other_id), [])
+        self.assertEqual(self.overlapping(30, 60, exclude=self.first, **course), [])
+
+    def test_2_lecturer(self):
+        bobs = self.lesson(self.other_id, 'Bobs', 200, 60)
+        self.assertEqual(self.overlapping(0, 300, username='bob'), [bobs])
+        self.assertEqual(self.overlapping(0, 300, username='admin'), [self.first, self.second])
+        # learners are not lecturers
+        CourseHandler.associate_with_course('bob', 'Course')
+        self.assertEqual(self.overlapping(0, 300, username='bob'), [bobs])
+
+    def test_3_indexed(self):
+        plans = []
+
+        def explain(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('SELECT') and 'FROM lesson' in statement:
+                explained = conn.connection.cursor()
+                explained.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+                plans.append(' '.join(str(row) for row in explained.fetchall()))
+
+        for engine in {ENGINE, READ_ENGINE}:
+            event.listen(engine, 'before_cursor_execute', explain)
+        try:
+            self.overlapping(0, 60, course_id=self.course_id)
+        finally:
+            for engine in {ENGINE, READ_ENGINE}:
+                event.remove(engine, 'before_cursor_execute', explain)
+        self.assertEqual(len(plans), 1)
+        self.assertIn('ix_lesson_course_start_time', plans[0])
+
+    def test_4_legacy_long_lesson(self):
+        with self.assertRaises(ValueError):
+            LessonHandler.create_lesson(self.course_id, 'Long', 'Description', self.at(400), Lesson.MAX_DURATION + 1)
+        # lessons created before MAX_DURATION limit are clamped by migration
+        with ENGINE.begin() as connection:
+            connection.execute(Lesson.__table__.update().where(Lesson.id == self.first).values(duration=600))
+            connection.execute(SCHEMA_VERSION.delete().where(SCHEMA_VERSION.c.version == 6))
+        self.assertEqual(upgrade(ENGINE), ['clamp_lesson_duration'])
+        self.assertEqual(LessonHandler.get_by_id(self.first).duration, Lesson.MAX_DURATION)
+        self.assertEqual(self.overlapping(250, 60, course_id=self.course_id), [self.first])
+        self.assertEqual(self.overlapping(300, 60, course_id=self.course_id), [])
+
+    def tearDown(self):
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
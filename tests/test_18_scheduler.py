@@ -0,0 +1,114 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime, timedelta
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from scripts.init_db import reinit_db
+from db.DBBridge import DB_SESSIONS
+from db.live import LIVE_LESSONS
+from db.models import Course, Lesson
+from db.models_handlers import CourseHandler, LessonHandler
+from db.scheduler import LESSON_SCHEDULER, window_end
+
+
+class Test_18_scheduler(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        course = CourseHandler.create('admin', 'Course', 'Description', Course.OPEN)
+        CourseHandler.change_state('admin', course.id, Course.LIVE)
+        self.course_id = course.id
+        DB_SESSIONS.remove()
+
+    def lesson(self, name, ends_in):
+        # lesson, which stream window is over in ends_in seconds
+        start = datetime.now() - timedelta(minutes=60 + sets.STREAM_WINDOW) + timedelta(seconds=ends_in)
+        return LessonHandler.create_lesson(self.course_id, name, 'Description', start, 60).id
+
+    def state(self, lesson_id):
+        DB_SESSIONS.remove()
+        return LessonHandler.get_by_id(lesson_id).state
+
+    def test_1_heap(self):
+        first, second, third = self.lesson('First', 30), self.lesson('Second', 10), self.lesson('Third', 20)
+        self.assertEqual(len(LESSON_SCHEDULER), 3)
+        lesson = LessonHandler.get_by_id(second)
+        self.assertEqual(LESSON_SCHEDULER.nearest(), window_end(lesson.start_time, lesson.duration))
+        # moved and removed lessons leave stale entries only
+        LessonHandler.modify_lesson(lesson, 'Second', 'Description', lesson.start_time + timedelta(hours=1), 60, None)
+        LessonHandler.delete_lesson(LessonHandler.get_by_id(third))
+        self.assertEqual(LESSON_SCHEDULER.due(datetime.now() + timedelta(minutes=1)), [first])
+        self.assertEqual(LESSON_SCHEDULER.due(datetime.now() + timedelta(hours=2)), [second])
+        self.assertEqual(len(LESSON_SCHEDULER), 0)
+
+    def test_2_load(self):
+        ended = self.lesson('Ended', -10)
+        self.lesson('Waiting', 60)
+        LESSON_SCHEDULER.clear()
+        self.assertEqual(LessonHandler.load_schedule(), 2)
+        self.assertEqual(LESSON_SCHEDULER.due(), [ended])
+
+    def test_3_ends_on_time(self):
+        overdue, soon, later = self.lesson('Overdue', -10), self.lesson('Soon', 1), self.lesson('Later', 60)
+        LessonHandler.activate_lesson(*self.keys(soon))
+        self.assertEqual(len(LIVE_LESSONS), 1)
+        states = []
+
+        async def run():
+            LESSON_SCHEDULER.start(IOLoop.current(), LessonHandler.end_lessons.awaitable)
+            await gen.sleep(0.2)
+            states.append((self.state(overdue), self.state(soon)))
+            await gen.sleep(1.5)
+
+        try:
+            IOLoop.current().run_sync(run)
+        finally:
+            LESSON_SCHEDULER.stop()
+        self.assertEqual(states, [(Lesson.ENDED, Lesson.LIVE)])
+        self.assertEqual(self.state(soon), Lesson.ENDED)
+        self.assertEqual(self.state(later), Lesson.WAITING)
+        self.assertEqual(len(LIVE_LESSONS), 0)
+        self.assertEqual(len(LESSON_SCHEDULER), 1)
+
+    def test_4_modified_after_taken(self):
+        lesson_id = self.lesson('Lesson', -10)
+        self.assertEqual(LESSON_SCHEDULER.due(), [lesson_id])
+        lesson = LessonHandler.get_by_id(lesson_id)
+        LessonHandler.modify_lesson(lesson, 'Lesson', 'Description', datetime.now(), 60, None)
+        DB_SESSIONS.remove()
+        self.assertEqual(LessonHandler.end_lessons([lesson_id]), 0)
+        self.assertEqual(self.state(lesson_id), Lesson.WAITING)
+        self.assertEqual(len(LESSON_SCHEDULER), 1)
+
+    def keys(self, lesson_id):
+        lesson = LessonHandler.get_by_id(lesson_id)
+        return lesson.stream_key, lesson.stream_pw
+
+    def tearDown(self):
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
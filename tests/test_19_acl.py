@@ -0,0 +1,137 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime, timedelta
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from sqlalchemy import event
+
+from scripts.init_db import reinit_db
+from db.DBBridge import DBBridge, ENGINE, READ_ENGINE, DB_SESSIONS, TASK_SESSIONS
+from db.acl import get_acl
+from db.cache import ACL_CACHE
+from db.models import Course, CourseAccess, LessonAccess
+from db.models_handlers import (UserHandler, CourseHandler, LessonHandler, CourseAccessHandler,
+                               LessonAccessHandler)
+
+
+class Test_19_acl(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        UserHandler.create('bob', '', 'bob@mail.ru')
+        self.bob = UserHandler.get('bob').id
+        course = CourseHandler.create('admin', 'Course', 'Description', Course.OPEN)
+        CourseAccessHandler.add_browse_access('bob', course)
+        self.course_id = course.id
+        self.lessons = [self.lesson('Lesson{}'.format(i)) for i in range(3)]
+        DB_SESSIONS.remove()
+        self.statements = 0
+        for engine in {ENGINE, READ_ENGINE}:
+            event.listen(engine, 'before_cursor_execute', self.count)
+
+    def count(self, *args):
+        self.statements += 1
+
+    def lesson(self, name):
+        lesson = LessonHandler.create_lesson(self.course_id, name, 'Description', datetime.now() + timedelta(days=1), 60)
+        LessonAccessHandler.add_access_to_all_partners(self.course_id, lesson.id)
+        return lesson.id
+
+    def rights(self, username):
+        # new session for every check, as in request
+        DB_SESSIONS.remove()
+        user, course = UserHandler.get(username), CourseHandler.get_by_id(self.course_id)
+        course_right = CourseAccessHandler.check_any_access(user, course)
+        lesson_rights = [LessonAccessHandler.check_any_access(username, LessonHandler.get_by_id(lesson_id))
+                         for lesson_id in self.lessons]
+        return course_right and course_right.access, [right and right.access for right in lesson_rights]
+
+    def test_1_loaded_once(self):
+        self.assertEqual(self.rights('bob'), (CourseAccess.BROWSE, [LessonAccess.VIEW] * 3))
+        self.assertEqual(self.rights('admin'), (CourseAccess.MODERATE, [LessonAccess.MODERATE] * 3))
+        self.assertTrue(CourseAccessHandler.check_write_access('admin', self.course_id))
+        self.assertFalse(CourseAccessHandler.check_write_access('bob', self.course_id))
+        self.assertFalse(LessonAccessHandler.check_write_access('bob', LessonHandler.get_by_id(self.lessons[0])))
+        self.assertTrue(CourseAccessHandler.check_write_access_by_lesson(
+            'admin', LessonHandler.get_by_id(self.lessons[0])))
+        loaded = ACL_CACHE.misses
+        self.statements = 0
+        for i in range(3):
+            self.assertTrue(CourseAccessHandler.check_write_access('admin', str(self.course_id)))
+            self.rights('bob')
+        # only lessons are queried (entity cache and ACL hits)
+        self.assertEqual(self.statements, 3 * len(self.lessons))
+        self.assertEqual(ACL_CACHE.misses, loaded)
+
+    def test_2_invalidated(self):
+        self.rights('bob')
+        CourseAccessHandler.modify_access_many(self.course_id, {'bob': CourseAccess.MODERATE})
+        self.assertEqual(self.rights('bob')[0], CourseAccess.MODERATE)
+        LessonAccessHandler.modify_access_many(self.course_id, 'bob', {
+            'Lesson0': LessonAccess.TEACH, 'Lesson1': LessonAccess.VIEW, 'Lesson2': LessonAccess.MODERATE})
+        self.assertEqual(self.rights('bob')[1], [LessonAccess.TEACH, LessonAccess.VIEW, LessonAccess.MODERATE])
+        # new lesson and its accesses (bulk INSERT)
+        self.lessons.append(self.lesson('Lesson3'))
+        self.assertEqual(self.rights('bob')[1][-1], LessonAccess.MODERATE)
+        CourseAccessHandler.modify_access_many(self.course_id, {'bob': 'Remove'})
+        self.assertEqual(self.rights('bob'), (None, [None] * 4))
+        LessonAccessHandler.add_access(self.bob, self.lessons[0], LessonAccess.VIEW)
+        self.assertEqual(self.rights('bob')[1], [LessonAccess.VIEW, None, None, None])
+
+    def test_3_rollback(self):
+        self.rights('bob')
+        with self.assertRaises(ValueError):
+            with DBBridge.transaction():
+                CourseAccessHandler.modify_access_many(self.course_id, {'bob': CourseAccess.MODERATE})
+                self.assertEqual(self.rights_in_transaction(), CourseAccess.MODERATE)
+                raise ValueError
+        self.assertEqual(self.rights('bob')[0], CourseAccess.BROWSE)
+
+    def test_4_stale_acl(self):
+        # request reads, concurrent revoke is committed, then request loads ACL
+        ACL_CACHE.invalidate(self.course_id)
+        session = DB_SESSIONS()
+        session.execute('SELECT 1')
+        other = TASK_SESSIONS()
+        other.query(CourseAccess).filter(CourseAccess.course == self.course_id,
+                                         CourseAccess.user == self.bob).one().access = CourseAccess.MODERATE
+        other.commit()
+        other.close()
+        stale = ACL_CACHE.stale
+        get_acl(session, self.course_id)
+        self.assertEqual(ACL_CACHE.stale, stale + 1)
+        self.assertIsNone(ACL_CACHE.get(self.course_id))
+        self.assertEqual(self.rights('bob')[0], CourseAccess.MODERATE)
+        self.assertIsNotNone(ACL_CACHE.get(self.course_id))
+
+    def rights_in_transaction(self):
+        user, course = UserHandler.get('bob'), CourseHandler.get_by_id(self.course_id)
+        return CourseAccessHandler.check_any_access(user, course).access
+
+    def tearDown(self):
+        for engine in {ENGINE, READ_ENGINE}:
+            event.remove(engine, 'before_cursor_execute', self.count)
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,94 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from sqlalchemy import event
+
+from scripts.init_db import reinit_db
+from db.DBBridge import ENGINE, DB_SESSIONS
+from db.models import Course, User, HomeWorkAnswer
+from db.models_handlers import CourseHandler, LessonHandler, HomeWorkHandler, HomeWorkAnswerHandler, GRADE_BATCH
+
+
+class Test_20_grading(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        course = CourseHandler.create('admin', 'Course', 'Description', Course.OPEN)
+        lesson = LessonHandler.create_lesson(course.id, 'Lesson', 'Description', datetime.now(), 60)
+        self.hw_id = HomeWorkHandler.add('Homework', '', lesson).id
+        self.other_id = HomeWorkHandler.add('Other', '', lesson).id
+        session = DB_SESSIONS()
+        students = [User(name='student{}'.format(i), password='', email='{}@mail.ru'.format(i))
+                    for i in range(1000)]  # more than variables of one statement in old SQLite
+        session.add_all(students)
+        session.flush()
+        answers = [HomeWorkAnswer(description='answer', home_work=self.hw_id, source=s.id) for s in students]
+        session.add_all(answers)
+        session.add(HomeWorkAnswer(description='answer', home_work=self.other_id, source=students[0].id))
+        session.commit()
+        self.answers = [a.id for a in answers]
+        DB_SESSIONS.remove()
+        self.statements = []
+        self.parameters = []
+        event.listen(ENGINE, 'before_cursor_execute', self.count)
+        event.listen(ENGINE, 'commit', self.count_commit)
+
+    def count(self, conn, cursor, statement, parameters, *args):
+        self.statements.append(statement.split()[0])
+        self.parameters.append(len(parameters))
+
+    def count_commit(self, conn):
+        self.statements.append('COMMIT')
+
+    def grades(self):
+        return dict(DB_SESSIONS().query(HomeWorkAnswer.id, HomeWorkAnswer.grade))
+
+    def test_1_one_transaction(self):
+        grades = {answer_id: answer_id % 101 for answer_id in self.answers}
+        self.assertEqual(HomeWorkAnswerHandler.grade_answers(self.hw_id, {str(k): v for k, v in grades.items()}), [])
+        # one check, UPDATE per batch, one commit
+        self.assertEqual(self.statements.count('SELECT'), 1)
+        self.assertEqual(self.statements.count('UPDATE'), 4)
+        self.assertEqual(self.statements.count('COMMIT'), 1)
+        # no statement binds more parameters than old SQLite allows
+        self.assertLessEqual(max(self.parameters), 999)
+        graded = self.grades()
+        self.assertEqual({answer_id: graded[answer_id] for answer_id in self.answers}, grades)
+
+    def test_2_answers_of_other_homework(self):
+        grades = self.grades()
+        other = max(grades)
+        unknown = HomeWorkAnswerHandler.grade_answers(self.hw_id, {self.answers[0]: 50, other: 50, 100000: 50})
+        self.assertEqual(unknown, [other, 100000])
+        self.assertNotIn('UPDATE', self.statements)
+        self.assertEqual(self.grades(), grades)
+
+    def tearDown(self):
+        event.remove(ENGINE, 'before_cursor_execute', self.count)
+        event.remove(ENGINE, 'commit', self.count_commit)
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
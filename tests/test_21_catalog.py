@@ -0,0 +1,187 @@
+from os import makedirs
+from os.path import abspath, join, dirname, exists
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from scripts import catalog
+from scripts.init_db import reinit_db, ENGINE
+from db.DBBridge import DB_SESSIONS
+from db.models import Course, CourseAccess
+from db.models_handlers import (UserHandler, CourseHandler, CourseAccessHandler, LessonHandler,
+                               LessonAccessHandler, LessonMaterialHandler, HomeWorkHandler)
+
+ANSWERS = {
+    "username": "admin",
+    "password": "1234",
+    "email": "admin@admin.ru",
+    "remove_existed": "y"
+}
+
+
+class BrokenStream(BytesIO):
+    # connection is lost in the middle of stream
+
+    def read(self, size=-1):
+        if self.tell() > len(self.getvalue()) // 2:
+            raise OSError('Connection lost')
+        return super().read(size)
+
+
+class Test_21_catalog(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers=ANSWERS)
+        self.media_dir = sets.MEDIA_DIR
+        sets.MEDIA_DIR = 'tests/data/media/'
+        makedirs(sets.MEDIA_DIR)
+        self.batch = catalog.CATALOG_BATCH, catalog.CATALOG_COMMIT
+        catalog.CATALOG_BATCH, catalog.CATALOG_COMMIT = 3, 5  # many chunks and commits
+        UserHandler.create('bob', 'pw', 'bob@mail.ru')
+        course = CourseHandler.create('bob', 'Course', 'Description', Course.OPEN)
+        CourseAccessHandler.add_browse_access('admin', course)
+        for i in range(7):
+            lesson = LessonHandler.create_lesson(course.id, 'Lesson{}'.format(i), 'Description',
+                                                 datetime(2020, 1, 1, 10, i, 30, 15), 60)
+            LessonAccessHandler.add_access_to_all_partners(course.id, lesson.id)
+            HomeWorkHandler.add('Homework{}'.format(i), '', lesson)
+            LessonMaterialHandler.add_file('slides{}.txt'.format(i), 'slides {}'.format(i).encode(), lesson)
+        CourseHandler.create('admin', 'Other', 'Description', Course.CLOSED)
+        DB_SESSIONS.remove()
+
+    def snapshot(self):
+        DB_SESSIONS.remove()
+        lessons = {}
+        for course_name in ('Course', 'Other'):
+            course = CourseHandler.get(course_name)
+            for lesson in course._lesson:
+                material = lesson._lesson_material[0]
+                path, _ = LessonMaterialHandler.get_with_path(material.real_name)
+                lessons[lesson.name] = (
+                    course.name, course._owner.name, course.lessons_count, lesson.start_time,
+                    [hw.title for hw in lesson._home_work],
+                    sorted((a._user.name, a.access) for a in lesson._lesson_access),
+                    material.pretty_name, path.read_bytes(),
+                )
+        return lessons
+
+    def export(self):
+        out = BytesIO()
+        counts = catalog.export_catalog(ENGINE, out)
+        out.seek(0)
+        return counts, out
+
+    def test_1_round_trip(self):
+        expected = self.snapshot()
+        counts, out = self.export()
+        self.assertEqual(counts['lesson'], 7)
+        self.assertEqual(counts['lesson_material'], 7)
+        reinit_db(answers=ANSWERS)
+        rmtree(sets.MEDIA_DIR)
+        imported, skipped = catalog.import_catalog(ENGINE, out)
+        # admin is created by reinit_db
+        self.assertEqual(skipped['user'], 1)
+        self.assertEqual((imported['user'], imported['course'], imported['lesson']), (1, 2, 7))
+        self.assertEqual(self.snapshot(), expected)
+        with ENGINE.begin() as connection:
+            self.assertEqual(connection.execute(
+                "SELECT count(*) FROM lesson_search WHERE lesson_search MATCH 'Lesson3'").scalar(), 1)
+
+    def test_2_existed_course(self):
+        counts, out = self.export()
+        with ENGINE.begin() as connection:
+            other = CourseHandler.get('Other').id
+            connection.execute(CourseAccess.__table__.delete().where(CourseAccess.course == other))
+            connection.execute(Course.__table__.delete().where(Course.id == other))
+        imported, skipped = catalog.import_catalog(ENGINE, out)
+        self.assertEqual((imported['course'], imported['lesson'], imported['lesson_material']), (1, 0, 0))
+        self.assertEqual((skipped['course'], skipped['lesson'], skipped['lesson_access']), (1, 7, 14))
+        self.assertEqual(CourseHandler.get('Other')._owner.name, 'admin')
+
+    def test_3_existed_email(self):
+        counts, out = self.export()
+        reinit_db(answers=ANSWERS)
+        rmtree(sets.MEDIA_DIR)
+        UserHandler.create('robert', 'pw', 'bob@mail.ru')
+        imported, skipped = catalog.import_catalog(ENGINE, out)
+        self.assertEqual((imported['user'], skipped['user']), (0, 2))
+        self.assertEqual(imported['lesson'], 7)
+        self.assertEqual(CourseHandler.get('Course')._owner.name, 'robert')
+
+    def test_4_broken_stream(self):
+        counts, out = self.export()
+        reinit_db(answers=ANSWERS)
+        rmtree(sets.MEDIA_DIR)
+        with self.assertRaises(OSError):
+            catalog.import_catalog(ENGINE, BrokenStream(out.getvalue()))
+        # committed part is counted and searchable, files of rolled back materials are removed
+        with ENGINE.begin() as connection:
+            self.assertEqual(
+                {row.real_name for row in connection.execute('SELECT real_name FROM lesson_material')},
+                {path.name for path in Path(sets.MEDIA_DIR).glob('*/*')})
+            lessons = connection.execute("SELECT count(*) FROM lesson").scalar()
+            self.assertGreater(lessons, 0)
+            self.assertEqual(connection.execute(
+                "SELECT sum(lessons_count) FROM course").scalar(), lessons)
+            self.assertEqual(connection.execute(
+                "SELECT count(*) FROM lesson_search WHERE lesson_search MATCH 'Lesson0'").scalar(), 1)
+
+    def test_6_rolled_back_files(self):
+        counts, out = self.export()
+        reinit_db(answers=ANSWERS)
+        rmtree(sets.MEDIA_DIR)
+        catalog.CATALOG_COMMIT = 1000  # nothing is committed
+        add_file = catalog._Importer.add_file
+        written = []
+
+        def broken_add_file(importer, name, fileobj):
+            # connection is lost after some files are written
+            if len(written) == 3:
+                raise OSError('Connection lost')
+            written.append(add_file(importer, name, fileobj))
+
+        catalog._Importer.add_file = broken_add_file
+        try:
+            with self.assertRaises(OSError):
+                catalog.import_catalog(ENGINE, out)
+        finally:
+            catalog._Importer.add_file = add_file
+        with ENGINE.begin() as connection:
+            self.assertEqual(connection.execute('SELECT count(*) FROM lesson_material').scalar(), 0)
+        self.assertEqual(list(Path(sets.MEDIA_DIR).glob('*/*')), [])
+
+    def test_5_shared_rows(self):
+        # renamed course is imported again into the same db: its keys must not break unique indexes
+        counts, out = self.export()
+        with ENGINE.begin() as connection:
+            connection.execute(Course.__table__.update().where(Course.name == 'Course').values(name='Renamed'))
+        imported, skipped = catalog.import_catalog(ENGINE, out)
+        self.assertEqual((imported['course'], imported['lesson']), (1, 7))
+        course, renamed = CourseHandler.get('Course'), CourseHandler.get('Renamed')
+        self.assertNotEqual(course.invite_lector_url, renamed.invite_lector_url)
+        self.assertFalse({l.stream_key for l in course._lesson} & {l.stream_key for l in renamed._lesson})
+
+    def tearDown(self):
+        sets.MEDIA_DIR = self.media_dir
+        catalog.CATALOG_BATCH, catalog.CATALOG_COMMIT = self.batch
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,99 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from scripts import generate_data
+from scripts.init_db import reinit_db, ENGINE
+from db.counters import check_counters
+from db.models import Course, Lesson
+
+ANSWERS = {
+    "username": "admin",
+    "password": "1234",
+    "email": "admin@admin.ru",
+    "remove_existed": "y"
+}
+NOW = datetime(2020, 3, 2, 12, 30)
+USERS = 1000
+
+
+class Test_22_generate_data(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers=ANSWERS)
+        self.batch = generate_data.GENERATE_BATCH, generate_data.GENERATE_COMMIT
+        generate_data.GENERATE_BATCH, generate_data.GENERATE_COMMIT = 100, 1000  # many INSERTs and commits
+
+    def dump(self):
+        # all generated rows but password hash
+        rows = {}
+        with ENGINE.connect() as connection:
+            for model in generate_data.MODELS:
+                table = model.__table__
+                columns = [c for c in table.columns if c.name != 'password']
+                rows[table.name] = [tuple(row) for row in connection.execute(
+                    table.select().with_only_columns(columns).order_by(table.c.id))]
+        return rows
+
+    def test_1_deterministic(self):
+        counts = generate_data.generate(ENGINE, users=USERS, seed=7, now=NOW)
+        rows = self.dump()
+        self.assertEqual({table: len(table_rows) for table, table_rows in rows.items()},
+                         dict(counts, user=USERS + 1))  # and admin
+        reinit_db(answers=ANSWERS)
+        generate_data.generate(ENGINE, users=USERS, seed=7, now=NOW)
+        self.assertEqual(self.dump(), rows)
+        # other seed in the same db
+        other = generate_data.generate(ENGINE, users=USERS, seed=8, now=NOW)
+        self.assertEqual(other['user'], USERS)
+        self.assertNotEqual(self.dump()['lesson'][-other['lesson']:], rows['lesson'][-other['lesson']:])
+
+    def test_2_dataset(self):
+        counts = generate_data.generate(ENGINE, users=USERS, seed=7, now=NOW)
+        self.assertEqual(counts['course'], USERS // 10)
+        with ENGINE.connect() as connection:
+            self.assertEqual(check_counters(connection), [])
+            sizes = [size for size, in connection.execute(
+                Course.__table__.select().with_only_columns([Course.members_count]).order_by(
+                    Course.members_count.desc()))]
+            # mega-courses (without owner and partners) and long tail
+            mega = int(USERS * generate_data.MEGA_SHARE)
+            for size in sizes[:generate_data.MEGA_COURSES]:
+                self.assertTrue(mega - 4 <= size <= mega)
+            self.assertLess(sizes[len(sizes) // 2], sizes[0] // 10)
+            self.assertEqual(sum(sizes), counts['course_member'])
+            states = {state for state, in connection.execute(
+                Lesson.__table__.select().with_only_columns([Lesson.state]).distinct())}
+            self.assertEqual(states, {Lesson.ENDED, Lesson.LIVE, Lesson.WAITING})
+            self.assertEqual(connection.execute(
+                "SELECT count(*) FROM lesson_search").scalar(), counts['lesson'])
+
+    def test_3_tiny(self):
+        # samples of partners, members and invites are larger than users
+        for users in (1, 2):
+            counts = generate_data.generate(ENGINE, users=users, courses=20, seed=users, now=NOW)
+            self.assertEqual((counts['user'], counts['course']), (users, 20))
+        with self.assertRaises(ValueError):
+            generate_data.generate(ENGINE, users=0, courses=1, seed=3, now=NOW)
+
+    def tearDown(self):
+        generate_data.GENERATE_BATCH, generate_data.GENERATE_COMMIT = self.batch
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
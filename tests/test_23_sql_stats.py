@@ -0,0 +1,109 @@
+from os.path import abspath, join, dirname, exists
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from sqlalchemy.exc import IntegrityError
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+from tornado.web import Application
+
+from scripts.init_db import reinit_db
+from db.DBBridge import DBBridge, ENGINE, DB_SESSIONS
+from handlers.BaseHandler import BaseHandler, log_request
+
+
+@DBBridge.query_db
+def select_value(session, value):
+    return session.execute('SELECT :value', {'value': value}).scalar()
+
+
+class SqlHandler(BaseHandler):
+
+    async def get(self):
+        select_value('first')
+        select_value('second')
+        self.write(await select_value.awaitable('in executor'))
+
+
+class Test_23_sql_stats(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        self.slow_query_ms = sets.SLOW_QUERY_MS
+
+    def fetch(self):
+        sock, port = bind_unused_port()
+        server = HTTPServer(Application([(r'/sql', SqlHandler)], log_function=log_request))
+        server.add_sockets([sock])
+        client = AsyncHTTPClient()
+        try:
+            return IOLoop.current().run_sync(lambda: client.fetch('http://127.0.0.1:{}/sql?id=1'.format(port)))
+        finally:
+            server.stop()
+
+    def test_1_request_stats(self):
+        sets.SLOW_QUERY_MS = None
+        with self.assertLogs('tornado.access', 'INFO') as access:
+            response = self.fetch()
+        self.assertEqual(response.body, b'in executor')
+        # statements of executor task are counted too
+        header = response.headers['Server-Timing']
+        self.assertTrue(header.startswith('db;dur='))
+        self.assertTrue(header.endswith(';desc="3 statements"'))
+        self.assertEqual(len(access.records), 1)
+        self.assertIn('200 GET /sql?id=1', access.output[0])
+        self.assertIn(' sql=3 ', access.output[0])
+
+    def test_2_slow_query_log(self):
+        sets.SLOW_QUERY_MS = 0
+        with self.assertLogs('db.slow_query', 'WARNING') as slow:
+            self.fetch()
+        self.assertEqual(len(slow.records), 3)
+        self.assertIn("[SqlHandler GET /sql?id=1] SELECT ? ('second',)", slow.output[1])
+        # statements out of request
+        with self.assertLogs('db.slow_query', 'WARNING') as slow:
+            select_value('script')
+        self.assertIn("[-] SELECT ? ('script',)", slow.output[0])
+        sets.SLOW_QUERY_MS = 60 * 1000
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('db.slow_query', 'WARNING'):
+                self.fetch()
+
+    def test_3_failed_statement(self):
+        sets.SLOW_QUERY_MS = 0
+        with ENGINE.connect() as connection:
+            with self.assertLogs('db.slow_query', 'WARNING') as slow:
+                with self.assertRaises(IntegrityError):
+                    connection.execute("INSERT INTO user (name, email) VALUES ('admin', 'other@admin.ru')")
+            self.assertIn('INSERT INTO user', slow.output[0])
+            # start time of failed statement is not left in pooled connection
+            self.assertNotIn('sql_started', connection.info)
+
+    def tearDown(self):
+        sets.SLOW_QUERY_MS = self.slow_query_ms
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,55 @@
+from os.path import abspath, join, dirname, exists
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+DEBUG = sets.DEBUG
+from scripts import bench_http
+sets.DEBUG = DEBUG  # bench sets production mode on import
+
+ROUTES = ('/', '/study/live', '/study/find', '/study/find?q=', '/study/course/<id>', '/teach/manage',
+          '/media/material/<f>', '/stream/auth', '/stream/update', '/stream/done')
+
+
+class Test_24_bench_http(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        self.warm_up = bench_http.WARM_UP
+        bench_http.WARM_UP = 1
+
+    def test_1_smoke(self):
+        # the smallest dataset with live lessons (deterministic by seed)
+        report = bench_http.bench(users=1000, seed=1, requests=3)
+        self.assertEqual(tuple(report['routes']), ROUTES)
+        for name, result in report['routes'].items():
+            self.assertEqual((name, result['requests'], result['errors']), (name, 3, 0))
+            self.assertTrue(result['p50_ms'] <= result['p95_ms'] <= result['p99_ms'])
+        self.assertGreater(report['routes']['/study/find']['sql_per_request'], 0)
+        self.assertFalse(exists('tests/data'))
+
+    def test_2_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([bench_http.percentile(values, share) for share in (0.5, 0.95, 0.99, 1)],
+                         [50, 95, 99, 100])
+        self.assertEqual(bench_http.percentile([7], 0.99), 7)
+
+    def tearDown(self):
+        bench_http.WARM_UP = self.warm_up
+        if exists("tests/data"):
+            rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
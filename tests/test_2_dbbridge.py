@@ -0,0 +1,75 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from tornado.ioloop import IOLoop
+
+from scripts.init_db import reinit_db
+from db.DBBridge import DBBridge, DB_SESSIONS
+from db.models import Course, Lesson
+from db.models_handlers import UserHandler, CourseHandler, LessonHandler
+
+
+class Test_2_dbbridge_awaitable(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+
+    def test_1_query_in_executor(self):
+        user = IOLoop.current().run_sync(lambda: UserHandler.get.awaitable('admin'))
+        self.assertEqual(user.name, 'admin')
+        self.assertEqual(DBBridge.executor_stats()['queued'], 0)
+        self.assertEqual(DBBridge.executor_stats()['active'], 0)
+
+    def test_2_modify_in_executor(self):
+        course = IOLoop.current().run_sync(
+            lambda: CourseHandler.create.awaitable('admin', 'Course', 'Description', Course.OPEN))
+        self.assertEqual(CourseHandler.get_by_id(course.id).name, 'Course')
+
+    def test_3_rows_detached(self):
+        course = CourseHandler.create('admin', 'Course', 'Description', Course.OPEN)
+        CourseHandler.change_state('admin', course.id, Course.LIVE)
+        lesson = LessonHandler.create_lesson(course.id, 'Lesson', 'Description', datetime.now(), 60)
+        LessonHandler.activate_lesson(lesson.stream_key, lesson.stream_pw)
+
+        lessons = IOLoop.current().run_sync(lambda: LessonHandler.get_rows_by_course.awaitable(course.id))
+        self.assertEqual(len(lessons), 1)
+        self.assertEqual(lessons[0].owner_name, 'admin')
+
+    def test_4_error_in_executor(self):
+        with self.assertRaises(Exception):
+            IOLoop.current().run_sync(lambda: CourseHandler.get_by_id.awaitable(100))
+        self.assertEqual(DBBridge.executor_stats()['active'], 0)
+
+    def test_5_log_stats(self):
+        with self.assertLogs('db.DBBridge', 'INFO') as logs:
+            DBBridge.log_stats()
+        self.assertIn('DB executor: 0/{} active, 0 queued; sessions: '.format(sets.DB_EXECUTOR_WORKERS), logs.output[0])
+
+    def tearDown(self):
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+        self.assertFalse(exists("tests/data"))
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,95 @@
+from os.path import abspath, join, dirname, exists
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from scripts.init_db import reinit_db
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from db.DBBridge import DBBridge, ENGINE, READ_ENGINE, DB_SESSIONS
+from db.engine import describe_engine, create_db_engine
+from db.models import Course, User
+from db.models_handlers import UserHandler, CourseHandler
+
+
+class Test_3_engine(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+
+    def test_1_sqlite_pragmas(self):
+        info = describe_engine(ENGINE)
+        self.assertEqual(info['pool'], 'QueuePool')
+        self.assertEqual(info['journal_mode'], 'wal')
+        self.assertEqual(info['busy_timeout'], sets.DB_BUSY_TIMEOUT)
+        self.assertEqual(info['cache_size'], sets.DB_PRAGMAS['cache_size'])
+
+    def test_2_memory_sqlite(self):
+        info = describe_engine(create_db_engine('sqlite://'))
+        self.assertEqual(info['pool'], 'StaticPool')
+
+    def test_3_read_engine(self):
+        self.assertIsNot(READ_ENGINE, ENGINE)
+        self.assertEqual(describe_engine(READ_ENGINE)['query_only'], 1)
+        self.assertEqual(describe_engine(ENGINE)['query_only'], 0)
+        with self.assertRaises(OperationalError):
+            READ_ENGINE.execute("UPDATE user SET email = 'admin@mail.ru'")
+
+    def test_4_routing(self):
+        used = []
+
+        def log_engine(conn, *args):
+            used.append('write' if conn.engine is ENGINE else 'read')
+        for engine in (ENGINE, READ_ENGINE):
+            event.listen(engine, 'before_cursor_execute', log_engine)
+        try:
+            UserHandler.get('admin')
+            self.assertEqual(set(used), {'read'})
+            del used[:]
+            with DBBridge.transaction():
+                CourseHandler.create('admin', 'Course', 'Description', Course.OPEN)
+                # not committed yet, visible only in writer
+                self.assertIsNotNone(CourseHandler.get('Course'))
+            self.assertEqual(set(used), {'write'})
+            DB_SESSIONS.remove()
+            del used[:]
+            self.assertIsNotNone(CourseHandler.get('Course'))
+            self.assertEqual(used, ['read'])
+            # flushed by plain session is read by writer too
+            session = DB_SESSIONS()
+            session.add(User(name='bob', password='', email='bob@bob.ru'))
+            self.assertEqual(session.query(User).filter(User.name == 'bob').count(), 1)
+            session.rollback()
+            del used[:]
+            self.assertEqual(session.query(User).filter(User.name == 'bob').count(), 0)
+            self.assertEqual(used, ['read'])
+        finally:
+            for engine in (ENGINE, READ_ENGINE):
+                event.remove(engine, 'before_cursor_execute', log_engine)
+
+    def tearDown(self):
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+        self.assertFalse(exists("tests/data"))
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,130 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from sqlalchemy import event
+
+from scripts.init_db import reinit_db
+from db.DBBridge import ENGINE, READ_ENGINE, DB_SESSIONS
+from db.cache import clear_all
+from db.models import (User, Course, Lesson, CourseMembers, CourseAccess, CourseInvites, HomeWork,
+                       HomeWorkAnswer)
+from db.models_handlers import (CourseHandler, CourseMembersHandler, CourseInvitesHandler, HomeWorkAnswerHandler,
+                               LessonHandler)
+
+
+def fill(start, stop):
+    session = DB_SESSIONS()
+    student = session.query(User).filter(User.name == 'student').one_or_none()
+    if not student:
+        student = User(name='student', password='', email='student@student.ru')
+        session.add(student)
+    for i in range(start, stop):
+        owner = User(name='owner{}'.format(i), password='', email='owner{}@owner.ru'.format(i))
+        session.add(owner)
+        session.flush()
+        course = Course(name='course{}'.format(i), description='', owner=owner.id, mode=Course.OPEN,
+                        state=Course.LIVE)
+        session.add(course)
+        session.flush()
+        session.add(CourseAccess(user=owner.id, course=course.id, access=CourseAccess.MODERATE))
+        session.add(CourseMembers(course=course.id, member=student.id, assign_type=Course.OPEN))
+        session.add(CourseInvites(course=course.id, member=student.id, action=CourseInvites.LEARN))
+        lesson = Lesson(name='lesson{}'.format(i), description='', start_time=datetime.now(), duration=60,
+                        state=Lesson.LIVE, course=course.id)
+        session.add(lesson)
+        session.flush()
+        hw = HomeWork(title='hw', description='', lesson=lesson.id)
+        session.add(hw)
+        session.flush()
+        session.add(HomeWorkAnswer(description='', home_work=hw.id, source=owner.id))
+    session.commit()
+    DB_SESSIONS.remove()
+
+
+class Test_4_loading_profiles(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        self.statements = 0
+        for engine in {ENGINE, READ_ENGINE}:
+            event.listen(engine, 'before_cursor_execute', self.count)
+
+    def count(self, *args):
+        self.statements += 1
+
+    def count_listing(self, render):
+        clear_all()
+        self.statements = 0
+        render()
+        DB_SESSIONS.remove()
+        return self.statements
+
+    def render_pages(self):
+        # touch the same attributes, as templates do
+        def live():
+            for l in CourseHandler.get_open_course_live_lesson():
+                l.course_name, l.owner_name
+
+        def partner():
+            for c in CourseHandler.get_all_by_partner('owner0'):
+                c.owner_name
+
+        def study():
+            for l in CourseMembersHandler.get_study_lessons('student'):
+                l._course._owner.name, len(l._home_work)
+
+        def invites():
+            for i in CourseInvitesHandler.get_learn_invites('student'):
+                i._course._owner.name
+
+        def answers():
+            for a in HomeWorkAnswerHandler.get_all_homework_answers(1):
+                a._source.name
+
+        def find():
+            for courses in CourseHandler.get_all_course('admin'):
+                for c in courses:
+                    c.owner_name
+
+        return [self.count_listing(page) for page in (live, partner, study, invites, answers, find)]
+
+    def test_1_constant_statements(self):
+        fill(0, 2)
+        LessonHandler.load_live_lessons()  # as on startup, fill does not use handlers
+        small = self.render_pages()
+        fill(2, 10)
+        LessonHandler.load_live_lessons()
+        self.assertEqual(small, self.render_pages())
+        # live lessons are read from registry
+        self.assertEqual(small[0], 0)
+        self.assertEqual(len(CourseHandler.get_open_course_live_lesson()), 10)
+
+    def tearDown(self):
+        for engine in {ENGINE, READ_ENGINE}:
+            event.remove(engine, 'before_cursor_execute', self.count)
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
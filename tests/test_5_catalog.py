@@ -0,0 +1,76 @@
+from os.path import abspath, join, dirname, exists
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from scripts.init_db import reinit_db
+from db.DBBridge import DB_SESSIONS
+from db.models import User, Course, CourseMembers
+from db.models_handlers import CourseHandler
+
+
+class Test_5_catalog(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        self.page_size, sets.PAGE_SIZE = sets.PAGE_SIZE, 2
+        session = DB_SESSIONS()
+        admin = session.query(User).filter(User.name == 'admin').one()
+        for i in range(5):
+            for mode in (Course.OPEN, Course.CLOSED, Course.PRIVATE):
+                session.add(Course(name='{}{}'.format(mode, i), description='', owner=admin.id, mode=mode,
+                                   state=Course.LIVE))
+        session.add(Course(name='Created', description='', owner=admin.id, mode=Course.OPEN, state=Course.CREATED))
+        session.flush()
+        member = session.query(Course).filter(Course.name == 'Open0').one()
+        session.add(CourseMembers(course=member.id, member=admin.id, assign_type=Course.OPEN))
+        session.commit()
+
+    def test_1_pages(self):
+        open_names, closed_names = [], []
+        open_after = closed_after = None
+        while True:
+            open_c, closed_c = CourseHandler.get_all_course('admin', open_after=open_after)
+            self.assertLessEqual(len(open_c), 2)
+            open_names += [c.name for c in open_c]
+            open_after = open_c.cursor
+            if not open_after:
+                break
+        while True:
+            open_c, closed_c = CourseHandler.get_all_course('admin', closed_after=closed_after)
+            closed_names += [c.name for c in closed_c]
+            closed_after = closed_c.cursor
+            if not closed_after:
+                break
+        self.assertEqual(open_names, ['Open1', 'Open2', 'Open3', 'Open4'])
+        self.assertEqual(closed_names, ['Closed0', 'Closed1', 'Closed2', 'Closed3', 'Closed4'])
+
+    def test_2_bad_cursor(self):
+        with self.assertRaises(ValueError):
+            CourseHandler.get_all_course('admin', 'not a cursor')
+
+    def tearDown(self):
+        sets.PAGE_SIZE = self.page_size
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
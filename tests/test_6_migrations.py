@@ -0,0 +1,69 @@
+from os.path import abspath, join, dirname, exists
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from sqlalchemy import inspect
+
+from scripts.init_db import reinit_db, ENGINE
+from db.migrations import upgrade, MIGRATIONS, SCHEMA_VERSION
+
+
+def get_indexes(table):
+    return {i['name']: i['unique'] for i in inspect(ENGINE).get_indexes(table)}
+
+
+class Test_6_migrations(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+
+    def make_old_db(self):
+        with ENGINE.begin() as connection:
+            for table in ('user', 'course_access'):
+                for index in inspect(connection).get_indexes(table):
+                    connection.execute('DROP INDEX {}'.format(index['name']))
+            connection.execute(SCHEMA_VERSION.delete())
+
+    def test_1_new_db_stamped(self):
+        self.assertEqual(upgrade(ENGINE), [])
+        self.assertTrue(get_indexes('user')['ix_user_name'])
+
+    def test_2_upgrade_old_db(self):
+        self.make_old_db()
+        self.assertEqual(get_indexes('user'), {})
+        self.assertEqual(len(upgrade(ENGINE)), len(MIGRATIONS))
+        self.assertEqual(get_indexes('user'), {'ix_user_name': 1, 'ix_user_email': 1})
+        self.assertEqual(get_indexes('course_access'), {'ix_course_access_course_user': 1})
+        self.assertEqual(upgrade(ENGINE), [])
+
+    def test_3_duplicates(self):
+        self.make_old_db()
+        with ENGINE.begin() as connection:
+            connection.execute("INSERT INTO user (name, email) VALUES ('admin2', 'admin@admin.ru')")
+        upgrade(ENGINE)
+        self.assertEqual(get_indexes('user'), {'ix_user_name': 1, 'ix_user_email': 0})
+
+    def tearDown(self):
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
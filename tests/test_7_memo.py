@@ -0,0 +1,82 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime, timedelta
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from sqlalchemy import event
+from tornado.ioloop import IOLoop
+
+from scripts.init_db import reinit_db
+from db.DBBridge import ENGINE, READ_ENGINE, DB_SESSIONS, REQUEST_MEMO, RequestMemo
+from db.models import Course
+from db.models_handlers import (UserHandler, CourseHandler, CourseAccessHandler, LessonHandler, LessonAccessHandler,
+                                LessonMaterialHandler)
+
+
+class Test_7_request_memo(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        self.course = CourseHandler.create('admin', 'Course', 'Description', Course.OPEN)
+        self.lesson = LessonHandler.create_lesson(self.course.id, 'Lesson', 'Description',
+                                                  datetime.now() + timedelta(days=1), 60)
+        LessonAccessHandler.add_access_to_all_partners(self.course.id, self.lesson.id)
+        self.memo = RequestMemo()
+        REQUEST_MEMO.set(self.memo)
+        self.statements = 0
+        for engine in {ENGINE, READ_ENGINE}:
+            event.listen(engine, 'before_cursor_execute', self.count)
+
+    def count(self, *args):
+        self.statements += 1
+
+    def test_1_lookups_once(self):
+        course_id, lesson_id = self.course.id, self.lesson.id
+        self.assertTrue(CourseAccessHandler.check_write_access('admin', course_id))
+        statements = self.statements
+        self.assertTrue(CourseAccessHandler.check_write_access('admin', course_id))
+        self.assertTrue(LessonMaterialHandler.check_material('admin', lesson_id, None))
+        self.assertTrue(LessonMaterialHandler.check_material('admin', lesson_id, None))
+        # only lesson is new lookup, lesson access is in cached course ACL
+        self.assertEqual(self.statements, statements + 1)
+        self.assertGreater(self.memo.hits, 0)
+
+    def test_2_write_clear_memo(self):
+        self.assertIsNone(UserHandler.get('user'))
+        UserHandler.create('user', 'pw', 'user@user.ru')
+        self.assertEqual(UserHandler.get('user').name, 'user')
+
+    def test_3_memo_in_executor(self):
+        user = IOLoop.current().run_sync(lambda: UserHandler.get.awaitable('admin'))
+        self.assertEqual(user.name, 'admin')
+        # other session - model from executor is not reused
+        self.assertIsNot(UserHandler.get('admin'), user)
+
+    def tearDown(self):
+        REQUEST_MEMO.set(None)
+        for engine in {ENGINE, READ_ENGINE}:
+            event.remove(engine, 'before_cursor_execute', self.count)
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
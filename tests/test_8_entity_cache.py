@@ -0,0 +1,111 @@
+from os.path import abspath, join, dirname, exists
+import sys
+from shutil import rmtree
+from time import sleep
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from sqlalchemy import event
+
+from scripts.init_db import reinit_db
+from db.DBBridge import ENGINE, READ_ENGINE, DB_SESSIONS, TASK_SESSIONS
+from db.cache import USER_CACHE, COURSE_CACHE, EntityCache
+from db.models import Course, User
+from db.models_handlers import UserHandler, CourseHandler
+
+
+class Test_8_entity_cache(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        self.statements = 0
+        for engine in {ENGINE, READ_ENGINE}:
+            event.listen(engine, 'before_cursor_execute', self.count)
+
+    def count(self, *args):
+        self.statements += 1
+
+    def test_1_user_without_sql(self):
+        UserHandler.get('admin')
+        DB_SESSIONS.remove()
+        statements, hits = self.statements, USER_CACHE.hits
+        user = UserHandler.get('admin')
+        self.assertEqual(self.statements, statements)
+        self.assertEqual(USER_CACHE.hits, hits + 1)
+        self.assertEqual(user.email, 'admin@admin.ru')
+        # model is attached to session, relationships are loaded as usual
+        self.assertEqual(user._course, [])
+
+    def test_2_invalidate_on_write(self):
+        course = CourseHandler.create('admin', 'Course', 'Description', Course.OPEN)
+        course_id = course.id
+        self.assertEqual(CourseHandler.get_by_id(course_id).state, Course.CREATED)
+        DB_SESSIONS.remove()
+        CourseHandler.change_state('admin', str(course_id), Course.PUBLISHED)
+        DB_SESSIONS.remove()
+        self.assertEqual(CourseHandler.get_by_id(course_id).state, Course.PUBLISHED)
+
+        self.assertIsNone(UserHandler.get('user'))
+        UserHandler.create('user', 'pw', 'user@user.ru')
+        self.assertEqual(UserHandler.get('user').name, 'user')
+
+    def test_3_lru_and_ttl(self):
+        cache = EntityCache('test', User, 'name', size=2, ttl=0.1)
+        session = DB_SESSIONS()
+        load = lambda name: lambda: session.query(User).filter(User.name == name).one_or_none()
+        UserHandler.create('user1', 'pw', 'user1@user.ru')
+        UserHandler.create('user2', 'pw', 'user2@user.ru')
+        for name in ('admin', 'user1', 'user2'):
+            cache.get_or_load(session, name, load(name))
+        self.assertEqual(cache.stats()['evictions'], 1)
+        cache.get_or_load(session, 'user2', load('user2'))
+        self.assertEqual(cache.hits, 1)
+        sleep(0.1)
+        cache.get_or_load(session, 'user2', load('user2'))
+        self.assertEqual(cache.hits, 1)
+
+    def test_4_stale_load(self):
+        # concurrent commit between load and put: old values are not cached
+        cache = EntityCache('test', User, 'name')
+        session = DB_SESSIONS()
+
+        def load():
+            user = session.query(User).filter(User.name == 'admin').one()
+            other = TASK_SESSIONS()
+            other.query(User).filter(User.name == 'admin').one().email = 'new@admin.ru'
+            other.commit()
+            other.close()
+            return user
+
+        cache.get_or_load(session, 'admin', load)
+        self.assertEqual(cache.stale, 1)
+        self.assertIsNone(cache.get('admin'))
+        DB_SESSIONS.remove()
+        self.assertEqual(UserHandler.get('admin').email, 'new@admin.ru')
+        self.assertIsNotNone(USER_CACHE.get('admin'))
+
+    def tearDown(self):
+        for engine in {ENGINE, READ_ENGINE}:
+            event.remove(engine, 'before_cursor_execute', self.count)
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
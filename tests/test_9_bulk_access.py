@@ -0,0 +1,79 @@
+from os.path import abspath, join, dirname, exists
+from datetime import datetime, timedelta
+import sys
+from shutil import rmtree
+
+from unittest import main, TestCase
+
+HERE_PATH = dirname(abspath(__file__))
+PROJECT_PATH = abspath(join(HERE_PATH, '..'))
+
+sys.path.insert(0, PROJECT_PATH)
+
+
+from settings import sets
+sets.TESTING = True
+
+from sqlalchemy import event
+
+from scripts.init_db import reinit_db
+from db.DBBridge import ENGINE, READ_ENGINE, DB_SESSIONS
+from db.models import Course, LessonAccess
+from db.models_handlers import UserHandler, CourseHandler, CourseAccessHandler, LessonHandler, LessonAccessHandler
+
+
+class Test_9_bulk_access(TestCase):
+
+    def setUp(self):
+        if exists("tests/data"):
+            rmtree("tests/data")
+        reinit_db(answers={
+            "username": "admin",
+            "password": "1234",
+            "email": "admin@admin.ru",
+            "remove_existed": "y"
+        })
+        self.course = CourseHandler.create('admin', 'Course', 'Description', Course.OPEN)
+        for i in range(5):
+            UserHandler.create('lector{}'.format(i), 'pw', 'lector{}@lector.ru'.format(i))
+            CourseAccessHandler.add_browse_access('lector{}'.format(i), self.course)
+        self.inserts = 0
+        for engine in {ENGINE, READ_ENGINE}:
+            event.listen(engine, 'before_cursor_execute', self.count)
+
+    def count(self, conn, cursor, statement, *args):
+        if statement.startswith('INSERT INTO lesson_access'):
+            self.inserts += 1
+
+    def add_lesson(self, name):
+        start = datetime.now() + timedelta(days=1)
+        return LessonHandler.create_lesson(self.course.id, name, 'Description', start, 60)
+
+    def test_1_access_to_all_partners(self):
+        lesson = self.add_lesson('Lesson')
+        self.assertEqual(LessonAccessHandler.add_access_to_all_partners(self.course.id, lesson.id), 6)
+        self.assertEqual(self.inserts, 1)
+        self.assertEqual(LessonAccessHandler.check_any_access('admin', lesson).access, LessonAccess.MODERATE)
+        self.assertEqual(LessonAccessHandler.check_any_access('lector0', lesson).access, LessonAccess.VIEW)
+
+    def test_2_access_to_all_lesson(self):
+        lessons = [self.add_lesson('Lesson{}'.format(i)) for i in range(4)]
+        LessonAccessHandler.add_access(UserHandler.get('lector0').id, lessons[0].id, LessonAccess.TEACH)
+        UserHandler.create('lector', 'pw', 'lector@lector.ru')
+        self.inserts = 0
+        self.assertEqual(LessonAccessHandler.add_access_to_all_lesson('lector', self.course, LessonAccess.VIEW), 4)
+        self.assertEqual(self.inserts, 1)
+        # existed access is not duplicated
+        self.assertEqual(LessonAccessHandler.add_access_to_all_lesson('lector0', self.course, LessonAccess.VIEW), 3)
+        self.assertEqual(LessonAccessHandler.get_all_by_partner_and_course('lector0', self.course.id)[
+                             lessons[0].id].access, LessonAccess.TEACH)
+
+    def tearDown(self):
+        for engine in {ENGINE, READ_ENGINE}:
+            event.remove(engine, 'before_cursor_execute', self.count)
+        DB_SESSIONS.remove()
+        rmtree("tests/data")
+
+
+if __name__=='__main__':
+    main()
@@ -1,4 +1,6 @@
 import tornado.web
+from tornado.escape import xhtml_escape
+from tornado.httputil import url_concat
 
 
 class CursEntry(tornado.web.UIModule):
@@ -13,3 +15,19 @@ class LessonEntry(tornado.web.UIModule):
     def render(self, lesson, show_comments=False):
         return self.render_string(
             "modules/lesson-entry.html", lesson=lesson, show_comments=show_comments)
+
+
+class NextPage(tornado.web.UIModule):
+    '''
+    Link to next page of keyset paginated list: current url with cursor of page in "arg" argument.
+    '''
+
+    def render(self, page, arg='after', title="Next page"):
+        if not page.cursor:
+            return ''
+        request = self.handler.request
+        args = {name: self.handler.get_argument(name) for name in request.arguments}
+        args[arg] = page.cursor
+        # rendered without template file: handlers have different template paths
+        return '<a href="{}" class="next-page">{}</a>'.format(
+            xhtml_escape(url_concat(request.path, args)), xhtml_escape(title))